@@ -1,42 +1,37 @@
-# This line imports List, Dict, Any, and Optional types from the typing module
-# List - Used for type hinting lists
+# This line imports Dict, Any, and Optional types from the typing module
 # Dict - Used for type hinting dictionaries 
 # Any - Used when the type is dynamic or unknown
 # Optional - Used for values that could be None
-from typing import List, Dict, Any, Optional
-import requests # HTTP library for making web requests
-from bs4 import BeautifulSoup # Library for parsing HTML and XML documents
+from typing import Dict, Any, Optional
+from bs4 import BeautifulSoup, SoupStrainer # Library for parsing HTML and XML documents, and for restricting parsing to the elements the scraper reads
 import json # Built-in module for JSON data encoding and decoding
 import os # Provides functions for interacting with the operating system (file paths, etc.)
 from datetime import datetime # Provides classes for working with dates and times
-from base_scraper import BaseWineScraper # Custom module containing the base class for wine scrapers
+from base_scraper import BaseWineScraper, css_class_strainer # Custom module containing the base class for wine scrapers
 
 class AuchanWineScraper(BaseWineScraper):
-    def __init__(self, folder: str) -> None:
+    total_strainer: SoupStrainer = SoupStrainer('input', attrs={'name': 'auc-js-search-results-total'})
+    ean_strainer: SoupStrainer = css_class_strainer('span', 'product-ean')
+    # The site serves up to 96 products per page, and just the product grid from Search-UpdateGrid
+    preferred_size: int = 96
+    grid_url: str = ('https://www.auchan.pt/on/demandware.store/Sites-AuchanPT-Site/pt_PT/Search-UpdateGrid'
+                     '?cgid=garrafeira&start={start}&sz={size}')
+
+    def __init__(self, folder: str, **options: Any) -> None:
+        options.setdefault('max_workers', 8)  # Product pages fetched at the same time
         super().__init__(
             base_url="https://www.auchan.pt/pt/bebidas-e-garrafeira/garrafeira/",
             data_file=os.path.join(folder, "auchan_wine_data.json"),
-            size=24
+            size=24,
+            **options
         )
 
-    def _get_product_data(self, product_offset=0, product_limit: int = -1) -> List[Dict[str, Any]]:
-        """Get products from a specific page"""
-        url: str = f"{self.base_url}?sz={self.size}&start={product_offset}"
-        response: requests.Response = requests.get(url, headers=self.headers)
-        soup: BeautifulSoup = BeautifulSoup(response.content, 'html.parser')
-        
-        products: List[Dict[str, Any]] = []
-        for product in soup.find_all("div", class_="product-tile"):
-            product_data: Optional[Dict[str, Any]] = self._scrape_product(product)
-            if product_data:
-                products.append(product_data)
-            if len(products) >= product_limit:
-                break
-
-        return products
+    def _listing_url(self, product_offset: int, size: Optional[int] = None) -> str:
+        """Get the URL of the listing page starting at a product offset"""
+        return f"{self.base_url}?sz={size or self.size}&start={product_offset}"
 
-    def _scrape_product(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
-        """Extract product information from a product element"""
+    def _parse_tile(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
+        """Extract product information from a product element, except for its EAN"""
         try:
             impression_data: Optional[str] = product.get('data-gtm-new')
             product_info: Dict[str, Any] = json.loads(impression_data)
@@ -44,6 +39,7 @@ class AuchanWineScraper(BaseWineScraper):
             brand: str = product_info.get('item_brand', '')
             price: float = float(product_info.get('price', 0)) - float(product_info.get('discount', 0))
             quantity: str = product_info.get('quantity', '')
+            item_id: Optional[str] = product_info.get('item_id')
             price_per_litre: float = float(product.find('span', class_='auc-measures--price-per-unit')
                                         .text.strip()
                                         .replace(' €/Lt', ''))
@@ -51,7 +47,6 @@ class AuchanWineScraper(BaseWineScraper):
             data_urls: Optional[str] = product.get('data-urls', '')
             product_urls: Dict[str, str] = json.loads(data_urls)
             link: str = 'https://www.auchan.pt' + product_urls.get('productUrl', '')
-            ean: Optional[str] = self._extract_ean(link)
             
             return {
                 "name": name,
@@ -59,27 +54,32 @@ class AuchanWineScraper(BaseWineScraper):
                 "brand": brand,
                 "quantity": quantity,
                 "price_per_litre": price_per_litre,
-                "ean": ean,
-                "timestamp": datetime.now().isoformat()
+                "ean": None,
+                "timestamp": datetime.now().isoformat(),
+                "url": link,
+                "item_id": item_id
             }
         except Exception as e:
             print(f"Error scraping product: {e}")
+            self.metrics.count('tile_errors')
             return None
 
-    def _extract_ean(self, product_url: str) -> Optional[str]:
-        """Extract EAN from product URL"""
+    def _fetch_ean(self, product_url: str) -> Optional[str]:
+        """Extract EAN from product URL
+
+        Request errors propagate, so the page is retried or resumed from the checkpoint instead of
+        saving the product without its EAN; None means the page loaded but holds no EAN.
+        """
+        response = self._fetch(product_url)
         try:
-            response = requests.get(product_url, headers=self.headers)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = self._parse(response.content, self.ean_strainer)
             return soup.find('span', class_='product-ean').text.strip()
         except Exception as e:
             print(f"Error extracting EAN: {e}")
+            self.metrics.count('ean_errors')
             return None
     
-    def _get_total_products(self) -> int:
-        """Get total number of pages to scrape"""
-        url = f'{self.base_url}?sz={self.size}&start=0'
-        response = requests.get(url, headers=self.headers)
-        soup = BeautifulSoup(response.content, 'html.parser')
+    def _read_total(self, soup: BeautifulSoup) -> int:
+        """Get total number of products to scrape from the first listing page"""
         input_element = soup.find('input', {'name': 'auc-js-search-results-total'})
         return int(input_element.get('value'))
@@ -4,109 +4,632 @@
 # - Dict: For annotating dictionaries (e.g., Dict[str, int] is a dict with string keys and integer values) 
 # - Any: Used when a value could be of any type
 # - Optional: Used for values that could be None (e.g., Optional[str] means str | None)
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup  # Library for parsing HTML and XML documents
+# - Tuple: For annotating fixed-size tuples (e.g., Tuple[str, str] is a pair of strings)
+# - Iterator: For annotating generators (e.g., Iterator[int] yields integers)
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
+import requests  # HTTP library for making web requests
+from requests.adapters import HTTPAdapter  # Transport adapter holding the pool of reusable connections
+from bs4 import BeautifulSoup, SoupStrainer  # Library for parsing HTML and XML documents, and for parsing only parts of them
 from datetime import datetime  # Provides classes for working with dates and times
-import json  # Built-in module for JSON data encoding and decoding
+from concurrent.futures import ThreadPoolExecutor  # Runs blocking calls (like product page requests) in a pool of threads
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+from json_codec import codec, DecodeError  # Custom module encoding JSON with the fastest backend installed
+import math  # Built-in module for mathematical functions
+import random  # Built-in module for random numbers, used to add jitter to retry delays
 import os  # Provides functions for interacting with the operating system (file paths, etc.)
+from urllib.parse import urlparse  # Parses URLs into components
+from ean_cache import EanCache  # Custom module caching the EAN of each product URL on disk
+from http_cache import HttpCache  # Custom module caching HTTP responses on disk with ETag / Last-Modified
+from rate_limiter import HostRateLimiter  # Custom module pacing the requests sent to each host
+from storage import WineStorage, create_storage, has_ean  # Custom module with the JSON and SQLite storage backends
+from pipeline import bounded_stage  # Custom module running generator stages in threads with bounded queues
+from metrics import ScraperMetrics  # Custom module timing the phases of a run and counting its requests
+
+# lxml is much faster than the pure-Python parser, but it is optional
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER: str = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class ScrapeInterrupted(Exception):
+    """Raised in a run once stop() is called, after the last page scraped has been saved"""
+
+def css_class_strainer(tag: str, css_class: str) -> SoupStrainer:
+    """Build a SoupStrainer keeping only the <tag> elements that have css_class among their classes"""
+    # While parsing, the class attribute is still the raw string, so a plain
+    # SoupStrainer(tag, class_=css_class) would miss elements with several classes
+    return SoupStrainer(lambda name, attrs: name == tag and css_class in str(attrs.get('class', '')).split())
 
 class BaseWineScraper:
-    def __init__(self, base_url: str, data_file: str, size: int) -> None:
+    # Parts of the pages the scrapers read, so only those subtrees are built
+    tile_strainer: SoupStrainer = css_class_strainer('div', 'product-tile')
+    total_strainer: SoupStrainer  # Element holding the total number of products, set by child classes
+    ean_strainer: SoupStrainer  # Element holding the EAN in a product page, set by child classes
+    # Starting and highest pace of requests to the retailer's hosts (0 disables the rate limiter)
+    requests_per_second: float = 10.0
+    max_requests_per_second: float = 100.0
+    # Listing page size to ask for when the site lets clients choose (0 keeps the default size)
+    preferred_size: int = 0
+    # URL template of just the product grid of a listing page, with {start} and {size}, where the site serves one
+    grid_url: Optional[str] = None
+
+    def __init__(self, base_url: str, data_file: str, size: int, max_workers: int = 8,
+                 ean_cache_ttl: float = 30 * 24 * 3600, ean_cache_size: int = 100000,
+                 fan_out: bool = False, http_cache: bool = True,
+                 http_cache_size: int = 200 * 1024 * 1024, parser: str = DEFAULT_PARSER,
+                 compact_every: int = 5000, storage: str = 'json', timeout: float = 30.0,
+                 max_retries: int = 4, retry_backoff: float = 1.0, incremental: bool = False,
+                 resume: bool = True, prefetch_pages: int = 2, write_batch_size: int = 500,
+                 write_interval: float = 5.0, json_format: str = 'pretty', probe_page_size: bool = True,
+                 page_size_ttl: float = 7 * 24 * 3600, checkpoint_ttl: float = 24 * 3600) -> None:
         self.base_url: str = base_url
         self.data_file: str = data_file
+        # Where products and price history are kept: 'json' (data_file plus an event log) or 'sqlite',
+        # with the JSON snapshot written in json_format ('pretty', 'compact' or 'gzip')
+        self.storage: WineStorage = create_storage(storage, self.retailer, self.data_file,
+                                                   compact_every=compact_every, json_format=json_format)
         self.size: int = size
+        self.default_size: int = size
+        # Whether listing pages are fetched as grid fragments, once a probe found they work
+        self.use_grid: bool = False
+        # The page size and grid fragment are probed once and the result kept for page_size_ttl seconds
+        self.probe_page_size: bool = probe_page_size
+        self.page_size_ttl: float = page_size_ttl
+        self.page_size_file: str = data_file.replace('_wine_data.json', '_page_size.json')
+        # Maximum number of product pages fetched at the same time for this retailer
+        self.max_workers: int = max_workers
+        # Requests time out after timeout seconds and are retried max_retries times,
+        # waiting up to retry_backoff * 2^attempt seconds in between
+        self.timeout: float = timeout
+        self.max_retries: int = max_retries
+        self.retry_backoff: float = retry_backoff
+        # BeautifulSoup parser backend ('lxml' when installed, or 'html.parser')
+        self.parser: str = parser
+        # Pages fetched ahead of the stage consuming them, and how scraped products are grouped
+        # into writes: at most write_batch_size products or write_interval seconds apart
+        self.prefetch_pages: int = prefetch_pages
+        self.write_batch_size: int = write_batch_size
+        self.write_interval: float = write_interval
+        self._written: int = 0  # Products saved by the current run
+        # Offset reached and products saved by the current run, so an interrupted run can resume
+        self.checkpoint_file: str = self.data_file.replace('_wine_data.json', '_checkpoint.json')
+        # A checkpoint from a run started more than checkpoint_ttl seconds ago belongs to an earlier
+        # run and is ignored, so a new run doesn't pick up a crawl the catalogue has moved on from
+        self.checkpoint_ttl: float = checkpoint_ttl
+        self._total: Optional[int] = None  # Total number of products read by the current run, if any
+        # Metrics of the last run, written next to the data file as JSON and for Prometheus
+        self.metrics: ScraperMetrics = ScraperMetrics(self.retailer)
+        self.metrics_file: str = self.data_file.replace('_wine_data.json', '_metrics.json')
+        self.prometheus_file: str = self.data_file.replace('_wine_data.json', '_metrics.prom')
+        # Called with each batch of products after it is saved
+        self.save_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._stopping: threading.Event = threading.Event()
+        self.resume: bool = resume
+        # Whether product pages are only fetched for new products and products whose price changed
+        self.incremental: bool = incremental
+        # (field, value) -> EAN and last price of the stored products, by product URL and retailer item id
+        self._known_products: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None
+        # Whether listing pages are fetched concurrently once the total number of products is known
+        self.fan_out: bool = fan_out
+        # Unchanged pages are revalidated and served from disk, under the output folder
+        self.http_cache: Optional[HttpCache] = None
+        if http_cache:
+            self.http_cache = HttpCache(
+                os.path.join(os.path.dirname(self.data_file), 'http_cache', self.retailer.lower()),
+                max_bytes=http_cache_size
+            )
+        # First listing page, kept by _get_total_products so it isn't downloaded twice
+        self._first_page: Optional[BeautifulSoup] = None
+        # EANs never change for a product URL, so they are cached next to the data file
+        self.ean_cache: EanCache = EanCache(
+            self.data_file.replace('_wine_data.json', '_ean_cache.json'),
+            ttl=ean_cache_ttl,
+            max_entries=ean_cache_size
+        )
         self.headers: Dict[str, str] = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         }
+        # Keep-alive session shared by every request of this scraper, created on first use
+        self.session: Optional[requests.Session] = None
+        self._session_lock: threading.Lock = threading.Lock()
 
-    def run(self, product_limit: int) -> None:
-        """Base periodic scraping implementation"""
+    def run(self, product_limit: int, keep_alive: bool = False) -> Dict[str, Any]:
+        """Base periodic scraping implementation, returning a summary of the run
+
+        With keep_alive the HTTP session and its pooled connections are kept for the next run.
+        """
         print(f"Starting {self.__class__.__name__} scraping at {datetime.now()}")
-        all_products: List[Dict[str, Any]] = []
+        summary: Dict[str, Any] = {'retailer': self.retailer, 'success': False, 'products': 0, 'error': None}
+        start: float = time.perf_counter()
+        self.metrics = ScraperMetrics(self.retailer)
+        self._total = None
+        # Resume an interrupted run with the same product limit where it stopped
+        checkpoint: Dict[str, Any] = self._load_checkpoint(product_limit)
         
         try:
-            all_products = self._scrape_all_products(product_limit)
-            self._save_data(all_products)
-            print(f"Scraped {len(all_products)} products")
+            if checkpoint['next_offset'] and checkpoint.get('total') is not None:
+                # Products added or removed since then have shifted the pages, so the run starts over
+                self._resolve_page_size()
+                if self._get_total_products() != checkpoint['total']:
+                    print(f"The catalogue changed from {checkpoint['total']} to {self._total} products, starting over")
+                    checkpoint = self._fresh_checkpoint(product_limit)
+            product_offset: int = checkpoint['next_offset']
+            scraped: int = checkpoint['scraped']
+            if product_offset:
+                print(f"Resuming from offset {product_offset} with {scraped} products already saved")
+            scraped = self._write_pages(product_limit, product_offset, scraped, checkpoint['started'])
+            self._clear_checkpoint()
+            print(f"Scraped {scraped} products")
+            summary['success'] = True
         except Exception as e:
             print(f"Error during scraping: {e}")
+            summary['error'] = str(e)
+        finally:
+            self.ean_cache.save()
+            if self.http_cache:
+                self.http_cache.save()
+            print(f"EAN cache: {self.ean_cache.hits} hits, {self.ean_cache.misses} misses")
+            if keep_alive:
+                # The storage's latest prices stay warm for the next run too
+                self._first_page = None
+                self._known_products = None
+            else:
+                # They are read again next run, so they don't stay in memory in between
+                self.storage.release()
+                self.close()
+            self.metrics.write(self.metrics_file, self.prometheus_file)
 
-    def _load_existing_data(self) -> Dict[str, Dict[str, Any]]:
-        """Load existing data from JSON file"""
+        summary['products'] = self._written
+        summary['duration'] = time.perf_counter() - start
+        summary['metrics'] = self.metrics.snapshot()
+        return summary
+
+    def _write_pages(self, product_limit: int, product_offset: int, scraped: int,
+                     started: Optional[float] = None) -> int:
+        """Stream scraped pages into the storage in batches, checkpointing after each write
+
+        Listing pages, product pages and writes run as separate stages connected by bounded
+        queues, so memory use doesn't grow with the catalogue. Only whole pages are written,
+        so the checkpoint offset never skips products that weren't saved. started is when the run
+        being resumed began, kept in the checkpoint along with the total number of products.
+        """
+        self._written = scraped
+        started = started or time.time()
+        batch: List[Dict[str, Any]] = []
+        batch_offset: int = product_offset
+        last_write: float = 0.0  # The first page is written right away
+
+        def write() -> None:
+            nonlocal batch, last_write
+            self._save_data(batch)
+            self._written += len(batch)
+            self.metrics.count('products', len(batch))
+            self._save_checkpoint({'product_limit': product_limit, 'next_offset': batch_offset, 'scraped': self._written,
+                                   'started': started, 'total': self._total})
+            batch = []
+            last_write = time.monotonic()
+
+        pages = bounded_stage(self._scrape_pages(product_limit, product_offset, scraped), self.prefetch_pages,
+                              name=f"{self.retailer}-products")
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
+            for batch_offset, products in pages:
+                batch.extend(products)
+                if len(batch) >= self.write_batch_size or time.monotonic() - last_write >= self.write_interval:
+                    write()
+                if self._stopping.is_set():
+                    # The checkpoint is kept, so the next run resumes from here
+                    raise ScrapeInterrupted(f"Stopped at offset {batch_offset}")
+        except BaseException:
+            # Pages scraped before an error are still saved, but a failed save doesn't hide the error
+            if batch:
+                try:
+                    write()
+                except Exception as e:
+                    print(f"Error saving the last {len(batch)} products: {e}")
+            raise
+        if batch:
+            write()
+        return self._written
+
+    def _load_checkpoint(self, product_limit: int) -> Dict[str, Any]:
+        """Get the checkpoint of a recent interrupted run with the same product limit, or a fresh start"""
+        fresh_start: Dict[str, Any] = self._fresh_checkpoint(product_limit)
+        if not self.resume:
+            return fresh_start
+        try:
+            checkpoint: Dict[str, Any] = codec.read_file(self.checkpoint_file)
+        except (FileNotFoundError, DecodeError):
+            return fresh_start
+        if checkpoint.get('product_limit') != product_limit:
+            return fresh_start
+        # Checkpoints without a start time predate it, and are as stale as old ones
+        if time.time() - checkpoint.get('started', 0) > self.checkpoint_ttl:
+            print(f"Ignoring the checkpoint of a run started over {self.checkpoint_ttl:g}s ago")
+            return fresh_start
+        return checkpoint
+
+    def _fresh_checkpoint(self, product_limit: int) -> Dict[str, Any]:
+        return {'product_limit': product_limit, 'next_offset': 0, 'scraped': 0, 'started': time.time(), 'total': None}
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        """Atomically record how far the current run got"""
+        codec.write_file(self.checkpoint_file, checkpoint)
+
+    def stop(self) -> None:
+        """Make the current run, and any later one, end once the page being scraped is saved"""
+        self._stopping.set()
+
+    def _clear_checkpoint(self) -> None:
+        """Forget the checkpoint once a run has finished"""
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    @property
+    def retailer(self) -> str:
+        """Retailer name, taken from the scraper class name"""
+        return self.__class__.__name__.replace('WineScraper', '')
+
+    def _get_session(self) -> requests.Session:
+        """Get the pooled keep-alive HTTP session, creating it if needed"""
+        with self._session_lock:
+            if self.session is None:
+                session = requests.Session()
+                # One connection per worker resolving EANs, plus one for the listing pages
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers + 1)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(self.headers)
+                self.session = session
+            return self.session
+
+    def _fetch(self, url: str) -> requests.Response:
+        """GET a URL through the scraper's shared session, revalidating cached responses"""
+        if self.http_cache is None:
+            return self._get_with_retries(url)
+
+        response: requests.Response = self._get_with_retries(url, self.http_cache.validators(url))
+        if response.status_code == 304:
+            cached: Optional[requests.Response] = self.http_cache.load(url)
+            # The body may have been evicted since the validators were read
+            if cached is None:
+                return self._get_with_retries(url)
+            self.metrics.count('http_cache_hits')
+            return cached
+        if response.status_code == 200:
+            self.http_cache.store(url, response)
+        return response
+
+    def _get_with_retries(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """GET a URL paced by the host's rate limiter, retrying throttled, failed and timed out requests"""
+        session: requests.Session = self._get_session()
+        limiter: Optional[HostRateLimiter] = None
+        if self.requests_per_second > 0:
+            limiter = HostRateLimiter.for_host(
+                urlparse(url).netloc,
+                rate=self.requests_per_second,
+                max_rate=self.max_requests_per_second,
+                max_concurrency=self.max_workers + 1
+            )
+
+        for attempt in range(self.max_retries + 1):
+            response: Optional[requests.Response] = None
+            error: Optional[Exception] = None
+            if limiter:
+                limiter.acquire()
+            self.metrics.count('requests')
+            if attempt:
+                self.metrics.count('retries')
+            try:
+                response = session.get(url, headers=headers or {}, timeout=self.timeout)
+                self.metrics.count('body_bytes', len(response.content))  # Decompressed size
+            except requests.RequestException as e:
+                # Timeouts, dropped connections and bodies cut short or badly encoded are all retried
+                response, error = None, e
+            finally:
+                # The slot is given back whatever happened, or the host's requests would stall for good
+                if limiter:
+                    limiter.release(response is not None and response.status_code not in RETRY_STATUS_CODES)
+            healthy: bool = response is not None and response.status_code not in RETRY_STATUS_CODES
+            if healthy:
+                return response
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+
+        if response is None:
+            raise error
+        response.raise_for_status()
+        return response
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Exponential backoff with full jitter, or the server's Retry-After if it asks for longer"""
+        delay: float = random.uniform(0, min(60.0, self.retry_backoff * 2 ** attempt))
+        retry_after: str = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def _parse(self, content: bytes, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """Parse a page with the configured backend, building only the elements matched by parse_only"""
+        with self.metrics.phase('parse'):
+            return BeautifulSoup(content, self.parser, parse_only=parse_only)
+
+    def close(self) -> None:
+        """Close the HTTP session and its pooled connections"""
+        self._first_page = None
+        self._known_products = None
+        with self._session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def _load_existing_data(self) -> Dict[str, Dict[str, Any]]:
+        """Load existing data from the storage backend"""
+        return self.storage.load()
 
     def _save_data(self, new_products: List[Dict[str, Any]]) -> None:
-        """Save scraped data to JSON file with price history"""
-        existing_data = self._load_existing_data()
-        current_time = datetime.now().isoformat()
-
-        for product in new_products:
-            ean = product['ean']
-            if not ean:
-                continue
-
-            if ean not in existing_data:
-                existing_data[ean] = {
-                    'name': product['name'],
-                    'brand': product['brand'],
-                    'quantity': product['quantity'],
-                    'price_history': [{
-                        'price': product['price'],
-                        'price_per_litre': product['price_per_litre'],
-                        'timestamp': current_time
-                    }]
-                }
-            else:
-                last_price = existing_data[ean]['price_history'][-1]['price']
-                if last_price != product['price']:
-                    existing_data[ean]['price_history'].append({
-                        'price': product['price'],
-                        'price_per_litre': product['price_per_litre'],
-                        'timestamp': current_time
-                    })
-                existing_data[ean].update({
-                    'name': product['name'],
-                    'brand': product['brand'],
-                    'quantity': product['quantity'],
-                })
-
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_data, f, indent=2, ensure_ascii=False)
+        """Save scraped data with price history to the storage backend"""
+        with self.metrics.phase('save'):
+            self.storage.save(new_products)
+        for listener in self.save_listeners:
+            listener(new_products)
 
-    def _get_product_data(self, product_offset: int = 0, product_limit: int = -1) -> List[Dict[str, Any]]:
+    def _listing_url(self, product_offset: int, size: Optional[int] = None) -> str:
+        """To be implemented by child classes (size defaults to the scraper's page size)"""
+        raise NotImplementedError
+
+    def _read_total(self, soup: BeautifulSoup) -> int:
         """To be implemented by child classes"""
         raise NotImplementedError
+
+    def _fetch_listing(self, product_offset: int) -> BeautifulSoup:
+        """Get a listing page, reusing the first one if _get_total_products already downloaded it"""
+        if product_offset == 0 and self._first_page is not None:
+            soup, self._first_page = self._first_page, None
+            return soup
+        url: str = self._grid_page_url(product_offset) if self.use_grid else self._listing_url(product_offset)
+        with self.metrics.phase('listing_fetch'):
+            response: requests.Response = self._fetch(url)
+        return self._parse(response.content, self.tile_strainer)
+
+    def _grid_page_url(self, product_offset: int) -> str:
+        """Get the URL of the product grid fragment starting at a product offset"""
+        return self.grid_url.format(start=product_offset, size=self.size)
+
+    def _resolve_page_size(self) -> None:
+        """Use the largest listing page (and the grid fragment) the site serves, probing it if not known"""
+        if not self.probe_page_size or not self.preferred_size:
+            return
+        try:
+            probed: Dict[str, Any] = codec.read_file(self.page_size_file)
+            fresh: bool = (probed.get('preferred_size') == self.preferred_size and probed.get('grid_url') == self.grid_url
+                           and time.time() - probed['probed_at'] < self.page_size_ttl)
+        except (FileNotFoundError, DecodeError, KeyError):
+            fresh = False
+        if not fresh:
+            probed = self._probe_page_size()
+            if not probed:
+                return  # The listing gave no products: keep the defaults and probe again next run
+            codec.write_file(self.page_size_file, probed, 'pretty')
+        self.size = max(self.default_size, probed['size'])
+        self.use_grid = probed['grid']
+
+    def _reset_page_size(self) -> None:
+        """Go back to the default listing pages, and probe again next run"""
+        self.size, self.use_grid = self.default_size, False
+        if os.path.exists(self.page_size_file):
+            os.remove(self.page_size_file)
+
+    def _probe_page_size(self) -> Optional[Dict[str, Any]]:
+        """Ask for a listing page of preferred_size products and check the grid fragment serves the same page
+
+        However many tiles the listing returns is the size it accepts, whether it capped the page or
+        the catalogue is smaller than that. The fragment is only used when it returns as many tiles
+        out of the same total, so a fragment of another category, or capped lower, never skips products.
+        """
+        listing: Optional[Tuple[int, Optional[int]]] = self._probe_page(self._listing_url(0, self.preferred_size))
+        if not listing or not listing[0]:
+            return None
+        size: int = listing[0]
+        grid: bool = (bool(self.grid_url) and listing[1] is not None
+                      and self._probe_page(self.grid_url.format(start=0, size=size)) == listing)
+        print(f"{self.retailer}: {'grid fragments' if grid else 'listing pages'} of {size} products")
+        return {'size': size, 'grid': grid, 'preferred_size': self.preferred_size,
+                'grid_url': self.grid_url, 'probed_at': time.time()}
+
+    def _probe_page(self, url: str) -> Optional[Tuple[int, Optional[int]]]:
+        """Number of tiles on a first page and the total it reports (None without one), or None if it failed"""
+        try:
+            response: requests.Response = self._fetch(url)
+        except requests.RequestException:
+            return None
+        soup: BeautifulSoup = self._parse(response.content, self._first_page_strainer())
+        return len(soup.find_all("div", class_="product-tile")), self._read_total_or_none(soup)
+
+    def _first_page_strainer(self) -> SoupStrainer:
+        """Keep the tiles and the total of a first page, which is also scraped for its tiles"""
+        return SoupStrainer(
+            lambda name, attrs: bool(self.tile_strainer.search_tag(name, attrs) or self.total_strainer.search_tag(name, attrs))
+        )
+
+    def _read_total_or_none(self, soup: BeautifulSoup) -> Optional[int]:
+        try:
+            return self._read_total(soup)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _get_product_data(self, product_offset: int = 0, product_limit: int = -1) -> List[Dict[str, Any]]:
+        """Get products from a specific page"""
+        soup: BeautifulSoup = self._fetch_listing(product_offset)
+        return self._scrape_tiles(soup.find_all("div", class_="product-tile"), product_limit)
     
-    def _scrape_product(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
-        """To be implemented by child classes"""
+    def _parse_tile(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
+        """To be implemented by child classes (product dict with 'ean' set to None, the product page 'url' and the retailer's 'item_id')"""
         raise NotImplementedError
 
+    def _scrape_product(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
+        """Extract product information from a product element"""
+        product_data: Optional[Dict[str, Any]] = self._parse_tile(product)
+        if not product_data:
+            return None
+        return self._resolve_ean(product_data)
+
+    def _resolve_ean(self, product_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch the EAN of a parsed tile from its product page
+
+        Products whose EAN can't be found are kept with 'ean' None, so the storage keys them
+        on their own and the product matcher can still pair them by name.
+        """
+        product_data['ean'] = self._extract_ean(product_data['url'])
+        return product_data
+
+    def _scrape_tiles(self, tiles: List[BeautifulSoup], product_limit: int = -1) -> List[Dict[str, Any]]:
+        """Scrape the product tiles of a listing page, fetching their product pages concurrently"""
+        pending: List[Dict[str, Any]] = [data for data in map(self._parse_tile, tiles) if data]
+        self.metrics.count('dropped_tiles', len(tiles) - len(pending))
+        if product_limit < 0:
+            product_limit = len(pending)
+
+        products: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Only resolve as many tiles as still needed, so no product page is fetched
+            # beyond the limit; tiles dropped along the way are replaced by the next ones
+            while pending and len(products) < product_limit:
+                batch = pending[:product_limit - len(products)]
+                pending = pending[len(batch):]
+                resolved = [data for data in executor.map(self._resolve_known_or_ean, batch) if data]
+                self.metrics.count('dropped_tiles', len(batch) - len(resolved))
+                products.extend(resolved)
+
+        return products
+
+    def _resolve_known_or_ean(self, product_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """In incremental mode, take the EAN of a known product seen at the same price, else fetch it"""
+        if self._stopping.is_set():
+            return None  # The page won't be saved, so its product pages aren't fetched
+        if self._known_products is not None:
+            known: Optional[Dict[str, Any]] = (self._known_products.get(('url', product_data['url']))
+                                               or self._known_products.get(('item_id', product_data['item_id'])))
+            # Products stored without an EAN get their product page fetched again, in case it has one now
+            if known and known['price'] == product_data['price'] and has_ean(known['ean']):
+                product_data['ean'] = known['ean']
+                return product_data
+        return self._resolve_ean(product_data)
+
     def _extract_ean(self, product_url: str) -> Optional[str]:
+        """Get the EAN of a product, from the cache or else from its product page"""
+        with self.metrics.phase('ean_resolution'):
+            ean: Optional[str] = self.ean_cache.get(self.retailer, product_url)
+            if ean:
+                self.metrics.count('ean_cache_hits')
+                return ean
+            ean = self._fetch_ean(product_url)
+            if ean:
+                self.ean_cache.set(self.retailer, product_url, ean)
+            return ean
+
+    def _fetch_ean(self, product_url: str) -> Optional[str]:
         """To be implemented by child classes"""
         raise NotImplementedError
 
     def _get_total_products(self) -> int:
-        """To be implemented by child classes"""
-        raise NotImplementedError
+        """Get total number of products to scrape, from the first page of the endpoint the crawl reads
+
+        With a probed page size or grid fragment, the first page must hold a full page (or the whole
+        catalogue), or later pages would start past products it left out; the crawl then falls back
+        to the default listing pages.
+        """
+        probed: bool = self.use_grid or self.size != self.default_size
+        url: str = self._grid_page_url(0) if self.use_grid else self._listing_url(0)
+        with self.metrics.phase('listing_fetch'):
+            response: requests.Response = self._fetch(url)
+        soup: BeautifulSoup = self._parse(response.content, self._first_page_strainer())
+        if not probed:
+            total: int = self._read_total(soup)
+        else:
+            total = self._read_total_or_none(soup)
+            if total is None or len(soup.find_all("div", class_="product-tile")) != min(self.size, total):
+                print(f"{self.retailer}: the probed {'grid fragments' if self.use_grid else 'listing pages'} of "
+                      f"{self.size} products don't hold, using listing pages of {self.default_size}")
+                self._reset_page_size()
+                return self._get_total_products()
+        # The first page is also scraped for tiles later on, so both parts are kept
+        self._first_page = soup
+        self._total = total
+        return total
 
     def _scrape_all_products(self, product_limit: int = -1) -> List[Dict[str, Any]]:
         """Implementation of the abstract method from BaseWineScraper"""
         all_products: List[Dict[str, Any]] = []
-        product_offset: int = 0
+        for _, products in self._scrape_pages(product_limit):
+            all_products.extend(products)
+        return all_products
+
+    def _scrape_pages(self, product_limit: int = -1, product_offset: int = 0,
+                      scraped: int = 0) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Scrape listing pages from product_offset on, yielding the next offset and each page's products"""
+        if self.incremental:
+            self._known_products = self.storage.known_products()
+        self._resolve_page_size()
 
-        if product_limit == -1:
-            product_limit = self._get_total_products()
+        if self.fan_out:
+            yield from self._scrape_pages_fan_out(product_limit, product_offset, scraped)
+            return
+
+        total: Optional[int] = None
+        # A probed page size or grid fragment is checked on the first page whatever the limit
+        if product_limit == -1 or self.use_grid or self.size != self.default_size:
+            total = self._get_total_products()
+            if product_limit == -1 or product_limit > total:
+                product_limit = total
         
-        while len(all_products) < product_limit:
-            products: List[Dict[str, Any]] = self._get_product_data(product_offset, product_limit - len(all_products))
-            if not products:
-                break
-            all_products.extend(products)
-            product_offset += self.size
+        while scraped < product_limit and (total is None or product_offset < total):
+            # Pages are fetched ahead while the current one's product pages are resolved, up to the
+            # last page needed if no tile is dropped; a page left short starts another such run
+            end_offset: int = product_offset + math.ceil((product_limit - scraped) / self.size) * self.size
+            listing_pages = bounded_stage(self._listing_pages(product_offset, end_offset), self.prefetch_pages,
+                                          name=f"{self.retailer}-listing")
+            for offset, soup in listing_pages:
+                products: List[Dict[str, Any]] = self._scrape_tiles(
+                    soup.find_all("div", class_="product-tile"), product_limit - scraped)
+                if not products:
+                    return
+                scraped += len(products)
+                product_offset = offset + self.size
+                yield product_offset, products
+                if scraped >= product_limit:
+                    return
 
-        return all_products
+    def _listing_pages(self, product_offset: int, end_offset: int) -> Iterator[Tuple[int, BeautifulSoup]]:
+        """Fetch the listing pages from product_offset up to end_offset, yielding each offset and page"""
+        for offset in range(product_offset, end_offset, self.size):
+            yield offset, self._fetch_listing(offset)
+
+    def _scrape_pages_fan_out(self, product_limit: int = -1, product_offset: int = 0,
+                              scraped: int = 0) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """Fetch every needed listing page concurrently, yielding their products in offset order"""
+        total: int = self._get_total_products()
+        if product_limit == -1 or product_limit > total:
+            product_limit = total
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Each wave fetches the pages that would fill the limit if no tile was dropped,
+            # and a new wave is only needed when some tiles were
+            while scraped < product_limit and product_offset < total:
+                pages_needed = math.ceil((product_limit - scraped) / self.size)
+                offsets = range(product_offset, min(total, product_offset + pages_needed * self.size), self.size)
+
+                for offset, soup in zip(offsets, executor.map(self._fetch_listing, offsets)):
+                    tiles = soup.find_all("div", class_="product-tile")
+                    products = self._scrape_tiles(tiles, product_limit - scraped)
+                    scraped += len(products)
+                    product_offset = offset + self.size
+                    yield product_offset, products
+                    if scraped >= product_limit:
+                        break
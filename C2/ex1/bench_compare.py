@@ -0,0 +1,71 @@
+from typing import List, Dict, Any  # For type hinting
+from wine_price_comparator import WinePriceComparator  # Price comparison, with the pure-Python and NumPy paths
+from price_table import np  # NumPy, or None when it isn't installed
+import argparse  # For parsing command-line arguments
+import gc  # Built-in garbage collector interface, turned off while timing like timeit does
+import random  # For generating synthetic prices
+import time  # For measuring elapsed time
+
+RETAILERS = ('Continente', 'Auchan', 'Pingo Doce')
+
+def synthetic_data(num_eans: int, history: int = 3, coverage: float = 0.7,
+                   seed: int = 0) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Create wine data for every retailer, each selling a random share of num_eans products"""
+    rng = random.Random(seed)
+    data: Dict[str, Dict[str, Dict[str, Any]]] = {retailer: {} for retailer in RETAILERS}
+    for i in range(num_eans):
+        ean = f"560{i:010d}"
+        for retailer in RETAILERS:
+            if rng.random() > coverage:
+                continue
+            data[retailer][ean] = {
+                'name': f"Vinho {i}",
+                'brand': f"Marca {i % 500}",
+                'quantity': "garrafa 75cl",
+                'price_history': [
+                    {
+                        'price': round(rng.uniform(2, 40), 2),
+                        'price_per_litre': round(rng.uniform(2, 50), 2) if rng.random() > 0.1 else None,
+                        'timestamp': f"2024-03-{day + 1:02d}T10:00:00"
+                    }
+                    for day in range(history)
+                ]
+            }
+    return data
+
+def time_compare(comparator: WinePriceComparator, vectorized: bool, repeat: int) -> float:
+    """Best time in milliseconds for one comparison"""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            comparator.compare_prices(vectorized=vectorized)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pure-Python and NumPy price comparisons")
+    parser.add_argument("sizes", nargs="*", type=int, default=[10000, 100000], help="Numbers of EANs to compare")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times each comparison is run")
+    args = parser.parse_args()
+
+    print(f"{'EANs':>8}{'shared':>9}{'python ms':>12}{'numpy ms':>12}{'speedup':>10}")
+    for size in args.sizes:
+        comparator = WinePriceComparator.from_data(synthetic_data(size))
+        results: List[Dict[str, Any]] = comparator.compare_prices(vectorized=False)
+        python_ms = time_compare(comparator, False, args.repeat)
+        if np is None:
+            print(f"{size:>8}{len(results):>9}{python_ms:>12.1f}{'-':>12}{'-':>10}  (NumPy not installed)")
+            continue
+        # The first NumPy comparison also builds the matrix kept by the table, so it isn't timed
+        if comparator.compare_prices(vectorized=True) != results:
+            raise SystemExit(f"The NumPy comparison differs from the pure-Python one at {size} EANs")
+        numpy_ms = time_compare(comparator, True, args.repeat)
+        print(f"{size:>8}{len(results):>9}{python_ms:>12.1f}{numpy_ms:>12.1f}{python_ms / numpy_ms:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
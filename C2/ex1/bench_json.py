@@ -0,0 +1,58 @@
+from typing import Dict, Any  # For type hinting
+from json_codec import JsonCodec, BACKENDS, FORMATS  # JSON backends installed and the data file formats
+import argparse  # For parsing command-line arguments
+import os  # For file sizes
+import random  # For generating synthetic prices
+import tempfile  # For a scratch directory holding the written files
+import time  # For measuring elapsed time
+
+def synthetic_history(num_records: int, points_per_product: int = 4, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """Create wine data holding num_records price points, spread over products like the scrapers' data files"""
+    rng = random.Random(seed)
+    data: Dict[str, Dict[str, Any]] = {}
+    for i in range(num_records // points_per_product):
+        data[f"560{i:010d}"] = {
+            'name': f"Vinho Tinto Reserva Nº {i}",
+            'brand': f"Marca {i % 500}",
+            'quantity': "garrafa 75cl",
+            'url': f"https://www.continente.pt/produto/vinho-{i}.html",
+            'item_id': str(i),
+            'price_history': [
+                {
+                    'price': round(rng.uniform(2, 40), 2),
+                    'price_per_litre': round(rng.uniform(2, 50), 2),
+                    'timestamp': f"2024-{month + 1:02d}-15T10:00:00.{rng.randrange(10 ** 6):06d}"
+                }
+                for month in range(points_per_product)
+            ]
+        }
+    return data
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark writing and reading a wine data file with each JSON backend and format")
+    parser.add_argument("--records", type=int, default=200000, help="Price points in the synthetic history")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each round trip is run")
+    args = parser.parse_args()
+
+    data = synthetic_history(args.records)
+    print(f"{'backend':<8}{'format':<9}{'write ms':>10}{'read ms':>10}{'size KiB':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'wine_data.json')
+        for backend in BACKENDS:
+            codec = JsonCodec(backend)
+            for json_format in FORMATS:
+                write_time = read_time = float('inf')
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    codec.write_file(path, data, json_format)
+                    write_time = min(write_time, time.perf_counter() - start)
+                    start = time.perf_counter()
+                    loaded = codec.read_file(path)
+                    read_time = min(read_time, time.perf_counter() - start)
+                if loaded != data:
+                    raise SystemExit(f"{backend} changed the data in a {json_format} round trip")
+                print(f"{backend:<8}{json_format:<9}{write_time * 1000:>10.0f}{read_time * 1000:>10.0f}"
+                      f"{os.path.getsize(path) / 1024:>10.0f}")
+
+if __name__ == "__main__":
+    main()
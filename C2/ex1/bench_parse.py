@@ -0,0 +1,82 @@
+from typing import List, Dict, Callable, Optional  # For type hinting
+from bs4 import BeautifulSoup, SoupStrainer  # Library for parsing HTML and XML documents
+from base_scraper import BaseWineScraper, DEFAULT_PARSER  # Base class holding the tile strainer and the default parser
+from continente_scraper import ContinenteWineScraper  # Holds the product page (EAN) strainer
+import argparse  # For parsing command-line arguments
+import time  # For measuring elapsed time
+
+def synthetic_listing_page(num_products: int = 36, chrome_elements: int = 3000, first: int = 0,
+                           total: Optional[int] = None) -> bytes:
+    """Create a listing page shaped like the retailers' ones: a product grid surrounded by site chrome
+
+    The products are numbered from first, and total is the catalogue size the page announces.
+    """
+    chrome = ''.join(
+        f'<li class="menu-item"><a href="/categoria-{i}" class="nav-link">Categoria {i}</a></li>'
+        for i in range(chrome_elements)
+    )
+    tiles = ''.join(f'''
+        <div class="product-tile pwc-tile--grid" data-product-tile-impression='{{"name": "Vinho {i}", "brand": "Marca", "price": "9.99"}}'>
+            <div class="ct-pdp-link"><a href="https://www.continente.pt/produto/vinho-{i}.html"></a></div>
+            <p class="pwc-tile--quantity">garrafa 75cl</p>
+            <span class="ct-price-value">€13,32</span>
+        </div>''' for i in range(first, first + num_products))
+    return (
+        f'<html><head><script>var data = {{}};</script></head><body><nav><ul>{chrome}</ul></nav>'
+        f'<div class="product-grid">{tiles}</div>'
+        f'<div class="col-12 grid-footer" data-total-count="{num_products if total is None else total}"></div>'
+        f'<footer><ul>{chrome}</ul></footer></body></html>'
+    ).encode('utf-8')
+
+def synthetic_product_page(chrome_elements: int = 3000, ean: str = '5601234567890') -> bytes:
+    """Create a product page with a single element holding the EAN"""
+    chrome = ''.join(f'<li class="menu-item"><a href="/categoria-{i}">Categoria {i}</a></li>' for i in range(chrome_elements))
+    return (
+        f'<html><body><nav><ul>{chrome}</ul></nav>'
+        f'<a class="js-details-header pwc-tab" data-url="/detalhes?ean={ean}">Detalhes</a>'
+        f'<footer><ul>{chrome}</ul></footer></body></html>'
+    ).encode('utf-8')
+
+def time_parse(pages: List[bytes], parse: Callable[[bytes], int], repeat: int) -> float:
+    """Average time in milliseconds to parse one page"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parse(page)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the per-page parse time of listing and product pages")
+    parser.add_argument("listing_pages", nargs="*", help="Saved listing pages (default: synthetic pages)")
+    parser.add_argument("--product-pages", nargs="*", default=[], help="Saved product pages (default: a synthetic page)")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of times each page is parsed")
+    args = parser.parse_args()
+
+    listing_pages: List[bytes] = [open(path, 'rb').read() for path in args.listing_pages] or [synthetic_listing_page()]
+    product_pages: List[bytes] = [open(path, 'rb').read() for path in args.product_pages] or [synthetic_product_page()]
+    backends: List[str] = sorted({'html.parser', DEFAULT_PARSER})
+
+    tile_strainer: SoupStrainer = BaseWineScraper.tile_strainer
+    ean_strainer: SoupStrainer = ContinenteWineScraper.ean_strainer
+    cases: Dict[str, Callable[[bytes], int]] = {}
+    for backend in backends:
+        cases[f"listing  {backend:<11} full"] = lambda page, b=backend: len(
+            BeautifulSoup(page, b).find_all("div", class_="product-tile"))
+        cases[f"listing  {backend:<11} strained"] = lambda page, b=backend: len(
+            BeautifulSoup(page, b, parse_only=tile_strainer).find_all("div", class_="product-tile"))
+        cases[f"product  {backend:<11} full"] = lambda page, b=backend: len(
+            BeautifulSoup(page, b).find_all("a", class_="js-details-header"))
+        cases[f"product  {backend:<11} strained"] = lambda page, b=backend: len(
+            BeautifulSoup(page, b, parse_only=ean_strainer).find_all("a", class_="js-details-header"))
+
+    baseline: Dict[str, float] = {}
+    print(f"{'page     parser      mode':<34}{'ms/page':>10}{'speedup':>10}")
+    for name, parse in cases.items():
+        pages = listing_pages if name.startswith("listing") else product_pages
+        elapsed = time_parse(pages, parse, args.repeat)
+        # The speedup is relative to the original path: html.parser on the full document
+        baseline.setdefault(name.split()[0], elapsed)
+        print(f"{name:<34}{elapsed:>10.2f}{baseline[name.split()[0]] / elapsed:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
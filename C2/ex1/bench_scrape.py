@@ -0,0 +1,365 @@
+from typing import List, Dict, Any, Optional, Tuple, Type  # For type hinting
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # Local server replaying recorded pages
+from urllib.parse import urlparse  # Splits URLs into host and path
+from base_scraper import BaseWineScraper  # Base class of the scrapers being measured
+from continente_scraper import ContinenteWineScraper  # Scraper for Continente website
+from auchan_scraper import AuchanWineScraper  # Scraper for Auchan website
+from bench_parse import synthetic_listing_page, synthetic_product_page  # Synthetic pages shaped like Continente's
+from json_codec import codec  # Custom module encoding JSON with the fastest backend installed
+import argparse  # For parsing command-line arguments
+import hashlib  # For naming fixture files after their URL
+import os  # For interacting with the operating system
+import platform  # For recording the Python version next to the results
+import random  # For latency jitter and error injection
+import requests  # HTTP library, for the responses handed to the scrapers
+import shutil  # For removing the scratch data folder
+import subprocess  # For recording the current git commit
+import sys  # For the exit status of compare
+import tempfile  # For a scratch data folder per run
+import threading  # Runs the replay server next to the scraper
+import time  # For measuring elapsed time
+
+SCRAPERS: Dict[str, Type[BaseWineScraper]] = {'continente': ContinenteWineScraper, 'auchan': AuchanWineScraper}
+
+class FixtureStore:
+    """Pages recorded for one retailer: an index from URL to status and body file, plus the bodies"""
+
+    def __init__(self, folder: str) -> None:
+        self.folder: str = folder
+        self.index_file: str = os.path.join(folder, 'index.json')
+        try:
+            self.index: Dict[str, Dict[str, Any]] = codec.read_file(self.index_file)
+        except FileNotFoundError:
+            self.index = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, url: str, status: int, body: bytes, content_type: str = 'text/html; charset=utf-8') -> None:
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, name), 'wb') as f:
+            f.write(body)
+        with self._lock:
+            self.index[url] = {'file': name, 'status': status, 'content_type': content_type}
+
+    def get(self, url: str) -> Optional[Tuple[int, str, bytes]]:
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        with open(os.path.join(self.folder, entry['file']), 'rb') as f:
+            return entry['status'], entry['content_type'], f.read()
+
+    def save(self) -> None:
+        with self._lock:
+            codec.write_file(self.index_file, self.index, 'pretty')
+
+class ReplayServer:
+    """Serves recorded pages on localhost, with added latency and injected server errors
+
+    A page recorded from https://host/path?query is served at /host/path?query. Each request
+    waits latency seconds plus up to jitter more, and fails with a 503 with probability error_rate.
+    """
+
+    def __init__(self, fixtures: FixtureStore, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0) -> None:
+        self.fixtures: FixtureStore = fixtures
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.requests: int = 0
+        self.errors: int = 0
+        self._random: random.Random = random.Random(seed)
+        self._lock: threading.Lock = threading.Lock()
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                replay._serve(self)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url: str = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self._thread: threading.Thread = threading.Thread(target=self.server.serve_forever, name="replay-server", daemon=True)
+
+    def _serve(self, handler: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+            delay: float = self.latency + self._random.uniform(0, self.jitter)
+            fail: bool = self._random.random() < self.error_rate
+            self.errors += fail
+        time.sleep(delay)
+        host, _, path = handler.path.lstrip('/').partition('/')
+        page = None if fail else self.fixtures.get(f"https://{host}/{path}")
+        status, content_type, body = page or (503 if fail else 404, 'text/plain', b'')
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        if fail:
+            handler.send_header('Retry-After', '0')
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def rewrite(self, url: str) -> str:
+        """URL of a recorded page on the replay server"""
+        parts = urlparse(url)
+        return f"{self.url}{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else '')
+
+    def __enter__(self) -> 'ReplayServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (0 to 100) of values, by linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def instrumented(scraper_class: Type[BaseWineScraper], rewrite=None, record: Optional[FixtureStore] = None,
+                 rate: Optional[float] = None) -> Type[BaseWineScraper]:
+    """Subclass of a scraper timing its phases, and optionally sending its requests to a replay
+    server (rewrite) or recording every response (record)"""
+
+    class Instrumented(scraper_class):
+        requests_per_second: float = scraper_class.requests_per_second if rate is None else rate
+
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            super().__init__(*args, **kwargs)
+            self.timings: Dict[str, List[float]] = {'listing': [], 'tile': [], 'ean': [], 'save': []}
+            self.save_sizes: List[int] = []
+            self._timings_lock: threading.Lock = threading.Lock()
+
+        def _timed(self, phase: str, start: float) -> None:
+            with self._timings_lock:
+                self.timings[phase].append(time.perf_counter() - start)
+
+        def _get_with_retries(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+            response = super()._get_with_retries(rewrite(url) if rewrite else url, headers)
+            if record is not None:
+                record.add(url, response.status_code, response.content,
+                           response.headers.get('Content-Type', 'text/html; charset=utf-8'))
+            return response
+
+        def _fetch_listing(self, product_offset: int):
+            start = time.perf_counter()
+            try:
+                return super()._fetch_listing(product_offset)
+            finally:
+                self._timed('listing', start)
+
+        def _parse_tile(self, product):
+            start = time.perf_counter()
+            try:
+                return super()._parse_tile(product)
+            finally:
+                self._timed('tile', start)
+
+        def _extract_ean(self, product_url: str) -> Optional[str]:
+            start = time.perf_counter()
+            try:
+                return super()._extract_ean(product_url)
+            finally:
+                self._timed('ean', start)
+
+        def _save_data(self, products: List[Dict[str, Any]]) -> None:
+            start = time.perf_counter()
+            super()._save_data(products)
+            self._timed('save', start)
+            self.save_sizes.append(data_size(self.data_file))
+
+    # Keep the retailer name, which is taken from the class name
+    Instrumented.__name__ = Instrumented.__qualname__ = scraper_class.__name__
+    return Instrumented
+
+def data_size(data_file: str) -> int:
+    """Bytes of a JSON data file plus its event log"""
+    paths = [data_file, data_file.replace('_wine_data.json', '_wine_events.jsonl')]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def run_scraper(scraper_class: Type[BaseWineScraper], product_limit: int, **options: Any) -> Dict[str, Any]:
+    """Run an instrumented scraper on a scratch data folder and summarise its timings"""
+    folder = tempfile.mkdtemp(prefix='bench_scrape_')
+    try:
+        scraper = scraper_class(folder, http_cache=False, resume=False, **options)
+        summary = scraper.run(product_limit)
+        duration: float = summary['duration']
+        timings = scraper.timings
+        eans_ms = [t * 1000 for t in timings['ean']]
+        return {
+            'success': summary['success'],
+            'products': summary['products'],
+            'duration_s': duration,
+            'pages_per_s': len(timings['listing']) / duration if duration else 0.0,
+            'tiles_per_s': len(timings['tile']) / duration if duration else 0.0,
+            'parse_ms_per_tile': 1000 * sum(timings['tile']) / len(timings['tile']) if timings['tile'] else 0.0,
+            'ean_ms_p50': percentile(eans_ms, 50),
+            'ean_ms_p90': percentile(eans_ms, 90),
+            'ean_ms_p99': percentile(eans_ms, 99),
+            'save_ms_per_batch': 1000 * sum(timings['save']) / len(timings['save']) if timings['save'] else 0.0
+        }
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def save_sweep(scraper_class: Type[BaseWineScraper], products: int = 2000, rounds: int = 10,
+               json_format: str = 'pretty') -> List[Dict[str, float]]:
+    """_save_data time as the data file grows: each round saves every product again, half at a new price"""
+    folder = tempfile.mkdtemp(prefix='bench_save_')
+    try:
+        scraper = scraper_class(folder, http_cache=False, json_format=json_format)
+        rng = random.Random(0)
+        prices: List[float] = [round(rng.uniform(2, 40), 2) for _ in range(products)]
+        points: List[Dict[str, float]] = []
+        for _ in range(rounds):
+            batch = [
+                {'ean': f"560{i:010d}", 'name': f"Vinho {i}", 'brand': "Marca", 'quantity': "garrafa 75cl",
+                 'price': prices[i], 'price_per_litre': round(prices[i] / 0.75, 2),
+                 'url': f"https://www.continente.pt/produto/vinho-{i}.html", 'item_id': str(i)}
+                for i in range(products)
+            ]
+            # Half of the prices change before the next round
+            for i in rng.sample(range(products), products // 2):
+                prices[i] = round(rng.uniform(2, 40), 2)
+            size = data_size(scraper.data_file)
+            start = time.perf_counter()
+            scraper._save_data(batch)
+            points.append({'data_bytes': size, 'save_ms': (time.perf_counter() - start) * 1000})
+        return points
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def synthesize(fixtures_folder: str, pages: int = 5, products_per_page: int = 36) -> None:
+    """Write Continente-shaped synthetic fixtures, for when no pages have been recorded"""
+    scraper_class = ContinenteWineScraper
+    store = FixtureStore(os.path.join(fixtures_folder, 'continente'))
+    scraper = scraper_class(tempfile.gettempdir(), http_cache=False)
+    total = pages * products_per_page
+    for page in range(pages):
+        offset = page * products_per_page
+        store.add(scraper._listing_url(offset), 200,
+                  synthetic_listing_page(products_per_page, first=offset, total=total))
+        for i in range(offset, offset + products_per_page):
+            store.add(f"https://www.continente.pt/produto/vinho-{i}.html", 200,
+                      synthetic_product_page(ean=f"560{i:010d}"))
+    store.save()
+
+def command_record(args: argparse.Namespace) -> None:
+    for name in args.retailers:
+        store = FixtureStore(os.path.join(args.fixtures, name))
+        scraper_class = instrumented(SCRAPERS[name], record=store)
+        result = run_scraper(scraper_class, args.limit)
+        store.save()
+        print(f"{name}: recorded {len(store.index)} pages ({result['products']} products)")
+
+def command_replay(args: argparse.Namespace) -> None:
+    results: Dict[str, Any] = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {'limit': args.limit, 'latency': args.latency, 'jitter': args.jitter,
+                   'error_rate': args.error_rate, 'rate': args.rate, 'fan_out': args.fan_out},
+        'retailers': {}
+    }
+    for name in args.retailers:
+        folder = os.path.join(args.fixtures, name)
+        if not os.path.exists(os.path.join(folder, 'index.json')):
+            print(f"{name}: no fixtures in {folder}, skipped")
+            continue
+        with ReplayServer(FixtureStore(folder), args.latency, args.jitter, args.error_rate) as server:
+            scraper_class = instrumented(SCRAPERS[name], rewrite=server.rewrite, rate=args.rate)
+            result = run_scraper(scraper_class, args.limit, fan_out=args.fan_out, retry_backoff=0.05)
+            result.update(requests=server.requests, injected_errors=server.errors)
+        result['save_sweep'] = save_sweep(SCRAPERS[name], args.sweep_products, args.sweep_rounds)
+        results['retailers'][name] = result
+        print(f"{name}: {result['pages_per_s']:.1f} pages/s, {result['tiles_per_s']:.1f} tiles/s, "
+              f"{result['parse_ms_per_tile']:.2f} ms/tile, EAN p50/p90/p99 {result['ean_ms_p50']:.1f}/"
+              f"{result['ean_ms_p90']:.1f}/{result['ean_ms_p99']:.1f} ms")
+    codec.write_file(args.output, results, 'pretty')
+    print(f"Results written to {args.output}")
+
+# Whether a bigger value of a metric is better, for compare
+HIGHER_IS_BETTER: Dict[str, bool] = {
+    'pages_per_s': True, 'tiles_per_s': True, 'parse_ms_per_tile': False, 'ean_ms_p50': False,
+    'ean_ms_p90': False, 'ean_ms_p99': False, 'save_ms_per_batch': False, 'duration_s': False
+}
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the change of every metric between two result files and return the regressions"""
+    regressions: List[str] = []
+    for retailer, new_result in new['retailers'].items():
+        old_result = old['retailers'].get(retailer)
+        if old_result is None:
+            continue
+        for metric, higher_is_better in HIGHER_IS_BETTER.items():
+            before, after = old_result.get(metric), new_result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = '  REGRESSION'
+                regressions.append(f"{retailer} {metric}")
+            print(f"{retailer:<12}{metric:<20}{before:>12.2f}{after:>12.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+def command_compare(args: argparse.Namespace) -> None:
+    regressions = compare(codec.read_file(args.old), codec.read_file(args.new), args.threshold)
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record retailer pages and benchmark the scrapers against a local replay of them")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'),
+                        help="Folder holding the recorded pages, one subfolder per retailer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Scrape the real sites and record every page fetched")
+    record.add_argument("--limit", type=int, default=72, help="Products to scrape per retailer")
+    record.add_argument("--retailers", nargs="+", choices=sorted(SCRAPERS), default=sorted(SCRAPERS))
+    record.set_defaults(handler=command_record)
+
+    synthetic = commands.add_parser("synthesize", help="Write synthetic Continente fixtures instead of recording")
+    synthetic.add_argument("--pages", type=int, default=5, help="Listing pages to generate")
+    synthetic.set_defaults(handler=lambda args: synthesize(args.fixtures, args.pages))
+
+    replay = commands.add_parser("replay", help="Benchmark the scrapers against the recorded pages")
+    replay.add_argument("--limit", type=int, default=-1, help="Products to scrape per retailer (default: every recorded one)")
+    replay.add_argument("--retailers", nargs="+", choices=sorted(SCRAPERS), default=sorted(SCRAPERS))
+    replay.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response")
+    replay.add_argument("--jitter", type=float, default=0.02, help="Up to this many more seconds, at random")
+    replay.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 503")
+    replay.add_argument("--rate", type=float, default=0.0,
+                        help="Starting requests per second per host (default: 0, unpaced)")
+    replay.add_argument("--fan-out", action="store_true", help="Fetch listing pages concurrently")
+    replay.add_argument("--sweep-products", type=int, default=2000, help="Products saved per round of the save sweep")
+    replay.add_argument("--sweep-rounds", type=int, default=10, help="Rounds of the save sweep")
+    replay.add_argument("--output", default="bench_scrape_results.json", help="Machine-readable results file")
+    replay.set_defaults(handler=command_replay)
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files, failing on regressions")
+    compare_parser.add_argument("old", help="Results of the baseline commit")
+    compare_parser.add_argument("new", help="Results of the commit under test")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    compare_parser.set_defaults(handler=command_compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -6,44 +6,42 @@
 # - Optional: Used for values that could be None (e.g., Optional[str] means str | None)
 from typing import List, Dict, Any, Optional
 import requests  # HTTP library for making web requests
-from bs4 import BeautifulSoup  # Library for parsing HTML and XML documents
+from bs4 import BeautifulSoup, SoupStrainer  # Library for parsing HTML and XML documents, and for restricting parsing to the elements the scraper reads
 import json  # Built-in module for JSON data encoding and decoding
 from datetime import datetime  # Provides classes for working with dates and times
 import os  # Provides functions for interacting with the operating system (file paths, etc.)
 from urllib.parse import urlparse, parse_qs  # Parses URLs into components
-from base_scraper import BaseWineScraper  # Custom module containing the base class for wine scrapers
+from base_scraper import BaseWineScraper, css_class_strainer  # Custom module containing the base class for wine scrapers
 
 class ContinenteWineScraper(BaseWineScraper):
-    def __init__(self, folder: str) -> None:
+    total_strainer: SoupStrainer = css_class_strainer('div', 'grid-footer')
+    ean_strainer: SoupStrainer = css_class_strainer('a', 'js-details-header')
+    # The site serves up to 96 products per page, and just the product grid from Search-UpdateGrid
+    preferred_size: int = 96
+    grid_url: str = ('https://www.continente.pt/on/demandware.store/Sites-continente-Site/default/Search-UpdateGrid'
+                     '?cgid=bebidas-vinhos&srule=FOOD-Bebidas&pmin=0.01&start={start}&sz={size}')
+
+    def __init__(self, folder: str, **options: Any) -> None:
+        options.setdefault('max_workers', 12)  # Product pages fetched at the same time
         super().__init__(
             base_url='https://www.continente.pt/bebidas-e-garrafeira/vinhos/',
             data_file=os.path.join(folder, "continente_wine_data.json"),
-            size=36
+            size=36,
+            **options
         )
 
-    def _get_product_data(self, product_offset: int = 0, product_limit: int = -1) -> List[Dict[str, Any]]:
-        """Get products from a specific page"""
-        url: str = f'{self.base_url}?start={product_offset}&srule=FOOD-Bebidas&pmin=0.01'
-        response: requests.Response = requests.get(url, headers=self.headers)
-        soup: BeautifulSoup = BeautifulSoup(response.content, 'html.parser')
-        
-        products: List[Dict[str, Any]] = []
-        for product in soup.find_all("div", class_="product-tile"):
-            product_data: Optional[Dict[str, Any]] = self._scrape_product(product)
-            if product_data:
-                products.append(product_data)
-            if len(products) >= product_limit:
-                break
-            
-        return products
+    def _listing_url(self, product_offset: int, size: Optional[int] = None) -> str:
+        """Get the URL of the listing page starting at a product offset"""
+        return f'{self.base_url}?start={product_offset}&sz={size or self.size}&srule=FOOD-Bebidas&pmin=0.01'
 
-    def _scrape_product(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
-        """Extract product information from a product element"""
+    def _parse_tile(self, product: BeautifulSoup) -> Optional[Dict[str, Any]]:
+        """Extract product information from a product element, except for its EAN"""
         try:
             impression_data = product.get('data-product-tile-impression')
             name = ""
             brand = ""
             price = 0.0
+            item_id = None
             
             if impression_data:
                 try:
@@ -52,6 +50,7 @@ class ContinenteWineScraper(BaseWineScraper):
                     name = product_info.get('name', '')
                     brand = product_info.get('brand', '')
                     price = float(product_info.get('price', 0))
+                    item_id = product_info.get('id')
                 except json.JSONDecodeError:
                     # Fallback to HTML parsing if JSON fails
                     name = product.find('h2', class_='pwc-tile--description').text.strip()
@@ -63,7 +62,6 @@ class ContinenteWineScraper(BaseWineScraper):
                                 .replace(',', '.'))
 
             link = product.find('div', class_='ct-pdp-link').find('a').get('href')
-            ean = self._extract_ean(link)
             quantity = product.find('p', class_='pwc-tile--quantity').text.strip()
             price_per_litre = float(product.find('span', class_='ct-price-value')
                                 .text.strip()
@@ -71,27 +69,35 @@ class ContinenteWineScraper(BaseWineScraper):
                                 .replace('€', '')
                                 .replace(',', '.'))
 
-            if not all([name, brand, price, ean, quantity, price_per_litre]):
+            # The EAN is checked by the base class once the product page has been fetched
+            if not all([name, brand, price, link, quantity, price_per_litre]):
                 return None
 
             return {
                 'name': name,
                 'brand': brand,
                 'price': price,
-                'ean': ean,
+                'ean': None,
                 'quantity': quantity,
                 'price_per_litre': price_per_litre,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': datetime.now().isoformat(),
+                'url': link,
+                'item_id': item_id
             }
         except Exception as e:
             print(f"Error scraping product: {e}")
+            self.metrics.count('tile_errors')
             return None
 
-    def _extract_ean(self, product_url: str) -> Optional[str]:
-        """Extract EAN from product page"""
+    def _fetch_ean(self, product_url: str) -> Optional[str]:
+        """Extract EAN from product page
+
+        Request errors propagate, so the page is retried or resumed from the checkpoint instead of
+        saving the product without its EAN; None means the page loaded but holds no EAN.
+        """
+        response: requests.Response = self._fetch(product_url)
         try:
-            response: requests.Response = requests.get(product_url, headers=self.headers)
-            soup: BeautifulSoup = BeautifulSoup(response.content, 'html.parser')
+            soup: BeautifulSoup = self._parse(response.content, self.ean_strainer)
             
             for link_element in soup.find_all('a', class_='js-details-header'):
                 data_url: Optional[str] = link_element.get('data-url')
@@ -99,13 +105,12 @@ class ContinenteWineScraper(BaseWineScraper):
                     parsed_url = urlparse(data_url)
                     query_params: Dict[str, List[str]] = parse_qs(parsed_url.query)
                     return query_params.get('ean', [None])[0]
-        except Exception:
+        except Exception as e:
+            print(f"Error extracting EAN: {e}")
+            self.metrics.count('ean_errors')
             return None
 
-    def _get_total_products(self) -> int:
-        """Get total number of pages to scrape"""
-        url: str = f'{self.base_url}?start=0&srule=FOOD-Bebidas&pmin=0.01'
-        response: requests.Response = requests.get(url, headers=self.headers)
-        soup: BeautifulSoup = BeautifulSoup(response.content, 'html.parser')
+    def _read_total(self, soup: BeautifulSoup) -> int:
+        """Get total number of products to scrape from the first listing page"""
         grid_footer = soup.find('div', class_='col-12 grid-footer')
         return int(grid_footer.get('data-total-count'))
@@ -0,0 +1,30 @@
+from typing import List, Optional  # For type hinting
+from json_codec import codec, FORMATS  # Reads JSON files in any format and writes them in the one asked for
+import argparse  # For parsing command-line arguments
+import os  # For file sizes
+
+def convert(path: str, json_format: str, output: Optional[str] = None) -> None:
+    """Rewrite a JSON data file in another format, in place unless an output path is given"""
+    data = codec.read_file(path)
+    codec.write_file(output or path, data, json_format)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert JSON data files between the indented, compact and gzip-compressed formats, "
+                    "e.g. back to indented files for tools reading them with a plain JSON parser")
+    parser.add_argument("files", nargs="+", help="JSON files in any of the formats")
+    parser.add_argument("--format", choices=FORMATS, default="pretty", dest="json_format",
+                        help="Format to write (default: pretty, the original indented format)")
+    parser.add_argument("-o", "--output", help="Output file, when converting a single file (default: in place)")
+    args = parser.parse_args(argv)
+    if args.output and len(args.files) > 1:
+        parser.error("--output needs a single input file")
+
+    for path in args.files:
+        before = os.path.getsize(path)
+        convert(path, args.json_format, args.output)
+        after = os.path.getsize(args.output or path)
+        print(f"{path}: {before} -> {after} bytes ({args.json_format})")
+
+if __name__ == "__main__":
+    main()
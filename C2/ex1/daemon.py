@@ -0,0 +1,127 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Optional
+from base_scraper import BaseWineScraper  # Base class for wine scrapers
+from wine_price_comparator import WinePriceComparator  # Compares wine prices across scrapers
+from product_matcher import ProductMatcher  # Matches products without an EAN to other retailers' products
+from datetime import datetime  # For dating the report files
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import random  # For the jitter added to each retailer's interval
+import signal  # For stopping gracefully on SIGTERM
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+
+# Extension of the dated report files for each report format
+REPORT_EXTENSIONS: Dict[str, str] = {'text': 'txt', 'csv': 'csv', 'jsonl': 'jsonl'}
+
+class ScraperDaemon:
+    """Keeps the scrapers resident, running each retailer on its own interval and rewriting the report
+
+    The scrapers are built once, so their HTTP sessions, EAN and HTTP caches, rate limiters,
+    probed page sizes and loaded data stay warm between cycles. The comparator is loaded once
+    too and then updated with the prices each scraper saves, except with a matcher, whose
+    name matches are only right for the whole data, so the comparator is then rebuilt.
+    """
+
+    def __init__(self, scrapers: List[BaseWineScraper], product_limit: int, output_path: str,
+                 intervals: Dict[str, float], jitter: float = 0.1, report_format: str = 'text',
+                 report_pattern: Optional[str] = None, top: Optional[int] = None,
+                 matcher: Optional[ProductMatcher] = None, vectorized: bool = False) -> None:
+        self.scrapers: List[BaseWineScraper] = scrapers
+        self.product_limit: int = product_limit
+        self.intervals: Dict[str, float] = intervals  # Seconds between the starts of two cycles, by retailer
+        for scraper in scrapers:
+            # A checkpoint older than a cycle was left by an earlier one, which the next cycle replaces
+            scraper.checkpoint_ttl = intervals[scraper.retailer]
+        self.jitter: float = jitter  # Intervals vary at random by up to this fraction, so cycles don't line up
+        self.report_format: str = report_format
+        # strftime pattern of the report files, dated like the ones run_scraper.sh writes
+        self.report_pattern: str = report_pattern or os.path.join(
+            output_path, f"report_%Y-%m-%d.{REPORT_EXTENSIONS[report_format]}")
+        self.top: Optional[int] = top
+        self.matcher: Optional[ProductMatcher] = matcher
+        self.vectorized: bool = vectorized  # Whether prices are compared with NumPy
+        self.comparator: Optional[WinePriceComparator] = None
+        self.cycles: Dict[str, int] = {scraper.retailer: 0 for scraper in scrapers}
+        self._stopping: threading.Event = threading.Event()
+        self._lock: threading.Lock = threading.Lock()  # Guards the comparator
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Load the comparator and start one scheduling thread per retailer"""
+        self.comparator = WinePriceComparator(*self.scrapers, matcher=self.matcher)
+        for scraper in self.scrapers:
+            scraper.save_listeners.append(lambda products, scraper=scraper: self._add_prices(scraper, products))
+            thread = threading.Thread(target=self._schedule, args=(scraper,), name=f"{scraper.retailer}-schedule")
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Stop scheduling cycles and interrupt the running ones after the page being saved"""
+        self._stopping.set()
+        for scraper in self.scrapers:
+            scraper.stop()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def run_forever(self) -> None:
+        """Run until SIGTERM or Ctrl+C, then let the cycles save their progress and exit"""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self.stop())
+        self.start()
+        print(f"Daemon started: {', '.join(f'{r} every {s:g}s' for r, s in self.intervals.items())}")
+        # Signal handlers run on the main thread, so it waits in short steps
+        while not self._stopping.wait(0.5):
+            pass
+        self.join()
+        print("Daemon stopped")
+
+    def _next_delay(self, retailer: str) -> float:
+        return self.intervals[retailer] * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule(self, scraper: BaseWineScraper) -> None:
+        """Run a retailer's cycles until stopped, each starting an interval (plus jitter) after the last one"""
+        while not self._stopping.is_set():
+            started: float = time.monotonic()
+            try:
+                self._cycle(scraper)
+            except Exception as e:
+                # A failed cycle (or report) mustn't end the retailer's schedule
+                print(f"{scraper.retailer} cycle failed: {e!r}")
+            self._stopping.wait(max(0.0, started + self._next_delay(scraper.retailer) - time.monotonic()))
+
+    def _cycle(self, scraper: BaseWineScraper) -> None:
+        summary: Dict[str, Any] = scraper.run(self.product_limit, keep_alive=True)
+        self.cycles[scraper.retailer] += 1
+        status = "OK" if summary['success'] else f"FAILED ({summary['error']})"
+        print(f"{summary['retailer']} cycle {self.cycles[scraper.retailer]}: {status}, "
+              f"{summary['products']} products in {summary['duration']:.1f}s")
+        self.write_report()
+
+    def _add_prices(self, scraper: BaseWineScraper, products: List[Dict[str, Any]]) -> None:
+        """Update the comparator with a page of products the scraper has just saved"""
+        if self.matcher:
+            return
+        # Keyed like the storage keys them, so products without an EAN don't collide
+        keyed: List[Dict[str, Any]] = []
+        for product in products:
+            key: Optional[str] = scraper.storage._key(product)
+            if key:
+                keyed.append(dict(product, ean=key))
+        with self._lock:
+            self.comparator.add_prices(scraper.retailer, keyed)
+
+    def write_report(self) -> str:
+        """Atomically rewrite today's report with the current prices, returning its path"""
+        path: str = datetime.now().strftime(self.report_pattern)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with self._lock:
+            if self.matcher:
+                self.comparator = WinePriceComparator(*self.scrapers, matcher=self.matcher)
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as report:
+                self.comparator.write_report(report, self.report_format, self.top, self.vectorized)
+            # Under the lock, so another retailer's cycle can't rewrite the temporary file meanwhile
+            os.replace(tmp_path, path)
+        return path
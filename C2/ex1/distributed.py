@@ -0,0 +1,152 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Optional, Tuple
+from base_scraper import BaseWineScraper  # Base class for wine scrapers
+from work_queue import WorkQueue, Task, worker_name  # Custom module with the durable queue of crawl tasks
+from concurrent.futures import ThreadPoolExecutor  # Runs the claimed tasks of a worker at the same time
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+
+def enqueue_crawl(queue: WorkQueue, scrapers: List[BaseWineScraper], product_limit: int) -> int:
+    """Queue a listing task per page of every retailer, unless the open crawl already has them; returns the crawl"""
+    crawl: int = queue.open_crawl()
+    for scraper in scrapers:
+        if queue.has_tasks(crawl, scraper.retailer):
+            continue  # Resuming an interrupted crawl
+        # Workers fetch pages of the size probed here, so every page starts where the last one ended
+        scraper._resolve_page_size()
+        # Read even with a limit, so no listing task starts past the last page
+        total: int = scraper._get_total_products()
+        scraper._first_page = None
+        limit: int = total if product_limit == -1 else min(product_limit, total)
+        queue.add(crawl, scraper.retailer, 'listing', [
+            (str(offset), {'offset': offset, 'take': min(scraper.size, limit - offset),
+                           'size': scraper.size, 'grid': scraper.use_grid})
+            for offset in range(0, limit, scraper.size)
+        ])
+    return crawl
+
+def merge_results(queue: WorkQueue, crawl: int, scrapers: List[BaseWineScraper], batch_size: int = 1000) -> int:
+    """Save the products the workers found into each retailer's store; returns how many were saved
+
+    Only the coordinator writes to the stores. Saving a product twice (if the coordinator stopped
+    between saving and marking a batch merged) only records that it was seen at the same price.
+    """
+    merged: int = 0
+    for scraper in scrapers:
+        while True:
+            results: List[Tuple[int, Dict[str, Any]]] = queue.unmerged_results(crawl, scraper.retailer, batch_size)
+            if not results:
+                break
+            scraper._save_data([product for _, product in results])
+            queue.mark_merged([task_id for task_id, _ in results])
+            merged += len(results)
+    return merged
+
+def coordinate(queue: WorkQueue, scrapers: List[BaseWineScraper], product_limit: int,
+               poll_interval: float = 1.0, stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """Queue a crawl (or carry on the open one) and merge its results as workers finish them
+
+    Returns the crawl's task counts by status once no task is pending or leased.
+    """
+    stop = stop or threading.Event()
+    crawl: int = enqueue_crawl(queue, scrapers, product_limit)
+    merged: int = 0
+    while True:
+        merged += merge_results(queue, crawl, scrapers)
+        counts: Dict[str, int] = queue.counts(crawl)
+        if not counts.get('pending') and not counts.get('leased'):
+            break
+        print(f"Crawl {crawl}: {counts.get('done', 0)} tasks done, {counts.get('pending', 0)} pending, "
+              f"{counts.get('leased', 0)} leased, {merged} products merged")
+        if stop.wait(poll_interval):
+            return counts
+    merged += merge_results(queue, crawl, scrapers)
+    queue.finish_crawl(crawl)
+    for scraper in scrapers:
+        scraper.storage.release()
+        scraper.ean_cache.save()
+    print(f"Crawl {crawl} finished: {merged} products merged, {counts.get('failed', 0)} tasks failed")
+    return counts
+
+class CrawlWorker:
+    """Claims crawl tasks from the queue and runs them with the retailers' scrapers
+
+    A listing task fetches its page and queues a product task per tile; a product task resolves
+    the tile's EAN and returns the product, which the coordinator merges. Each worker paces its
+    own requests at the scrapers' rates, unless given a share of a host_rate budget.
+    """
+
+    def __init__(self, queue: WorkQueue, scrapers: List[BaseWineScraper], name: Optional[str] = None,
+                 batch_size: int = 16, lease: float = 300.0, idle_timeout: float = 30.0,
+                 poll_interval: float = 1.0, host_rate: Optional[float] = None, workers: int = 1) -> None:
+        self.queue: WorkQueue = queue
+        self.scrapers: Dict[str, BaseWineScraper] = {scraper.retailer: scraper for scraper in scrapers}
+        # host_rate is the most requests per second a retailer's host gets from the workers altogether,
+        # split evenly between them
+        if host_rate:
+            share: float = host_rate / workers
+            for scraper in scrapers:
+                scraper.requests_per_second = min(scraper.requests_per_second, share)
+                scraper.max_requests_per_second = share
+        self.name: str = name or worker_name()
+        self.batch_size: int = batch_size  # Tasks claimed, and run at the same time, at once
+        self.lease: float = lease  # Seconds a claimed batch has to finish before others may take it over
+        self.idle_timeout: float = idle_timeout  # Seconds without work after which the worker exits
+        self.poll_interval: float = poll_interval
+        self.completed: int = 0
+        self._stopping: threading.Event = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run(self) -> int:
+        """Work until stopped or idle for idle_timeout seconds; returns how many tasks were completed"""
+        for scraper in self.scrapers.values():
+            if scraper.incremental:
+                scraper._known_products = scraper.storage.known_products()
+        idle_since: float = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            while not self._stopping.is_set():
+                tasks: List[Task] = self.queue.claim(self.name, self.batch_size, self.lease)
+                if not tasks:
+                    if time.monotonic() - idle_since >= self.idle_timeout:
+                        break
+                    self._stopping.wait(self.poll_interval)
+                    continue
+                results: List[Tuple[int, Optional[Dict[str, Any]]]] = []
+                for task, (result, error) in zip(tasks, executor.map(self._run_task, tasks)):
+                    if error is None:
+                        results.append((task.id, result))
+                    else:
+                        self.queue.fail(self.name, task, error)
+                self.completed += self.queue.complete(self.name, results)
+                idle_since = time.monotonic()
+        for scraper in self.scrapers.values():
+            scraper.ean_cache.save()
+            scraper.close()
+        return self.completed
+
+    def _run_task(self, task: Task) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Run a task, returning its result or the error that made it fail"""
+        scraper: Optional[BaseWineScraper] = self.scrapers.get(task.retailer)
+        if scraper is None:
+            return None, f"No scraper for {task.retailer} in worker {self.name}"
+        try:
+            if task.kind == 'listing':
+                self._run_listing(scraper, task)
+                return None, None
+            # Tasks interrupted by stop() finish without a result
+            return scraper._resolve_known_or_ean(task.payload), None
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    def _run_listing(self, scraper: BaseWineScraper, task: Task) -> None:
+        # Every listing task of a crawl carries the same page size, probed by the coordinator
+        scraper.size, scraper.use_grid = task.payload['size'], task.payload['grid']
+        soup = scraper._fetch_listing(task.payload['offset'])
+        tiles = soup.find_all("div", class_="product-tile")
+        if not tiles:
+            raise ValueError(f"No products in the listing page at offset {task.payload['offset']}")
+        products: List[Dict[str, Any]] = [data for data in map(scraper._parse_tile, tiles) if data]
+        products = products[:task.payload['take']]
+        self.queue.add(task.crawl, task.retailer, 'product', [(product['url'], product) for product in products])
@@ -0,0 +1,65 @@
+# This line imports Dict, Any, and Optional types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import Dict, Any, Optional
+from collections import OrderedDict  # Dictionary that remembers insertion order, used here as an LRU list
+from json_codec import codec, DecodeError  # Custom module encoding JSON with the fastest backend installed
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+
+class EanCache:
+    """On-disk cache of product URL -> EAN, with TTL and least-recently-used eviction"""
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, max_entries: int = 100000) -> None:
+        self.path: str = path
+        self.ttl: float = ttl  # Seconds an entry stays valid, 0 or less never expires
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: Optional[OrderedDict] = None  # Loaded from disk on first use
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def _key(retailer: str, url: str) -> str:
+        return f"{retailer}|{url}"
+
+    def _load(self) -> OrderedDict:
+        """Load the cache file, oldest entries first"""
+        if self._entries is None:
+            try:
+                self._entries = OrderedDict(codec.read_file(self.path))
+            except (FileNotFoundError, DecodeError):
+                self._entries = OrderedDict()
+        return self._entries
+
+    def get(self, retailer: str, url: str) -> Optional[str]:
+        """Get the cached EAN for a product URL, or None if missing or expired"""
+        key = self._key(retailer, url)
+        with self._lock:
+            entries = self._load()
+            entry: Optional[Dict[str, Any]] = entries.get(key)
+            if entry and self.ttl > 0 and time.time() - entry['timestamp'] > self.ttl:
+                del entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            self.hits += 1
+            return entry['ean']
+
+    def set(self, retailer: str, url: str, ean: str) -> None:
+        """Store the EAN of a product URL, evicting the least recently used entries if full"""
+        key = self._key(retailer, url)
+        with self._lock:
+            entries = self._load()
+            entries[key] = {'ean': ean, 'timestamp': time.time()}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Write the cache back to disk, keeping the LRU order"""
+        with self._lock:
+            if self._entries is None:
+                return
+            codec.write_file(self.path, self._entries)
@@ -1,40 +1,236 @@
-from typing import List  # For type hinting lists
+from typing import List, Dict, Any, Optional  # For type hinting lists and dictionaries
 from continente_scraper import ContinenteWineScraper  # Scraper for Continente website
 from auchan_scraper import AuchanWineScraper  # Scraper for Auchan website
 from wine_price_comparator import WinePriceComparator  # Compares wine prices across scrapers
 from base_scraper import BaseWineScraper  # Base class for wine scrapers
-import sys  # For system-related functions
+from json_codec import FORMATS  # Formats the JSON data files can be written in
+from product_matcher import ProductMatcher  # Matches products without an EAN to other retailers' products
+from report_writers import REPORT_WRITERS  # Formats the comparison report can be written in
+from profiling import Profiler, PROFILE_MODES  # Profiles each scraper run and the comparison
+from daemon import ScraperDaemon  # Keeps the scrapers resident and runs them on a schedule
+from work_queue import WorkQueue  # Durable queue of crawl tasks shared by the coordinator and the workers
+from distributed import coordinate, CrawlWorker  # Splits a crawl into queued tasks and runs them
+from http_cache import HttpCache  # Gives each worker an HTTP cache of its own
+from price_table import np  # NumPy, if installed, for vectorized price comparisons
+import multiprocessing  # For starting local worker processes
+import signal  # For stopping workers gracefully on SIGTERM
+from concurrent.futures import ThreadPoolExecutor  # Runs each scraper in its own thread
+import argparse  # For parsing command-line arguments
 import os  # For interacting with the operating system
+import sys  # For writing the report to standard output
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command-line arguments"""
+    parser = argparse.ArgumentParser(description="Scrape wine prices from several retailers and compare them")
+    parser.add_argument("output_path", help="Directory path for storing scraped data")
+    parser.add_argument("product_limit", nargs="?", type=int, default=-1,
+                        help="Optional integer for number of products to scrape (default: gets every product available in the website)")
+    parser.add_argument("--fan-out", action="store_true",
+                        help="Fetch all listing pages concurrently once the number of products is known")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always download pages instead of revalidating the on-disk HTTP cache")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only fetch product pages of new products and products whose price changed")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start from the first page even if the previous run was interrupted")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json",
+                        help="Where products and price history are stored (default: json)")
+    parser.add_argument("--fixed-page-size", action="store_true",
+                        help="Keep each retailer's default listing page size instead of probing for the largest one")
+    parser.add_argument("--json-format", choices=FORMATS, default="pretty",
+                        help="Format of the JSON data files: indented, compact or gzip-compressed "
+                             "(convert_json.py turns them back into indented files)")
+    parser.add_argument("--match-products", action="store_true",
+                        help="Also compare products stored without an EAN, matched to other retailers' products by name")
+    parser.add_argument("--min-confidence", type=float, default=0.75,
+                        help="Lowest confidence (0 to 1) of a name match to accept (default: 0.75)")
+    parser.add_argument("--report-format", choices=sorted(REPORT_WRITERS), default="text",
+                        help="Format of the comparison report (default: text)")
+    parser.add_argument("--report-file",
+                        help="File the comparison report is written to (default: standard output); in daemon mode "
+                             "a strftime pattern (default: report_%%Y-%%m-%%d.txt in output_path)")
+    parser.add_argument("--top", type=int,
+                        help="Only report the products with the N biggest price differences")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Compare prices with NumPy, faster on large catalogues (needs NumPy installed)")
+    parser.add_argument("--max-workers", type=int,
+                        help="Product pages fetched at the same time by each scraper (default: each retailer's own limit)")
+    parser.add_argument("--profile", nargs="?", choices=PROFILE_MODES, const="cprofile",
+                        help="Profile each scraper run and the price comparison, one at a time: cprofile records "
+                             "every call, sampling takes stack samples with little overhead (default: cprofile)")
+    parser.add_argument("--profile-dir",
+                        help="Folder the profiles are saved to (default: profiles inside output_path)")
+    parser.add_argument("--profile-top", type=int, default=15,
+                        help="Number of hottest functions printed for each profile (default: 15)")
+    parser.add_argument("--sample-interval", type=float, default=0.005,
+                        help="Seconds between stack samples in sampling mode (default: 0.005)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay resident, scraping each retailer on its own interval and rewriting the dated report "
+                             "after each cycle, until SIGTERM")
+    parser.add_argument("--interval", type=float, default=24 * 3600,
+                        help="Seconds between the starts of a retailer's cycles in daemon mode (default: one day)")
+    parser.add_argument("--retailer-interval", action="append", default=[], metavar="RETAILER=SECONDS",
+                        help="Interval of one retailer, e.g. Continente=21600 (can be given several times)")
+    parser.add_argument("--jitter", type=float, default=0.1,
+                        help="Fraction by which intervals vary at random in daemon mode (default: 0.1)")
+    parser.add_argument("--coordinator", action="store_true",
+                        help="Split the crawl into listing and product tasks in a work queue, merge what the workers "
+                             "find into the data files, then compare prices")
+    parser.add_argument("--worker", action="store_true",
+                        help="Run crawl tasks from the work queue until it has been empty for --worker-idle seconds")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Worker processes the coordinator starts on this machine (default: 0, started separately); "
+                             "with --worker, the number of workers in all, which split --host-rate")
+    parser.add_argument("--host-rate", type=float,
+                        help="Most requests per second each retailer gets from all the workers together, split evenly "
+                             "between --workers (default: each worker paces itself like a single scraper)")
+    parser.add_argument("--worker-id", type=int, default=0,
+                        help="Number of this worker, which keeps its own HTTP cache; give each worker sharing "
+                             "output_path its own (default: 0)")
+    parser.add_argument("--queue-file",
+                        help="SQLite database holding the work queue (default: work_queue.sqlite in output_path)")
+    parser.add_argument("--lease", type=float, default=300.0,
+                        help="Seconds a worker has to finish the tasks it claimed before they are retried (default: 300)")
+    parser.add_argument("--max-attempts", type=int, default=5,
+                        help="Times a task is tried before it is given up (default: 5)")
+    parser.add_argument("--worker-idle", type=float, default=30.0,
+                        help="Seconds without tasks after which a worker exits (default: 30)")
+    args = parser.parse_args()
+    if sum((args.daemon, args.coordinator, args.worker)) > 1:
+        parser.error("--daemon, --coordinator and --worker are separate modes")
+    if args.match_products and args.storage == 'sqlite':
+        parser.error("--match-products needs --storage json: the SQLite comparison queries the database directly")
+    if args.vectorized and np is None:
+        parser.error("--vectorized needs NumPy installed")
+    if args.daemon and args.profile:
+        parser.error("--profile profiles a single run and can't be used with --daemon")
+    try:
+        args.retailer_intervals = {
+            retailer: float(seconds) for retailer, seconds in (item.split('=', 1) for item in args.retailer_interval)
+        }
+    except ValueError:
+        parser.error("--retailer-interval takes RETAILER=SECONDS")
+    return args
+
+def run_scrapers(scrapers: List[BaseWineScraper], product_limit: int,
+                 profiler: Optional[Profiler] = None) -> List[Dict[str, Any]]:
+    """Run every scraper at the same time and return their run summaries"""
+    if profiler:
+        # One after the other, so each profile only holds its own scraper's threads
+        summaries: List[Dict[str, Any]] = [
+            profiler.profile(scraper.retailer.lower(), scraper.run, product_limit) for scraper in scrapers
+        ]
+    else:
+        # The scrapers hit different hosts and spend most of their time waiting on the network,
+        # so threads are enough; each one keeps its own session and pool of EAN workers
+        with ThreadPoolExecutor(max_workers=len(scrapers)) as executor:
+            summaries = list(executor.map(lambda scraper: scraper.run(product_limit), scrapers))
+
+    print("\nScraper Summary:")
+    for summary in summaries:
+        status = "OK" if summary['success'] else f"FAILED ({summary['error']})"
+        print(f"{summary['retailer']}: {status}, {summary['products']} products in {summary['duration']:.1f}s")
+    return summaries
 
 def main() -> None:
-    # Checking if the number of arguments is not 2 or 3
-    if len(sys.argv) not in [2, 3]:
-        print(f"Usage: python {sys.argv[0]} output_path [product_limit]")
-        print("output_path: Directory path for storing scraped data")
-        print("product_limit: Optional integer for number of products to scrape (default: gets every product available in the website)")
-        sys.exit(1)
-        
-    output_path = sys.argv[1]
-    product_limit: int = int(sys.argv[2]) if len(sys.argv) == 3 else -1
+    args = parse_args()
+    output_path: str = args.output_path
+    product_limit: int = args.product_limit
     
     # Create output directory if it doesn't exist
     os.makedirs(output_path, exist_ok=True)
     
     # Initialize scrapers with provided output path
-    scrapers: List[BaseWineScraper] = [
-        ContinenteWineScraper(output_path),
-        AuchanWineScraper(output_path)
+    options: Dict[str, Any] = {
+        'fan_out': args.fan_out,
+        'http_cache': not args.no_cache,
+        'storage': args.storage,
+        'incremental': args.incremental,
+        'resume': not args.no_resume,
+        'json_format': args.json_format,
+        'probe_page_size': not args.fixed_page_size
+    }
+    if args.max_workers:
+        options['max_workers'] = args.max_workers
+    scrapers: List[BaseWineScraper] = build_scrapers(output_path, options)
+    queue_file: str = args.queue_file or os.path.join(output_path, 'work_queue.sqlite')
+
+    if args.worker:
+        run_worker(output_path, options, queue_file, args.lease, args.max_attempts, args.worker_idle,
+                   args.worker_id, max(1, args.workers), args.host_rate)
+        return
+
+    if args.daemon:
+        matcher = ProductMatcher(min_confidence=args.min_confidence) if args.match_products else None
+        intervals: Dict[str, float] = {
+            scraper.retailer: args.retailer_intervals.get(scraper.retailer, args.interval) for scraper in scrapers
+        }
+        ScraperDaemon(scrapers, product_limit, output_path, intervals, jitter=args.jitter,
+                      report_format=args.report_format, report_pattern=args.report_file,
+                      top=args.top, matcher=matcher, vectorized=args.vectorized).run_forever()
+        return
+
+    profiler: Optional[Profiler] = None
+    if args.profile:
+        profiler = Profiler(args.profile_dir or os.path.join(output_path, 'profiles'), args.profile,
+                            top=args.profile_top, interval=args.sample_interval)
+
+    if args.coordinator:
+        # Workers only cache what they fetch, and the coordinator alone writes the data files
+        workers = [
+            multiprocessing.Process(target=run_worker, name=f"crawl-worker-{i}",
+                                    args=(output_path, options, queue_file, args.lease, args.max_attempts, args.worker_idle,
+                                          i, args.workers, args.host_rate))
+            for i in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        coordinate(WorkQueue(queue_file, args.max_attempts), scrapers, product_limit)
+        for worker in workers:
+            worker.join()
+    else:
+        # Run all scrapers concurrently
+        run_scrapers(scrapers, product_limit, profiler)
+    
+    # Compare prices across all scrapers, once every one of them has finished
+    matcher = ProductMatcher(min_confidence=args.min_confidence) if args.match_products else None
+    if profiler:
+        profiler.profile('compare_prices', compare_prices, scrapers, matcher, args)
+    else:
+        compare_prices(scrapers, matcher, args)
+
+def build_scrapers(output_path: str, options: Dict[str, Any]) -> List[BaseWineScraper]:
+    """Create a scraper per retailer, keeping their data in output_path"""
+    return [
+        ContinenteWineScraper(output_path, **options),
+        AuchanWineScraper(output_path, **options)
         # Add more scrapers here as needed
     ]
-    
-    # Run all scrapers
+
+def run_worker(output_path: str, options: Dict[str, Any], queue_file: str, lease: float,
+               max_attempts: int, idle_timeout: float, worker_id: int = 0, workers: int = 1,
+               host_rate: Optional[float] = None) -> None:
+    """Run crawl tasks from the work queue until it stays empty, or until SIGTERM"""
+    scrapers: List[BaseWineScraper] = build_scrapers(output_path, options)
     for scraper in scrapers:
-        scraper.run(product_limit)
-    
-    # Compare prices across all scrapers
-    comparator = WinePriceComparator(*scrapers)
-    results = comparator.compare_prices()
-    comparator.print_comparison(results)
+        if scraper.http_cache:
+            # Each worker saves its own cache index, so workers don't overwrite each other's
+            scraper.http_cache = HttpCache(os.path.join(scraper.http_cache.folder, f"worker-{worker_id}"),
+                                           max_bytes=scraper.http_cache.max_bytes)
+    worker = CrawlWorker(WorkQueue(queue_file, max_attempts), scrapers, lease=lease, idle_timeout=idle_timeout,
+                         host_rate=host_rate, workers=workers)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    completed = worker.run()
+    print(f"Worker {worker.name} completed {completed} tasks")
+
+def compare_prices(scrapers: List[BaseWineScraper], matcher: Optional[ProductMatcher], args: argparse.Namespace) -> None:
+    """Load every scraper's data, compare the prices and write the report"""
+    comparator = WinePriceComparator(*scrapers, matcher=matcher)
+    if args.report_file:
+        with open(args.report_file, 'w', encoding='utf-8', newline='') as report:
+            comparator.write_report(report, args.report_format, args.top, args.vectorized)
+    else:
+        comparator.write_report(sys.stdout, args.report_format, args.top, args.vectorized)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
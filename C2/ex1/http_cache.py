@@ -0,0 +1,120 @@
+# This line imports Dict, Any, and Optional types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import Dict, Any, Optional
+from collections import OrderedDict  # Dictionary that remembers insertion order, used here as an LRU list
+import requests  # HTTP library for making web requests
+import hashlib  # Built-in module for hashing, used to name the cached body files
+from json_codec import codec, DecodeError  # Custom module encoding JSON with the fastest backend installed
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import threading  # Built-in module for thread synchronization primitives
+
+class HttpCache:
+    """Disk-backed cache of HTTP response bodies, revalidated with ETag / Last-Modified"""
+
+    def __init__(self, folder: str, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.folder: str = folder
+        self.max_bytes: int = max_bytes
+        self.index_file: str = os.path.join(folder, 'index.json')
+        self.hits: int = 0  # Responses served from disk after a 304
+        self._index: Optional[OrderedDict] = None  # url -> validators and body size, least recently used first
+        self._size: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def _load(self) -> OrderedDict:
+        """Load the cache index on first use"""
+        if self._index is None:
+            try:
+                self._index = OrderedDict(codec.read_file(self.index_file))
+            except (FileNotFoundError, DecodeError):
+                self._index = OrderedDict()
+            self._size = sum(entry['size'] for entry in self._index.values())
+            self._remove_unindexed()
+        return self._index
+
+    def _remove_unindexed(self) -> None:
+        """Delete the bodies missing from the index, stored by a run that crashed before saving it
+
+        They would never be evicted, so the cache would outgrow max_bytes.
+        """
+        indexed = {os.path.basename(self._body_path(url)) for url in self._index}
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.folder, name)
+            # Body files are named after the SHA-1 of their URL
+            if len(name) == 40 and name not in indexed and os.path.isfile(path):
+                os.remove(path)
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.folder, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Get the conditional request headers for a cached URL"""
+        with self._lock:
+            entry: Optional[Dict[str, Any]] = self._load().get(url)
+        headers: Dict[str, str] = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, url: str) -> Optional[requests.Response]:
+        """Build a response from the cached body of a URL, or None if it is no longer cached"""
+        with self._lock:
+            index = self._load()
+            if url not in index:
+                return None
+            try:
+                with open(self._body_path(url), 'rb') as f:
+                    content: bytes = f.read()
+            except FileNotFoundError:
+                self._size -= index.pop(url)['size']
+                return None
+            index.move_to_end(url)
+            self.hits += 1
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = content
+        return response
+
+    def store(self, url: str, response: requests.Response) -> None:
+        """Cache a response body if the server sent validators for it"""
+        etag: Optional[str] = response.headers.get('ETag')
+        last_modified: Optional[str] = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        content: bytes = response.content
+        with self._lock:
+            index = self._load()
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self._body_path(url), 'wb') as f:
+                f.write(content)
+            if url in index:
+                self._size -= index[url]['size']
+            index[url] = {'etag': etag, 'last_modified': last_modified, 'size': len(content)}
+            index.move_to_end(url)
+            self._size += len(content)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used bodies until the cache fits in max_bytes"""
+        while self._size > self.max_bytes and self._index:
+            url, entry = self._index.popitem(last=False)
+            self._size -= entry['size']
+            try:
+                os.remove(self._body_path(url))
+            except FileNotFoundError:
+                pass
+
+    def save(self) -> None:
+        """Write the cache index to disk"""
+        with self._lock:
+            if self._index is None:
+                return
+            codec.write_file(self.index_file, self._index)
@@ -0,0 +1,84 @@
+# This line imports Any, List, Optional and Union types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import Any, List, Optional, Union
+import gzip  # Built-in module for gzip compression
+import json  # Built-in module for JSON data encoding and decoding
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+
+# orjson and ujson encode and decode several times faster than the json module, but they are optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Backends installed, fastest first
+BACKENDS: List[str] = [name for name, module in (('orjson', orjson), ('ujson', ujson)) if module] + ['json']
+
+# File formats: indented like the original data files, on one line, or on one line and gzip-compressed
+FORMATS = ('pretty', 'compact', 'gzip')
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_LEVEL = 6  # Close to the best compression at a fraction of level 9's time
+
+# Every backend raises a subclass of ValueError on malformed input (json.JSONDecodeError included)
+DecodeError = ValueError
+
+class JsonCodec:
+    """JSON encoding and decoding through the fastest backend installed, or the one named
+
+    Every backend writes UTF-8 without escaping non-ASCII characters, so their output is
+    interchangeable.
+    """
+
+    def __init__(self, backend: Optional[str] = None) -> None:
+        backend = backend or BACKENDS[0]
+        if backend not in BACKENDS:
+            raise ValueError(f"JSON backend {backend!r} is not installed, expected one of {', '.join(BACKENDS)}")
+        self.backend: str = backend
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        """Encode obj as UTF-8 JSON, indented by two spaces if pretty"""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        if self.backend == 'ujson':
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False,
+                               indent=2 if pretty else 0).encode('utf-8')
+        if pretty:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """Decode JSON from bytes or a string"""
+        if self.backend == 'orjson':
+            return orjson.loads(data)
+        if self.backend == 'ujson':
+            return ujson.loads(data)
+        return json.loads(data)
+
+    def read_file(self, path: str) -> Any:
+        """Read a JSON file in any of the formats, recognising gzip-compressed ones by their header"""
+        with open(path, 'rb') as f:
+            data: bytes = f.read()
+        if data.startswith(GZIP_MAGIC):
+            data = gzip.decompress(data)
+        return self.loads(data)
+
+    def write_file(self, path: str, obj: Any, json_format: str = 'compact') -> None:
+        """Atomically write obj to a JSON file in the given format"""
+        if json_format not in FORMATS:
+            raise ValueError(f"Unknown JSON file format {json_format!r}, expected one of {', '.join(FORMATS)}")
+        data: bytes = self.dumps(obj, pretty=json_format == 'pretty')
+        if json_format == 'gzip':
+            # mtime=0 keeps the output identical for identical data
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+# Shared codec using the fastest backend installed
+codec: JsonCodec = JsonCodec()
@@ -0,0 +1,121 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Iterator, Tuple
+from contextlib import contextmanager  # Turns the phase timer into a with block
+from datetime import datetime  # For the time the run started
+from json_codec import codec  # Custom module encoding JSON with the fastest backend installed
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+
+# Phases of a scraper run, each timed separately
+PHASES: Tuple[str, ...] = ('listing_fetch', 'parse', 'ean_resolution', 'save')
+# Events counted during a run; body_bytes adds up the response bodies as decoded by requests,
+# so gzip-compressed responses count more bytes than went over the wire
+COUNTERS: Tuple[str, ...] = ('requests', 'body_bytes', 'retries', 'http_cache_hits', 'ean_cache_hits',
+                             'dropped_tiles', 'tile_errors', 'ean_errors', 'products')
+# Upper bounds in seconds of the phase duration histogram buckets, as in Prometheus
+BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+PROMETHEUS_PREFIX: str = 'wine_scraper'
+
+class PhaseTimer:
+    """Number, total, longest and histogram of the durations of one phase"""
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+        self.buckets: List[int] = [0] * len(BUCKETS)  # Durations up to each bound, not cumulative
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_s': self.total / self.count if self.count else 0.0,
+            'max_s': self.max,
+            'buckets': {('+Inf' if bound == float('inf') else str(bound)): n for bound, n in zip(BUCKETS, self.buckets)}
+        }
+
+class ScraperMetrics:
+    """Phase timings and event counters of one scraper run, safe to update from the worker threads
+
+    Phases run in several threads at once, so their totals add up the time of every thread
+    and can exceed the duration of the run.
+    """
+
+    def __init__(self, retailer: str) -> None:
+        self.retailer: str = retailer
+        self.started: str = datetime.now().isoformat()
+        self._start: float = time.perf_counter()
+        self.phases: Dict[str, PhaseTimer] = {phase: PhaseTimer() for phase in PHASES}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self._lock: threading.Lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the with block as one occurrence of a phase"""
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase].observe(seconds)
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Metrics of the run so far, as plain data"""
+        with self._lock:
+            return {
+                'retailer': self.retailer,
+                'started': self.started,
+                'duration_s': time.perf_counter() - self._start,
+                'phases': {name: timer.snapshot() for name, timer in self.phases.items()},
+                'counters': dict(self.counters)
+            }
+
+    def to_prometheus(self) -> str:
+        """Metrics of the run so far in the Prometheus text exposition format"""
+        snapshot: Dict[str, Any] = self.snapshot()
+        label: str = f'retailer="{self.retailer}"'
+        lines: List[str] = [
+            f"# HELP {PROMETHEUS_PREFIX}_phase_seconds Time spent in each phase of a scraper run",
+            f"# TYPE {PROMETHEUS_PREFIX}_phase_seconds histogram"
+        ]
+        for name, phase in snapshot['phases'].items():
+            labels = f'{label},phase="{name}"'
+            cumulative: int = 0
+            for bound, n in phase['buckets'].items():
+                cumulative += n
+                lines.append(f'{PROMETHEUS_PREFIX}_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{PROMETHEUS_PREFIX}_phase_seconds_sum{{{labels}}} {phase['total_s']}")
+            lines.append(f"{PROMETHEUS_PREFIX}_phase_seconds_count{{{labels}}} {phase['count']}")
+        for counter, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter")
+            lines.append(f"{PROMETHEUS_PREFIX}_{counter}_total{{{label}}} {value}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_run_duration_seconds{{{label}}} {snapshot['duration_s']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: str, prometheus_path: str) -> None:
+        """Atomically write the metrics as JSON and in the Prometheus text format"""
+        codec.write_file(json_path, self.snapshot(), 'pretty')
+        tmp_path = prometheus_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, prometheus_path)
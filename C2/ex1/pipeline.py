@@ -0,0 +1,59 @@
+# This line imports Iterator, Optional and TypeVar from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import Iterator, Optional, TypeVar
+import queue  # Built-in module with thread-safe queues
+import threading  # Built-in module for threads and thread synchronization primitives
+
+T = TypeVar('T')
+
+class _StageEnd:
+    """Marks the end of a stage's items, carrying the error that stopped it if any"""
+
+    def __init__(self, error: Optional[BaseException] = None) -> None:
+        self.error: Optional[BaseException] = error
+
+def bounded_stage(source: Iterator[T], maxsize: int = 2, name: str = 'stage') -> Iterator[T]:
+    """Run a generator in its own thread, handing its items over through a queue of maxsize items
+
+    The producer blocks once maxsize items are waiting, so a slow consumer holds back the
+    stages before it instead of letting items pile up in memory. Errors raised by the source
+    are raised again in the consumer, and closing the consumer stops the producer.
+    """
+    items: queue.Queue = queue.Queue(maxsize=maxsize)
+    stopped: threading.Event = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in source:
+                if not put(item):
+                    break
+        except BaseException as e:
+            put(_StageEnd(e))
+            return
+        finally:
+            close = getattr(source, 'close', None)
+            if close:
+                close()
+        put(_StageEnd())
+
+    producer = threading.Thread(target=produce, name=name, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, _StageEnd):
+                if item.error:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stopped.set()
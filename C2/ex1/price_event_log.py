@@ -0,0 +1,153 @@
+# This line imports List, Dict, Any, and Optional types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import List, Dict, Any, Optional
+from json_codec import codec, DecodeError  # Custom module encoding JSON with the fastest backend installed
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import threading  # Built-in module for threads and thread synchronization primitives
+
+# Product details kept besides the price history
+PRODUCT_INFO_FIELDS = ('name', 'brand', 'quantity', 'url', 'item_id')
+
+class PriceEventLog:
+    """Wine data stored as a JSON snapshot plus an append-only JSONL log of the changes since it
+
+    Event types:
+    - new: a product seen for the first time, with its details and first price
+    - price: a new price point for a known product
+    - info: new name, brand, quantity, product URL or item id for a known product
+    - seen: known products found again at their last price (with a list of EANs)
+    """
+
+    def __init__(self, snapshot_file: str, log_file: str, compact_every: int = 5000,
+                 json_format: str = 'pretty') -> None:
+        self.snapshot_file: str = snapshot_file
+        self.log_file: str = log_file
+        self.compact_every: int = compact_every  # Number of logged events that triggers a compaction
+        # Snapshot file format ('pretty', 'compact' or 'gzip'); snapshots in any format can be read
+        self.json_format: str = json_format
+        # Log being folded into the snapshot, moved aside so appends carry on in a new log meanwhile
+        self.segment_file: str = log_file + '.compacting'
+        self._logged_events: Optional[int] = None  # Events in the log file, counted on first use
+        self._lock: threading.Lock = threading.Lock()  # Guards the log files
+        self._compact_lock: threading.Lock = threading.Lock()  # One compaction at a time
+        self._compaction: Optional[threading.Thread] = None
+
+    @staticmethod
+    def apply(data: Dict[str, Dict[str, Any]], event: Dict[str, Any]) -> None:
+        """Apply an event to the wine data; replaying an event twice has no further effect"""
+        if event['type'] == 'seen':
+            for ean in event['eans']:
+                if ean in data:
+                    data[ean]['last_seen'] = event['timestamp']
+            return
+
+        ean: str = event['ean']
+        point = {
+            'price': event.get('price'),
+            'price_per_litre': event.get('price_per_litre'),
+            'timestamp': event.get('timestamp')
+        }
+        if event['type'] == 'new':
+            if ean not in data:
+                data[ean] = {
+                    'name': event['name'],
+                    'brand': event['brand'],
+                    'quantity': event['quantity'],
+                    'url': event.get('url'),
+                    'item_id': event.get('item_id'),
+                    'price_history': [point]
+                }
+        elif event['type'] == 'price':
+            history: List[Dict[str, Any]] = data[ean]['price_history']
+            # ISO timestamps sort chronologically, so points already in the snapshot are skipped; a later
+            # event with the latest point's timestamp (the product twice in one save) replaces it
+            if point['timestamp'] > history[-1]['timestamp']:
+                history.append(point)
+            elif point['timestamp'] == history[-1]['timestamp']:
+                history[-1] = point
+        elif event['type'] == 'info':
+            data[ean].update({key: event[key] for key in PRODUCT_INFO_FIELDS if key in event})
+
+    def _read_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return codec.read_file(self.snapshot_file)
+        except FileNotFoundError:
+            return {}
+
+    def _replay_log(self, data: Dict[str, Dict[str, Any]], log_file: Optional[str] = None) -> int:
+        """Apply the events of a log (by default the current one) to data and return how many there were"""
+        count: int = 0
+        try:
+            with open(log_file or self.log_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        event: Dict[str, Any] = codec.loads(line)
+                    except DecodeError:
+                        # Last line cut short by a crash while appending
+                        continue
+                    self.apply(data, event)
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _count_logged_events(self) -> int:
+        try:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the snapshot and replay the log on top of it, after any log still being compacted"""
+        with self._lock:
+            data = self._read_snapshot()
+            # Replaying a segment already folded into the snapshot changes nothing
+            self._replay_log(data, self.segment_file)
+            self._logged_events = self._replay_log(data)
+            return data
+
+    def append(self, events: List[Dict[str, Any]]) -> None:
+        """Append events to the log, compacting it in the background once it gets long"""
+        if not events:
+            return
+        with self._lock:
+            if self._logged_events is None:
+                self._logged_events = self._count_logged_events()
+            os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+            with open(self.log_file, 'ab') as f:
+                f.writelines(codec.dumps(event) + b'\n' for event in events)
+            self._logged_events += len(events)
+            start_compaction: bool = self._logged_events >= self.compact_every and (
+                self._compaction is None or not self._compaction.is_alive())
+        if start_compaction:
+            self._compaction = threading.Thread(target=self.compact, name=f"compact-{os.path.basename(self.log_file)}")
+            self._compaction.start()
+
+    def compact(self) -> None:
+        """Fold the log into a new snapshot, holding up appends only while the log is moved aside"""
+        with self._compact_lock:
+            with self._lock:
+                if os.path.exists(self.log_file):
+                    if os.path.exists(self.segment_file):
+                        # A compaction that crashed left its segment, which is folded with the log
+                        with open(self.log_file, 'rb') as log, open(self.segment_file, 'ab') as segment:
+                            segment.write(log.read())
+                        os.remove(self.log_file)
+                    else:
+                        os.replace(self.log_file, self.segment_file)
+                self._logged_events = 0
+            data = self._read_snapshot()
+            if self._replay_log(data, self.segment_file):
+                codec.write_file(self.snapshot_file, data, self.json_format)
+            # A crash before this point leaves the segment, which is replayed harmlessly
+            with self._lock:
+                if os.path.exists(self.segment_file):
+                    os.remove(self.segment_file)
+
+    def wait(self) -> None:
+        """Wait for a running background compaction to finish"""
+        if self._compaction is not None:
+            self._compaction.join()
@@ -0,0 +1,420 @@
+# This line imports List, Dict, Any, Optional, Tuple and Iterator types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Sequence, Union
+from array import array  # Built-in module for compact arrays of numbers
+from collections import deque  # Double-ended queues, for the sliding windows of the rolling statistics
+import bisect  # Built-in module for binary search over sorted sequences
+from datetime import datetime, timedelta, timezone  # For converting ISO timestamps to and from epoch seconds
+import math  # Built-in module for mathematical functions (NaN checks)
+import sys  # Built-in module, for interning repeated strings
+
+# NumPy makes comparisons across many products much faster, but it is optional
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Naive timestamps are counted from a naive epoch, so no local timezone or DST rules are involved
+EPOCH = datetime(1970, 1, 1)
+
+DAY: float = 86400.0
+# Downsampling periods, in seconds
+PERIODS: Dict[str, float] = {'day': DAY, 'week': 7 * DAY}
+# 1970-01-01 was a Thursday, so weeks are shifted by four days to start on Mondays
+PERIOD_OFFSETS: Dict[str, float] = {'day': 0.0, 'week': 4 * DAY}
+
+# Time range bounds: ISO timestamps or datetimes, with None for an open end
+TimeBound = Union[str, datetime, None]
+
+def to_epoch(timestamp: Union[str, datetime]) -> float:
+    """Convert an ISO timestamp or a datetime to seconds since the epoch"""
+    moment = timestamp if isinstance(timestamp, datetime) else datetime.fromisoformat(timestamp)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return (moment - EPOCH).total_seconds()
+
+def from_epoch(seconds: float) -> str:
+    """Convert seconds since the epoch back to the ISO timestamp written by the scrapers"""
+    # timedelta rounds to whole microseconds, which undoes the float rounding of to_epoch
+    return (EPOCH + timedelta(seconds=seconds)).isoformat()
+
+def _bound(value: TimeBound, default: float) -> float:
+    return default if value is None else to_epoch(value)
+
+def period_start(seconds: float, period: str) -> float:
+    """Start of the day or week (starting on Monday) holding a point in time"""
+    length, offset = PERIODS[period], PERIOD_OFFSETS[period]
+    return (seconds - offset) // length * length + offset
+
+def series_span(timestamps: Sequence[float], lo: int, hi: int, start: float, end: float) -> Tuple[int, int]:
+    """Rows, between lo and hi, of the points with start <= timestamp < end, by binary search"""
+    return bisect.bisect_left(timestamps, start, lo, hi), bisect.bisect_left(timestamps, end, lo, hi)
+
+def series_stats(timestamps: Sequence[float], prices: Sequence[float], lo: int, hi: int,
+                 start: float, end: float) -> Optional[Dict[str, float]]:
+    """Lowest, highest and mean price in effect between start and end, or None if there was none
+
+    Only price changes are stored, so the point before start (the price still in effect
+    when the range begins) counts too.
+    """
+    first, last = series_span(timestamps, lo, hi, start, end)
+    if first > lo and (first == last or timestamps[first] > start):
+        first -= 1
+    if first == last:
+        return None
+    window = prices[first:last]
+    return {'min': min(window), 'max': max(window), 'mean': sum(window) / len(window), 'points': last - first}
+
+def downsample_series(timestamps: Sequence[float], prices: Sequence[float], lo: int, hi: int, period: str,
+                      start: float, end: float) -> List[Dict[str, Any]]:
+    """Lowest, highest, mean and closing price of each day or week between start and end
+
+    Periods without a price change carry the price in effect forward. Without an end, the
+    last period is the one holding the latest point.
+    """
+    if lo == hi:
+        return []
+    length: float = PERIODS[period]
+    bucket: float = period_start(max(start, timestamps[lo]), period)
+    if end == math.inf:
+        end = period_start(timestamps[hi - 1], period) + length
+    i: int = bisect.bisect_left(timestamps, bucket, lo, hi)
+    current: Optional[float] = prices[i - 1] if i > lo else None
+    buckets: List[Dict[str, Any]] = []
+    while bucket < end:
+        bucket_end = bucket + length
+        values: List[float] = [] if current is None else [current]
+        while i < hi and timestamps[i] < bucket_end:
+            values.append(prices[i])
+            i += 1
+        if values:
+            current = values[-1]
+            buckets.append({'timestamp': from_epoch(bucket), 'min': min(values), 'max': max(values),
+                            'mean': sum(values) / len(values), 'close': current})
+        bucket = bucket_end
+    return buckets
+
+class RollingStats:
+    """Lowest, highest and mean price over a sliding time window, updated as points arrive
+
+    The window ends at the latest point, or later once advance() is called, and counts the
+    price in effect at its start. Monotonic deques of candidate minimums and maximums make
+    each update amortised O(1).
+    """
+
+    __slots__ = ('window', 'points', 'lows', 'highs', 'total', 'now', '_added')
+
+    def __init__(self, window: float) -> None:
+        self.window: float = window  # Length in seconds
+        self.points: deque = deque()  # (sequence number, timestamp, price), oldest first
+        self.lows: deque = deque()  # (sequence number, price) with increasing prices
+        self.highs: deque = deque()  # (sequence number, price) with decreasing prices
+        self.total: float = 0.0
+        self.now: float = -math.inf  # End of the window
+        self._added: int = 0
+
+    def add(self, timestamp: float, price: float) -> None:
+        """Add a point newer than the ones added before"""
+        seq: int = self._added
+        self._added += 1
+        self.points.append((seq, timestamp, price))
+        self.total += price
+        while self.lows and self.lows[-1][1] >= price:
+            self.lows.pop()
+        self.lows.append((seq, price))
+        while self.highs and self.highs[-1][1] <= price:
+            self.highs.pop()
+        self.highs.append((seq, price))
+        self.advance(timestamp)
+
+    def advance(self, now: float) -> None:
+        """Move the end of the window forward to now, dropping the points left behind"""
+        self.now = max(self.now, now)
+        cutoff: float = self.now - self.window
+        # The oldest point stays while it is still the price in effect at the start of the window
+        while len(self.points) >= 2 and self.points[1][1] <= cutoff:
+            seq, _, price = self.points.popleft()
+            self.total -= price
+            if self.lows[0][0] == seq:
+                self.lows.popleft()
+            if self.highs[0][0] == seq:
+                self.highs.popleft()
+
+    def stats(self) -> Optional[Dict[str, float]]:
+        if not self.points:
+            return None
+        return {'min': self.lows[0][1], 'max': self.highs[0][1], 'mean': self.total / len(self.points),
+                'points': len(self.points)}
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+class ProductRecord:
+    """Details of one product at one retailer, with the rows of its price history"""
+
+    __slots__ = ('ean', 'name', 'brand', 'quantity', 'url', 'item_id', 'start', 'stop')
+
+    def __init__(self, ean: str, name: str, brand: str, quantity: str, url: Optional[str],
+                 item_id: Optional[str], start: int, stop: int) -> None:
+        self.ean: str = ean
+        self.name: str = name
+        self.brand: str = brand
+        self.quantity: str = quantity
+        self.url: Optional[str] = url
+        self.item_id: Optional[str] = item_id
+        self.start: int = start  # First row of the price history in the retailer's columns
+        self.stop: int = stop  # One past the last row
+
+class RetailerColumns:
+    """Price histories of every product of a retailer, stored as parallel arrays of doubles
+
+    A product's history is the contiguous slice [start, stop) of each column, oldest first.
+    Missing prices per litre are stored as NaN.
+    """
+
+    __slots__ = ('products', 'prices', 'prices_per_litre', 'timestamps', 'unused')
+
+    def __init__(self) -> None:
+        self.products: List[ProductRecord] = []
+        self.prices: array = array('d')
+        self.prices_per_litre: array = array('d')
+        self.timestamps: array = array('d')  # Seconds since the epoch
+        self.unused: int = 0  # Rows left behind by histories moved to the end to grow
+
+    def add(self, ean: str, product: Dict[str, Any]) -> int:
+        """Append a product in the nested JSON form and return its row"""
+        start: int = len(self.prices)
+        for point in product['price_history']:
+            self.prices.append(point['price'])
+            ppl = point.get('price_per_litre')
+            self.prices_per_litre.append(math.nan if ppl is None else ppl)
+            self.timestamps.append(to_epoch(point['timestamp']))
+        self.products.append(ProductRecord(
+            _intern(ean), _intern(product.get('name')), _intern(product.get('brand')), _intern(product.get('quantity')),
+            product.get('url'), _intern(product.get('item_id')), start, len(self.prices)))
+        return len(self.products) - 1
+
+    def latest(self, row: int) -> Tuple[float, Optional[float]]:
+        """Latest price and price per litre of the product in a row"""
+        last: int = self.products[row].stop - 1
+        ppl: float = self.prices_per_litre[last]
+        return self.prices[last], None if math.isnan(ppl) else ppl
+
+    def append(self, row: int, price: float, price_per_litre: Optional[float], timestamp: float) -> bool:
+        """Add a price point to the history of the product in a row, unless it isn't newer than the latest"""
+        record = self.products[row]
+        if timestamp <= self.timestamps[record.stop - 1]:
+            return False
+        if record.stop != len(self.prices):
+            # Only the history at the end of the columns can grow in place
+            self.unused += record.stop - record.start
+            start: int = len(self.prices)
+            for column in (self.prices, self.prices_per_litre, self.timestamps):
+                column.extend(column[record.start:record.stop])
+            record.start, record.stop = start, len(self.prices)
+        self.prices.append(price)
+        self.prices_per_litre.append(math.nan if price_per_litre is None else price_per_litre)
+        self.timestamps.append(timestamp)
+        record.stop += 1
+        if self.unused > len(self.prices) // 2:
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        """Copy the histories into new columns, dropping the unused rows"""
+        prices, prices_per_litre, timestamps = array('d'), array('d'), array('d')
+        for record in self.products:
+            start: int = len(prices)
+            prices.extend(self.prices[record.start:record.stop])
+            prices_per_litre.extend(self.prices_per_litre[record.start:record.stop])
+            timestamps.extend(self.timestamps[record.start:record.stop])
+            record.start, record.stop = start, len(prices)
+        self.prices, self.prices_per_litre, self.timestamps = prices, prices_per_litre, timestamps
+        self.unused = 0
+
+    def history(self, row: int, start: float = -math.inf, end: float = math.inf) -> List[Dict[str, Any]]:
+        """Price history of the product in a row, in the nested JSON form, with start <= timestamp < end"""
+        record = self.products[row]
+        first, last = series_span(self.timestamps, record.start, record.stop, start, end)
+        return [
+            {
+                'price': self.prices[i],
+                'price_per_litre': None if math.isnan(self.prices_per_litre[i]) else self.prices_per_litre[i],
+                'timestamp': from_epoch(self.timestamps[i])
+            }
+            for i in range(first, last)
+        ]
+
+    def stats(self, row: int, start: float = -math.inf, end: float = math.inf) -> Optional[Dict[str, float]]:
+        record = self.products[row]
+        return series_stats(self.timestamps, self.prices, record.start, record.stop, start, end)
+
+    def downsample(self, row: int, period: str, start: float = -math.inf,
+                   end: float = math.inf) -> List[Dict[str, Any]]:
+        record = self.products[row]
+        return downsample_series(self.timestamps, self.prices, record.start, record.stop, period, start, end)
+
+class PriceTable:
+    """Compact in-memory copy of every retailer's wine data, indexed by EAN
+
+    Strings repeated across products and retailers are interned, and prices and timestamps
+    live in arrays instead of one dict per price point. The index maps each EAN to the
+    (retailer, row) pairs holding it, in retailer order, so comparisons never scan products sold by
+    one retailer only.
+    """
+
+    def __init__(self) -> None:
+        self.retailers: List[str] = []
+        self.columns: List[RetailerColumns] = []
+        self.index: Dict[str, List[Tuple[int, int]]] = {}
+        self._latest: Optional[Tuple[List[str], List[str], List[Tuple[int, ...]], Any, Any]] = None
+        # Lowest confidence of the name matches merged into a key's group, for groups not joined by EAN alone
+        self.match_confidence: Dict[str, float] = {}
+        # Rolling statistics of a (retailer, row) pair by window length, built on first use
+        self._rolling: Dict[Tuple[int, int], Dict[float, RollingStats]] = {}
+
+    def add_retailer(self, retailer: str, data: Dict[str, Dict[str, Any]]) -> None:
+        """Add a retailer's wine data, as loaded from its storage"""
+        retailer_id: int = len(self.retailers)
+        self._latest = None
+        self.retailers.append(sys.intern(retailer))
+        columns = RetailerColumns()
+        self.columns.append(columns)
+        for ean, product in data.items():
+            if not product.get('price_history'):
+                continue
+            row: int = columns.add(ean, product)
+            self.index.setdefault(columns.products[row].ean, []).append((retailer_id, row))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def shared_products(self, min_retailers: int = 2) -> Iterator[Tuple[str, List[Tuple[int, int]]]]:
+        """EANs sold by at least min_retailers retailers, with their (retailer, row) pairs"""
+        for ean, rows in self.index.items():
+            if len(rows) >= min_retailers:
+                yield ean, rows
+
+    def link(self, key: str, into: str, confidence: float) -> None:
+        """Merge the products under key into the group of another key, as found by the product matcher"""
+        # Groups stay in retailer order, which both comparison paths rely on to break price ties alike
+        self.index[into] = sorted(self.index[into] + self.index.pop(key))
+        self.match_confidence[into] = min(confidence, self.match_confidence.pop(key, 1.0),
+                                          self.match_confidence.get(into, 1.0))
+        self._latest = None
+
+    def find_row(self, retailer_id: int, ean: str) -> Optional[int]:
+        """Row of a product in a retailer's columns, or None if the retailer doesn't sell it"""
+        return next((row for rid, row in self.index.get(ean, []) if rid == retailer_id), None)
+
+    def record(self, retailer_id: int, row: int) -> ProductRecord:
+        return self.columns[retailer_id].products[row]
+
+    def add_point(self, retailer: str, ean: str, point: Dict[str, Any],
+                  product: Optional[Dict[str, Any]] = None) -> bool:
+        """Add a new price point of a product, with the product's details if the retailer may not have it yet
+
+        Points no newer than the product's latest one are ignored. Returns whether the point was added.
+        """
+        if retailer not in self.retailers:
+            self.add_retailer(retailer, {})
+        retailer_id: int = self.retailers.index(retailer)
+        columns = self.columns[retailer_id]
+        timestamp: float = to_epoch(point['timestamp'])
+        row: Optional[int] = self.find_row(retailer_id, ean)
+        if row is None:
+            if product is None:
+                raise KeyError(f"{ean} is not sold by {retailer}, so its details are needed")
+            row = columns.add(ean, dict(product, price_history=[point]))
+            bisect.insort(self.index.setdefault(columns.products[row].ean, []), (retailer_id, row))
+        elif not columns.append(row, point['price'], point.get('price_per_litre'), timestamp):
+            return False
+        self._latest = None
+        for rolling in self._rolling.get((retailer_id, row), {}).values():
+            rolling.add(timestamp, point['price'])
+        return True
+
+    def get_price_history(self, ean: str, start: TimeBound = None,
+                          end: TimeBound = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Price history of a product at each retailer selling it, optionally only with start <= timestamp < end"""
+        lo, hi = _bound(start, -math.inf), _bound(end, math.inf)
+        return {
+            self.retailers[retailer_id]: self.columns[retailer_id].history(row, lo, hi)
+            for retailer_id, row in self.index.get(ean, [])
+        }
+
+    def price_stats(self, ean: str, start: TimeBound = None,
+                    end: TimeBound = None) -> Dict[str, Dict[str, float]]:
+        """Lowest, highest and mean price of a product at each retailer between start and end"""
+        lo, hi = _bound(start, -math.inf), _bound(end, math.inf)
+        stats = {
+            self.retailers[retailer_id]: self.columns[retailer_id].stats(row, lo, hi)
+            for retailer_id, row in self.index.get(ean, [])
+        }
+        return {retailer: values for retailer, values in stats.items() if values}
+
+    def downsample(self, ean: str, period: str = 'day', start: TimeBound = None,
+                   end: TimeBound = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Daily or weekly lowest, highest, mean and closing prices of a product at each retailer"""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+        lo, hi = _bound(start, -math.inf), _bound(end, math.inf)
+        return {
+            self.retailers[retailer_id]: self.columns[retailer_id].downsample(row, period, lo, hi)
+            for retailer_id, row in self.index.get(ean, [])
+        }
+
+    def rolling_stats(self, ean: str, days: float = 30, now: TimeBound = None) -> Dict[str, Dict[str, float]]:
+        """Lowest, highest and mean price of a product at each retailer over the last days
+
+        The window ends at the latest point, or at now if given; now must not go back between calls.
+        Each window is built from the history on first use and then kept up to date by add_point().
+        """
+        window: float = days * DAY
+        stats: Dict[str, Dict[str, float]] = {}
+        for retailer_id, row in self.index.get(ean, []):
+            windows = self._rolling.setdefault((retailer_id, row), {})
+            rolling = windows.get(window)
+            if rolling is None:
+                columns, record = self.columns[retailer_id], self.columns[retailer_id].products[row]
+                rolling = windows[window] = RollingStats(window)
+                for i in range(record.start, record.stop):
+                    rolling.add(columns.timestamps[i], columns.prices[i])
+            if now is not None:
+                rolling.advance(to_epoch(now))
+            stats[self.retailers[retailer_id]] = rolling.stats()
+        return stats
+
+    def latest_matrix(self) -> Tuple[List[str], List[str], List[Tuple[int, ...]], Any, Any]:
+        """Latest prices of the shared products as EAN x retailer matrices, with NaN where a retailer lacks one
+
+        Returns the EANs, the product names (from the first retailer selling each one), the
+        retailers selling each product, and the price and price per litre matrices. The matrices
+        are built once and kept until another retailer is added. Requires NumPy.
+        """
+        if self._latest is not None:
+            return self._latest
+        eans: List[str] = []
+        names: List[str] = []
+        sellers: List[Tuple[int, ...]] = []
+        # Matrix row of each product and row of its latest price in the columns, per retailer
+        positions: List[List[int]] = [[] for _ in self.retailers]
+        latest_rows: List[List[int]] = [[] for _ in self.retailers]
+        for ean, rows in self.shared_products():
+            for retailer_id, row in rows:
+                positions[retailer_id].append(len(eans))
+                latest_rows[retailer_id].append(self.columns[retailer_id].products[row].stop - 1)
+            names.append(self.record(*rows[0]).name)
+            sellers.append(tuple(retailer_id for retailer_id, _ in rows))
+            eans.append(ean)
+
+        prices = np.full((len(eans), len(self.retailers)), np.nan)
+        prices_per_litre = np.full((len(eans), len(self.retailers)), np.nan)
+        for retailer_id, columns in enumerate(self.columns):
+            if positions[retailer_id]:
+                # The arrays are read in place through the buffer protocol, without copying them
+                latest = np.array(latest_rows[retailer_id], dtype=np.intp)
+                prices[positions[retailer_id], retailer_id] = np.frombuffer(columns.prices)[latest]
+                prices_per_litre[positions[retailer_id], retailer_id] = np.frombuffer(columns.prices_per_litre)[latest]
+        self._latest = (eans, names, sellers, prices, prices_per_litre)
+        return self._latest
@@ -0,0 +1,136 @@
+# This line imports List, Dict, Set, Tuple, Optional and NamedTuple types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import List, Dict, Set, Tuple, Optional, NamedTuple
+from collections import Counter, defaultdict  # Counting shared n-grams and building the inverted index
+from price_table import PriceTable, ProductRecord  # Custom module with the compact, EAN-indexed copy of the wine data
+from storage import has_ean  # Tells EANs apart from the keys of products stored without one
+import re  # Built-in module for regular expressions
+import unicodedata  # Built-in module, for stripping accents
+
+# Volume units in millilitres
+UNITS: Dict[str, float] = {'ml': 1, 'cl': 10, 'dl': 100, 'l': 1000, 'lt': 1000, 'lts': 1000, 'litro': 1000, 'litros': 1000}
+# "75cl", "0,75 l", "6 x 75 cl", "1.5lt"...
+QUANTITY_PATTERN = re.compile(r'(?:(\d+)\s*x\s*)?(\d+(?:[.,]\d+)?)\s*(ml|cl|dl|lts|lt|litros|litro|l)\b')
+# Words found in most wine names, which tell nothing about which wine it is
+STOP_WORDS: Set[str] = {'vinho', 'vinhos', 'garrafa', 'gf', 'emb', 'de', 'do', 'da', 'dos', 'das', 'e', 'com'}
+
+def _fold(text: str) -> str:
+    """Lowercase text and strip its accents"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def normalise_quantity(text: Optional[str]) -> str:
+    """Volume of a product as e.g. '750ml', or '6x750ml' for packs; '' if there's none"""
+    match = QUANTITY_PATTERN.search(_fold(text or ''))
+    if not match:
+        return ''
+    count, amount, unit = match.groups()
+    millilitres = round(float(amount.replace(',', '.')) * UNITS[unit])
+    return f"{count}x{millilitres}ml" if count and count != '1' else f"{millilitres}ml"
+
+def normalise_text(text: Optional[str]) -> List[str]:
+    """Words of a name or brand, lowercase, without accents, punctuation, volumes or stop words"""
+    folded = QUANTITY_PATTERN.sub(' ', _fold(text or ''))
+    return [word for word in re.split(r'[^a-z0-9]+', folded) if word and word not in STOP_WORDS]
+
+def ngrams(words: List[str], n: int = 3) -> Set[str]:
+    """Character n-grams of each word, padded so short words and word boundaries count too"""
+    grams: Set[str] = set()
+    for word in words:
+        padded = f" {word} "
+        grams.update(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    return grams
+
+def dice(a: Set[str], b: Set[str]) -> float:
+    """Dice coefficient of two n-gram sets, from 0 (nothing shared) to 1 (the same)"""
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+class Match(NamedTuple):
+    """A product stored without an EAN, matched by name to a product of other retailers"""
+    key: str  # Key of the product without an EAN
+    into: str  # EAN (or key) of the product it was matched to
+    confidence: float
+
+class ProductMatcher:
+    """Matches products without an EAN to other retailers' products by name, brand and quantity
+
+    Products only meet candidates with the same volume, through an inverted index from name
+    n-grams to products, so the work grows with the number of products and not with the
+    number of pairs. n-grams shared by more than max_postings products are too common to tell
+    products apart and are skipped. Candidates sharing the most n-grams are then scored, and
+    pairs are accepted best first, at most one product per retailer in each group.
+    """
+
+    def __init__(self, min_confidence: float = 0.75, n: int = 3, max_postings: int = 500,
+                 candidates: int = 10, brand_weight: float = 0.2) -> None:
+        self.min_confidence: float = min_confidence
+        self.n: int = n
+        self.max_postings: int = max_postings
+        self.candidates: int = candidates  # Candidates scored per product, those sharing the most n-grams
+        self.brand_weight: float = brand_weight  # Share of the confidence given by the brand, the rest by the name
+
+    def _features(self, record: ProductRecord) -> Tuple[str, Set[str], Set[str]]:
+        return (normalise_quantity(record.quantity) or normalise_quantity(record.name),
+                ngrams(normalise_text(record.name), self.n), ngrams(normalise_text(record.brand), self.n))
+
+    def confidence(self, a: Tuple[str, Set[str], Set[str]], b: Tuple[str, Set[str], Set[str]]) -> float:
+        """How likely two products (as quantity, name n-grams and brand n-grams) are the same, from 0 to 1"""
+        if a[0] != b[0]:
+            return 0.0
+        name = dice(a[1], b[1])
+        if not a[2] or not b[2]:
+            return name
+        return (1 - self.brand_weight) * name + self.brand_weight * dice(a[2], b[2])
+
+    def find_matches(self, table: PriceTable) -> List[Match]:
+        """Find the groups of other retailers' products that the table's products without an EAN belong to"""
+        groups: Dict[str, Set[int]] = {key: {retailer_id for retailer_id, _ in rows} for key, rows in table.index.items()}
+        features: Dict[str, Tuple[str, Set[str], Set[str]]] = {
+            key: self._features(table.record(*rows[0])) for key, rows in table.index.items()
+        }
+        # (quantity, n-gram) -> products; products without a volume are only compared to each other
+        postings: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        for key, (quantity, name_grams, _) in features.items():
+            for gram in name_grams:
+                postings[(quantity, gram)].append(key)
+
+        scored: List[Tuple[float, str, str]] = []
+        for key, rows in table.index.items():
+            if has_ean(key) or len(rows) > 1:
+                continue
+            quantity, name_grams, _ = features[key]
+            retailer_id: int = rows[0][0]
+            shared: Counter = Counter()
+            for gram in name_grams:
+                keys = postings[(quantity, gram)]
+                if len(keys) <= self.max_postings:
+                    shared.update(keys)
+            for other, _ in shared.most_common(self.candidates + 1):
+                if other == key or retailer_id in groups[other]:
+                    continue
+                score = self.confidence(features[key], features[other])
+                if score >= self.min_confidence:
+                    scored.append((score, key, other))
+
+        # Best pairs first; a product joins one group, and a group takes one product per retailer
+        matches: List[Match] = []
+        merged: Dict[str, str] = {}
+        for score, key, other in sorted(scored, key=lambda pair: -pair[0]):
+            if key in merged:
+                continue
+            into = other
+            while into in merged:
+                into = merged[into]
+            if into == key or groups[key] & groups[into]:
+                continue
+            groups[into] |= groups.pop(key)
+            merged[key] = into
+            matches.append(Match(key, into, score))
+        return matches
+
+    def apply(self, table: PriceTable) -> List[Match]:
+        """Find the matches and merge them into the table, so comparisons include them"""
+        matches = self.find_matches(table)
+        for match in matches:
+            table.link(match.key, match.into, match.confidence)
+        return matches
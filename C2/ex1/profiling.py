@@ -0,0 +1,191 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+from collections import Counter  # Counting samples per stack and per function
+from datetime import datetime  # For naming the files of each profile
+import cProfile  # Built-in deterministic profiler
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import pstats  # Built-in module reading and merging cProfile statistics
+import sys  # For the frames of the running threads
+import threading  # Built-in module for thread synchronization primitives
+
+PROFILE_MODES: Tuple[str, ...] = ('cprofile', 'sampling')
+
+# cProfile statistics key: file, line and function name
+FunctionKey = Tuple[str, int, str]
+
+def _label(filename: str, line: int, name: str) -> str:
+    """Frame name in a collapsed stack, without the ';' separating frames"""
+    if filename == '~':  # Built-in functions
+        return name.replace(';', ',')
+    return f"{name}({os.path.basename(filename)}:{line})".replace(';', ',')
+
+def collapse_stats(stats: pstats.Stats, min_microseconds: float = 1.0) -> Counter:
+    """Collapsed stacks ("root;caller;callee" -> microseconds) rebuilt from cProfile's caller graph
+
+    cProfile only records which function called which, so the time of a function called from
+    several places is split between them in proportion to each caller's share, as flameprof does.
+    """
+    callees: Dict[FunctionKey, Dict[FunctionKey, float]] = {}
+    roots: List[FunctionKey] = []
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(function)
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, {})[function] = edge_cumulative
+
+    stacks: Counter = Counter()
+
+    def walk(function: FunctionKey, seconds: float, path: List[str], seen: Set[FunctionKey]) -> None:
+        _, _, own, cumulative, _ = stats.stats[function]
+        path = path + [_label(*function)]
+        share: float = seconds / cumulative if cumulative else 0.0
+        if own * share * 1e6 >= min_microseconds:
+            stacks[';'.join(path)] += own * share * 1e6
+        for callee, edge_cumulative in callees.get(function, {}).items():
+            if callee not in seen and edge_cumulative * share * 1e6 >= min_microseconds:
+                walk(callee, edge_cumulative * share, path, seen | {callee})
+
+    for root in roots:
+        walk(root, stats.stats[root][3], [], {root})
+    return stacks
+
+class StackSampler:
+    """Records the stacks of the profiled threads every interval seconds, from a thread of its own
+
+    Only the sampled threads pay for the profile, and only while a sample is taken, so the
+    overhead stays low enough to leave on. Samples measure wall time: a thread waiting on the
+    network counts as much as one parsing a page.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval: float = interval
+        self.stacks: Counter = Counter()
+        self.samples: int = 0
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ignored: Set[int] = set()
+
+    def start(self) -> None:
+        # Threads already running belong to someone else, except the one being profiled
+        self._ignored = set(sys._current_frames()) - {threading.get_ident()}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        self._ignored.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident in self._ignored:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(_label(code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+class Profiler:
+    """Profiles calls one at a time, saving their statistics and printing their hottest functions
+
+    In cprofile mode every function call is recorded, in every thread the profiled call starts,
+    and a pstats dump plus a collapsed-stack file (for flamegraph.pl, speedscope...) are saved.
+    In sampling mode only the collapsed stacks are saved, counted in samples.
+    """
+
+    def __init__(self, output_dir: str, mode: str = 'cprofile', top: int = 15, interval: float = 0.005) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {', '.join(PROFILE_MODES)}")
+        self.output_dir: str = output_dir
+        self.mode: str = mode
+        self.top: int = top
+        self.interval: float = interval
+        self.started: str = ''  # Time the current profile started, prefixing its files
+
+    def _path(self, name: str, extension: str) -> str:
+        return os.path.join(self.output_dir, f"{self.started}_{name}.{extension}")
+
+    def profile(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call func(*args, **kwargs) under the profiler and return its result"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.started = datetime.now().strftime('%Y%m%d-%H%M%S')
+        if self.mode == 'sampling':
+            return self._profile_sampling(name, func, *args, **kwargs)
+        return self._profile_cprofile(name, func, *args, **kwargs)
+
+    def _profile_cprofile(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        profiles: List[cProfile.Profile] = []
+        lock = threading.Lock()
+
+        def start_thread_profile(*_: Any) -> None:
+            # Runs on the first event of each new thread and replaces itself with a profiler
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ profiles every thread from the first profiler
+                sys.setprofile(None)
+                return
+            with lock:
+                profiles.append(profile)
+
+        main = cProfile.Profile()
+        threading.setprofile(start_thread_profile)
+        main.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            main.disable()
+            threading.setprofile(None)
+            stats = pstats.Stats(main)
+            with lock:
+                for profile in profiles:
+                    stats.add(profile)
+            stats.dump_stats(self._path(name, 'pstats'))
+            self._write_collapsed(name, collapse_stats(stats))
+            self._print_cprofile_summary(name, stats)
+
+    def _profile_sampling(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sampler.stop()
+            self._write_collapsed(name, sampler.stacks)
+            self._print_sampling_summary(name, sampler)
+
+    def _write_collapsed(self, name: str, stacks: Counter) -> None:
+        with open(self._path(name, 'collapsed'), 'w', encoding='utf-8') as f:
+            for stack, value in stacks.most_common():
+                f.write(f"{stack} {round(value)}\n")
+
+    def _print_cprofile_summary(self, name: str, stats: pstats.Stats) -> None:
+        print(f"\nProfile of {name} ({stats.total_tt:.2f}s over all threads), top {self.top} by own time:")
+        print(f"{'own s':>9}{'total s':>9}{'calls':>10}  function")
+        hottest = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:self.top]
+        for function, (_, calls, own, cumulative, _) in hottest:
+            print(f"{own:>9.3f}{cumulative:>9.3f}{calls:>10}  {_label(*function)}")
+        print(f"Saved to {self._path(name, 'pstats')} and {self._path(name, 'collapsed')}")
+
+    def _print_sampling_summary(self, name: str, sampler: StackSampler) -> None:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in sampler.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples: int = sampler.samples or 1
+        print(f"\nProfile of {name} ({sampler.samples} samples every {self.interval * 1000:g} ms), "
+              f"top {self.top} by own samples:")
+        print(f"{'own %':>7}{'total %':>9}  function")
+        for frame, count in own.most_common(self.top):
+            print(f"{count / samples:>7.1%}{total[frame] / samples:>9.1%}  {frame}")
+        print(f"Saved to {self._path(name, 'collapsed')}")
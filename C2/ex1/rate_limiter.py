@@ -0,0 +1,71 @@
+# This line imports Dict and Optional types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import Dict, Optional
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
+
+class HostRateLimiter:
+    """Token bucket pacing the requests sent to one host, with an AIMD limit on requests in flight
+
+    Healthy responses raise the rate and the concurrency limit a little (additive increase),
+    while throttling, server errors and timeouts halve both (multiplicative decrease).
+    """
+
+    _limiters: Dict[str, 'HostRateLimiter'] = {}
+    _registry_lock: threading.Lock = threading.Lock()
+
+    def __init__(self, rate: float = 10.0, max_rate: float = 100.0, min_rate: float = 0.5,
+                 max_concurrency: int = 8, rate_step: float = 0.5) -> None:
+        self.rate: float = rate  # Requests per second currently allowed
+        self.max_rate: float = max_rate
+        self.min_rate: float = min_rate
+        self.rate_step: float = rate_step  # Requests per second added after each healthy response
+        self.concurrency: float = max_concurrency  # Requests allowed in flight, as a float so it grows gradually
+        self.max_concurrency: int = max_concurrency
+        self.in_flight: int = 0
+        self.tokens: float = 1.0
+        self._updated: float = time.monotonic()
+        self._last_decrease: float = 0.0
+        self._condition: threading.Condition = threading.Condition()
+
+    @classmethod
+    def for_host(cls, host: str, **kwargs: float) -> 'HostRateLimiter':
+        """Get the limiter shared by every request to a host, creating it with kwargs if needed"""
+        with cls._registry_lock:
+            if host not in cls._limiters:
+                cls._limiters[host] = cls(**kwargs)
+            return cls._limiters[host]
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill, holding at most one second's worth"""
+        now = time.monotonic()
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Wait until a request may be sent"""
+        with self._condition:
+            while True:
+                self._refill()
+                if self.in_flight < int(self.concurrency) and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                # Woken up by release() when waiting for a slot, or when the next token is due
+                timeout: Optional[float] = None if self.in_flight >= int(self.concurrency) else (1 - self.tokens) / self.rate
+                self._condition.wait(timeout)
+
+    def release(self, healthy: bool) -> None:
+        """Report the outcome of a request sent after acquire()"""
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if healthy:
+                self.rate = min(self.max_rate, self.rate + self.rate_step)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            elif now - self._last_decrease > 1.0:
+                # Requests already in flight fail together, so only back off once per second
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self._last_decrease = now
+            self._condition.notify_all()
@@ -0,0 +1,122 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Iterable, TextIO, Type
+from json_codec import codec  # Custom module encoding JSON with the fastest backend installed
+import csv  # Built-in module for writing CSV files
+
+class BufferedWriter:
+    """Collects written text and hands it to the stream in chunks of about buffer_size characters
+
+    A report is made of many small writes, which would otherwise each go to the stream
+    (and to the terminal or pipe behind it) one by one.
+    """
+
+    def __init__(self, stream: TextIO, buffer_size: int = 1 << 20) -> None:
+        self.stream: TextIO = stream
+        self.buffer_size: int = buffer_size
+        self._chunks: List[str] = []
+        self._size: int = 0
+
+    def write(self, text: str) -> None:
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._chunks:
+            self.stream.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        self.stream.flush()
+
+class ReportWriter:
+    """Writes comparison results one at a time, so a report never needs the full list in memory"""
+
+    def __init__(self, stream: TextIO, retailers: List[str], buffer_size: int = 1 << 20) -> None:
+        self.out: BufferedWriter = BufferedWriter(stream, buffer_size)
+        self.retailers: List[str] = retailers
+
+    def begin(self) -> None:
+        """Write the report header"""
+
+    def write(self, result: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Flush whatever is still buffered"""
+        self.out.flush()
+
+class TextReportWriter(ReportWriter):
+    """The human-readable report printed by ex1"""
+
+    def begin(self) -> None:
+        self.out.write("\nWine Price Comparison Results:\n" + "-" * 80 + "\n")
+
+    def write(self, result: Dict[str, Any]) -> None:
+        lines: List[str] = [
+            f"\nProduct: {result['name']}",
+            f"EAN: {result['ean']}",
+            f"Available in {result['retailers']} retailers"
+        ]
+        if 'match_confidence' in result:
+            lines.append(f"Matched by name ({result['match_confidence']:.0%} confidence)")
+        for retailer, price in result['prices'].items():
+            lines.append(f"{retailer} Price: €{price:.2f}")
+            if result['price_per_litre'][retailer]:
+                lines.append(f"{retailer} Price per Litre: €{result['price_per_litre'][retailer]:.2f}")
+        for retailer, diff in result['price_differences'].items():
+            if diff > 0:
+                lines.append(f"\nCheapest at: {result['cheapest_retailer']}")
+                lines.append(f"{retailer} is €{diff:.2f} more expensive than the cheapest option")
+        lines.append("-" * 80)
+        self.out.write('\n'.join(lines) + '\n')
+
+class CsvReportWriter(ReportWriter):
+    """One row per product, with a price, price per litre and difference column per retailer"""
+
+    def begin(self) -> None:
+        self._csv = csv.writer(self.out, lineterminator='\n')
+        self._csv.writerow(['ean', 'name', 'retailers', 'cheapest_retailer', 'max_saving', 'match_confidence'] + [
+            f"{retailer}_{column}" for retailer in self.retailers
+            for column in ('price', 'price_per_litre', 'difference')
+        ])
+
+    def write(self, result: Dict[str, Any]) -> None:
+        # Differences are rounded to cents, dropping the noise of float subtraction
+        row: List[Any] = [result['ean'], result['name'], result['retailers'], result['cheapest_retailer'],
+                          round(max_saving(result), 2), result.get('match_confidence')]
+        for retailer in self.retailers:
+            difference = result['price_differences'].get(retailer)
+            row.extend((result['prices'].get(retailer), result['price_per_litre'].get(retailer),
+                        None if difference is None else round(difference, 2)))
+        self._csv.writerow(row)
+
+class JsonlReportWriter(ReportWriter):
+    """One JSON object per line, in the form returned by compare_prices"""
+
+    def write(self, result: Dict[str, Any]) -> None:
+        self.out.write(codec.dumps(result).decode('utf-8') + '\n')
+
+REPORT_WRITERS: Dict[str, Type[ReportWriter]] = {
+    'text': TextReportWriter,
+    'csv': CsvReportWriter,
+    'jsonl': JsonlReportWriter
+}
+
+def max_saving(result: Dict[str, Any]) -> float:
+    """Most money saved by buying a product at its cheapest retailer instead of another one"""
+    return max(result['price_differences'].values())
+
+def write_report(results: Iterable[Dict[str, Any]], stream: TextIO, retailers: List[str],
+                 report_format: str = 'text', buffer_size: int = 1 << 20) -> int:
+    """Stream comparison results to a report in the given format and return how many were written"""
+    writer: ReportWriter = REPORT_WRITERS[report_format](stream, retailers, buffer_size)
+    writer.begin()
+    count: int = 0
+    try:
+        for result in results:
+            writer.write(result)
+            count += 1
+    finally:
+        writer.close()
+    return count
@@ -0,0 +1,323 @@
+# This line imports List, Dict, Any, Iterable, Iterator, Optional and Tuple types from the typing module
+# These are used for type hinting in Python to make the code more maintainable
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from contextlib import contextmanager  # Decorator for writing with-statement context managers
+from datetime import datetime  # Provides classes for working with dates and times
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import sqlite3  # Built-in module for SQLite databases
+import threading  # Built-in module for thread synchronization primitives
+from price_event_log import PriceEventLog, PRODUCT_INFO_FIELDS  # Custom module storing the wine data as a snapshot plus a log of changes
+
+# Products whose EAN couldn't be found are kept under a key made of this prefix, the retailer and
+# their item id (or URL), which never equals another retailer's key; the product matcher pairs them by name
+NO_EAN_PREFIX = '~'
+
+def has_ean(key: str) -> bool:
+    """Whether a product key is an EAN, and not the key of a product without one"""
+    return not key.startswith(NO_EAN_PREFIX)
+
+class WineStorage:
+    """Interface of the stores holding a retailer's products and their price history"""
+
+    def __init__(self, retailer: str) -> None:
+        self.retailer: str = retailer
+
+    def _key(self, product: Dict[str, Any]) -> Optional[str]:
+        """Key a scraped product is stored under: its EAN, or a key of its own without one"""
+        if product['ean']:
+            return product['ean']
+        identifier: Optional[str] = product.get('item_id') or product.get('url')
+        return f"{NO_EAN_PREFIX}{self.retailer}:{identifier}" if identifier else None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """To be implemented by child classes (EAN -> name, brand, quantity and price_history)"""
+        raise NotImplementedError
+
+    def save(self, new_products: List[Dict[str, Any]], timestamp: Optional[str] = None) -> None:
+        """To be implemented by child classes (new products and price changes, stamped with timestamp)"""
+        raise NotImplementedError
+
+    def get_price_history(self, ean: str) -> List[Dict[str, Any]]:
+        """Get the price history of a product, oldest first"""
+        product: Optional[Dict[str, Any]] = self.load().get(ean)
+        return product['price_history'] if product else []
+
+    def release(self) -> None:
+        """Drop what was kept in memory between the saves of a run"""
+
+    def known_products(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Get the EAN and last price of every stored product, by ('url', URL) and by ('item_id', id)"""
+        known: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for ean, product in self.load().items():
+            entry = {'ean': ean, 'price': product['price_history'][-1]['price']}
+            for field in ('url', 'item_id'):
+                if product.get(field):
+                    known[(field, product[field])] = entry
+        return known
+
+class JsonStorage(WineStorage):
+    """Storage in a JSON snapshot file plus an append-only log of changes"""
+
+    def __init__(self, retailer: str, data_file: str, compact_every: int = 5000, json_format: str = 'pretty') -> None:
+        super().__init__(retailer)
+        self.data_file: str = data_file
+        self.price_log: PriceEventLog = PriceEventLog(
+            data_file,
+            data_file.replace('_wine_data.json', '_wine_events.jsonl'),
+            compact_every=compact_every,
+            json_format=json_format
+        )
+        # Latest price and details of each stored product, as (price, *PRODUCT_INFO_FIELDS), kept from
+        # the first save of a run until release() so saving page after page doesn't re-read the files
+        self._latest: Optional[Dict[str, Tuple[Any, ...]]] = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the JSON snapshot and the events logged since"""
+        return self.price_log.load()
+
+    def release(self) -> None:
+        self._latest = None
+
+    def _latest_entries(self) -> Dict[str, Tuple[Any, ...]]:
+        """Latest price and details of each stored product, read from the files on first use"""
+        if self._latest is None:
+            # Only the last point of each history is kept, not the nested data
+            self._latest = {
+                ean: (product['price_history'][-1]['price'], *(product.get(key) for key in PRODUCT_INFO_FIELDS))
+                for ean, product in self.price_log.load().items()
+            }
+        return self._latest
+
+    def save(self, new_products: List[Dict[str, Any]], timestamp: Optional[str] = None) -> None:
+        """Log new products and price changes, so the cost grows with what changed and not with the history"""
+        latest = self._latest_entries()
+        current_time = timestamp or datetime.now().isoformat()
+        events: List[Dict[str, Any]] = []
+        seen: List[str] = []
+
+        for product in new_products:
+            ean = self._key(product)
+            if not ean:
+                continue
+
+            info = {key: product.get(key) for key in PRODUCT_INFO_FIELDS}
+            point = {
+                'price': product['price'],
+                'price_per_litre': product['price_per_litre'],
+                'timestamp': current_time
+            }
+            entry: Optional[Tuple[Any, ...]] = latest.get(ean)
+            if entry is None:
+                events.append({'type': 'new', 'ean': ean, **info, **point})
+            else:
+                if entry[0] != product['price']:
+                    events.append({'type': 'price', 'ean': ean, **point})
+                else:
+                    seen.append(ean)
+                if entry[1:] != tuple(info.values()):
+                    events.append({'type': 'info', 'ean': ean, **info})
+            # Updated right away too, in case the same EAN shows up twice in this run
+            latest[ean] = (product['price'], *info.values())
+
+        # Unchanged prices are recorded as one observation for the whole run
+        if seen:
+            events.append({'type': 'seen', 'eans': seen, 'timestamp': current_time})
+        self.price_log.append(events)
+
+class SqliteStorage(WineStorage):
+    """Storage in a SQLite database shared by every retailer, indexed on EAN, retailer and timestamp"""
+
+    # Keys looked up per query, well under SQLite's default limit of 999 bound parameters
+    LOOKUP_CHUNK: int = 500
+
+    SCHEMA: str = '''
+        CREATE TABLE IF NOT EXISTS products (
+            retailer TEXT NOT NULL,
+            ean TEXT NOT NULL,
+            name TEXT,
+            brand TEXT,
+            quantity TEXT,
+            url TEXT,
+            item_id TEXT,
+            last_seen TEXT,
+            last_price REAL,
+            last_price_per_litre REAL,
+            last_timestamp TEXT,
+            PRIMARY KEY (retailer, ean)
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_ean ON products (ean);
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY,
+            retailer TEXT NOT NULL,
+            ean TEXT NOT NULL,
+            price REAL,
+            price_per_litre REAL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_history_ean ON price_history (ean, retailer, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_price_history_timestamp ON price_history (timestamp);
+    '''
+    # Columns added after the first version of the schema, with their types
+    ADDED_COLUMNS: Dict[str, str] = {'url': 'TEXT', 'item_id': 'TEXT', 'last_seen': 'TEXT'}
+
+    def __init__(self, retailer: str, database_file: str) -> None:
+        super().__init__(retailer)
+        self.database_file: str = database_file
+        self._schema_lock: threading.Lock = threading.Lock()
+        self._schema_ready: bool = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one transaction, committed on success and rolled back on error"""
+        os.makedirs(os.path.dirname(self.database_file) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.database_file, timeout=30)
+        try:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    # WAL lets the comparator read while the scrapers of other retailers write
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.executescript(self.SCHEMA)
+                    columns = {row[1] for row in conn.execute('PRAGMA table_info(products)')}
+                    for column, column_type in self.ADDED_COLUMNS.items():
+                        if column not in columns:
+                            conn.execute(f'ALTER TABLE products ADD COLUMN {column} {column_type}')
+                    conn.execute('CREATE INDEX IF NOT EXISTS idx_products_url ON products (retailer, url)')
+                    self._schema_ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Load every product of the retailer with its price history, as in the JSON files"""
+        data: Dict[str, Dict[str, Any]] = {}
+        with self._connect() as conn:
+            for ean, name, brand, quantity, url, item_id, last_seen in conn.execute(
+                    'SELECT ean, name, brand, quantity, url, item_id, last_seen FROM products WHERE retailer = ?',
+                    (self.retailer,)):
+                data[ean] = {'name': name, 'brand': brand, 'quantity': quantity, 'url': url, 'item_id': item_id,
+                             'price_history': []}
+                if last_seen:
+                    data[ean]['last_seen'] = last_seen
+            for ean, price, price_per_litre, timestamp in conn.execute(
+                    'SELECT ean, price, price_per_litre, timestamp FROM price_history WHERE retailer = ? ORDER BY id',
+                    (self.retailer,)):
+                data[ean]['price_history'].append(
+                    {'price': price, 'price_per_litre': price_per_litre, 'timestamp': timestamp})
+        return data
+
+    def save(self, new_products: List[Dict[str, Any]], timestamp: Optional[str] = None) -> None:
+        """Write the run's new products and price changes in a single transaction"""
+        current_time = timestamp or datetime.now().isoformat()
+        with self._connect() as conn:
+            last_prices: Dict[str, float] = self._last_prices(conn, {self._key(product) for product in new_products})
+            info_rows: List[tuple] = []
+            price_rows: List[tuple] = []
+            history_rows: List[tuple] = []
+            seen_rows: List[tuple] = []
+
+            for product in new_products:
+                ean = self._key(product)
+                if not ean:
+                    continue
+                info_rows.append((self.retailer, ean, product['name'], product['brand'], product['quantity'],
+                                  product.get('url'), product.get('item_id')))
+                if ean not in last_prices or last_prices[ean] != product['price']:
+                    last_prices[ean] = product['price']
+                    price_rows.append((product['price'], product['price_per_litre'], current_time, self.retailer, ean))
+                    history_rows.append((self.retailer, ean, product['price'], product['price_per_litre'], current_time))
+                else:
+                    seen_rows.append((current_time, self.retailer, ean))
+
+            conn.executemany('''
+                INSERT INTO products (retailer, ean, name, brand, quantity, url, item_id) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (retailer, ean) DO UPDATE SET
+                    name = excluded.name, brand = excluded.brand, quantity = excluded.quantity,
+                    url = excluded.url, item_id = excluded.item_id
+            ''', info_rows)
+            conn.executemany('UPDATE products SET last_seen = ? WHERE retailer = ? AND ean = ?', seen_rows)
+            conn.executemany('''
+                UPDATE products SET last_price = ?, last_price_per_litre = ?, last_timestamp = ?
+                WHERE retailer = ? AND ean = ?
+            ''', price_rows)
+            conn.executemany(
+                'INSERT INTO price_history (retailer, ean, price, price_per_litre, timestamp) VALUES (?, ?, ?, ?, ?)',
+                history_rows)
+
+    def _last_prices(self, conn: sqlite3.Connection, keys: Iterable[Optional[str]]) -> Dict[str, float]:
+        """Get the last stored price of the retailer's products with the given keys, a chunk of keys per query"""
+        keys = sorted(key for key in keys if key)
+        last_prices: Dict[str, float] = {}
+        for i in range(0, len(keys), self.LOOKUP_CHUNK):
+            chunk = keys[i:i + self.LOOKUP_CHUNK]
+            last_prices.update(conn.execute(
+                f'SELECT ean, last_price FROM products WHERE retailer = ? AND ean IN ({", ".join("?" * len(chunk))})',
+                (self.retailer, *chunk)))
+        return last_prices
+
+    def known_products(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Get the EAN and last price of every stored product, by ('url', URL) and by ('item_id', id)"""
+        known: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        with self._connect() as conn:
+            for ean, url, item_id, last_price in conn.execute(
+                    'SELECT ean, url, item_id, last_price FROM products WHERE retailer = ?', (self.retailer,)):
+                entry = {'ean': ean, 'price': last_price}
+                if url:
+                    known[('url', url)] = entry
+                if item_id:
+                    known[('item_id', item_id)] = entry
+        return known
+
+    def get_price_history(self, ean: str) -> List[Dict[str, Any]]:
+        """Get the price history of a product, oldest first, through the EAN index"""
+        return self.get_price_histories(ean, [self.retailer]).get(self.retailer, [])
+
+    def get_price_histories(self, ean: str, retailers: List[str], start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the price history of a product at each of the given retailers, optionally
+        only the points with start <= timestamp < end (ISO timestamps)"""
+        placeholders = ', '.join('?' * len(retailers))
+        # ISO timestamps sort chronologically, so the range is a plain string comparison
+        time_range = ''.join([' AND timestamp >= ?' if start else '', ' AND timestamp < ?' if end else ''])
+        bounds = [bound for bound in (start, end) if bound]
+        history: Dict[str, List[Dict[str, Any]]] = {}
+        with self._connect() as conn:
+            for retailer, price, price_per_litre, timestamp in conn.execute(f'''
+                    SELECT retailer, price, price_per_litre, timestamp FROM price_history
+                    WHERE ean = ? AND retailer IN ({placeholders}){time_range} ORDER BY timestamp, id
+                ''', (ean, *retailers, *bounds)):
+                history.setdefault(retailer, []).append(
+                    {'price': price, 'price_per_litre': price_per_litre, 'timestamp': timestamp})
+        # Same retailer order as the comparator's
+        return {retailer: history[retailer] for retailer in retailers if retailer in history}
+
+    def get_latest_prices(self, retailers: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Get EAN -> retailer -> latest name and prices, for the EANs sold by at least two of the retailers"""
+        placeholders = ', '.join('?' * len(retailers))
+        latest: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._connect() as conn:
+            for ean, retailer, name, price, price_per_litre in conn.execute(f'''
+                    SELECT p.ean, p.retailer, p.name, p.last_price, p.last_price_per_litre
+                    FROM products p
+                    JOIN (
+                        SELECT ean FROM products WHERE retailer IN ({placeholders})
+                        GROUP BY ean HAVING COUNT(*) >= 2
+                    ) shared ON shared.ean = p.ean
+                    WHERE p.retailer IN ({placeholders})
+                    ORDER BY p.ean
+                ''', (*retailers, *retailers)):
+                latest.setdefault(ean, {})[retailer] = {
+                    'name': name, 'price': price, 'price_per_litre': price_per_litre}
+        return {
+            ean: {retailer: rows[retailer] for retailer in retailers if retailer in rows}
+            for ean, rows in latest.items()
+        }
+
+def create_storage(kind: str, retailer: str, data_file: str, compact_every: int = 5000,
+                   json_format: str = 'pretty') -> WineStorage:
+    """Create the storage backend named kind ('json' or 'sqlite') for a retailer"""
+    if kind == 'json':
+        return JsonStorage(retailer, data_file, compact_every=compact_every, json_format=json_format)
+    if kind == 'sqlite':
+        return SqliteStorage(retailer, os.path.join(os.path.dirname(data_file), 'wine_data.db'))
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -1,11 +1,35 @@
 import unittest  # Built-in module providing a testing framework
 from unittest.mock import patch, MagicMock  # Built-in module providing mocking functionality for tests
 import copy  # Built-in module for shallow and deep copying operations
+import requests  # HTTP library, for its exception types
 import json  # Built-in module for JSON data encoding and decoding
 import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import shutil  # Built-in module for high-level file operations (removing directory trees)
+import threading  # Built-in module for thread synchronization primitives
+import time  # Built-in module for time-related functions
 from wine_price_comparator import WinePriceComparator  # Custom module containing price comparison functionality
 from continente_scraper import ContinenteWineScraper  # Custom module containing Continente scraper implementation
 from auchan_scraper import AuchanWineScraper  # Custom module containing Auchan scraper implementation
+from base_scraper import BaseWineScraper, DEFAULT_PARSER  # Base scraper class and the fastest HTML parser backend installed
+from rate_limiter import HostRateLimiter  # Custom module pacing the requests sent to each host
+from ex1 import run_scrapers  # Runs every retailer's scraper concurrently
+from ean_cache import EanCache  # Custom module containing the product URL -> EAN cache
+from http_cache import HttpCache  # Custom module containing the conditional HTTP response cache
+from price_table import np  # NumPy, or None when it isn't installed
+from json_codec import JsonCodec, BACKENDS  # Custom module encoding JSON with the fastest backend installed
+from convert_json import convert  # Converts JSON data files between formats
+import io  # Built-in module for in-memory text streams
+import csv  # Built-in module for reading CSV files
+from product_matcher import ProductMatcher, normalise_quantity  # Custom module matching products without an EAN by name
+from pipeline import bounded_stage  # Custom module running generator stages in threads with bounded queues
+from profiling import Profiler  # Profiles scraper runs with cProfile or stack sampling
+import glob  # Built-in module for finding files by pattern
+import pstats  # Built-in module reading cProfile statistics
+from daemon import ScraperDaemon  # Keeps the scrapers resident and runs them on a schedule
+from datetime import datetime  # For the date in the report file names
+from work_queue import WorkQueue  # Custom module with the durable queue of crawl tasks
+from distributed import coordinate, CrawlWorker  # Coordinator and workers of a crawl split into queued tasks
+from bench_scrape import FixtureStore, ReplayServer, instrumented, run_scraper, synthesize  # Offline scraping benchmark
 
 class TestScraperBase(unittest.TestCase):
     """Base test class with common setup and teardown"""
@@ -14,6 +38,16 @@ class TestScraperBase(unittest.TestCase):
         """Initialize test environment and sample data"""
         self.test_dir = os.path.join(os.getcwd(), "generated", "test")
         os.makedirs(self.test_dir, exist_ok=True)
+
+        # Mocked responses don't need pacing
+        rate_patcher = patch.object(BaseWineScraper, 'requests_per_second', 0)
+        rate_patcher.start()
+        self.addCleanup(rate_patcher.stop)
+        # Nor probing for bigger pages, so each test sees the requests it mocked
+        for scraper_class in (ContinenteWineScraper, AuchanWineScraper):
+            size_patcher = patch.object(scraper_class, 'preferred_size', 0)
+            size_patcher.start()
+            self.addCleanup(size_patcher.stop)
         
         # Sample product data for testing
         self._sample_product = {
@@ -38,12 +72,8 @@ class TestScraperBase(unittest.TestCase):
 
     def tearDown(self):
         """Clean up test files and directories"""
-        for filename in ['continente_wine_data.json', 'auchan_wine_data.json']:
-            filepath = os.path.join(self.test_dir, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
         if os.path.exists(self.test_dir):
-            os.rmdir(self.test_dir)
+            shutil.rmtree(self.test_dir)
 
 class TestAuchanScraper(TestScraperBase):
     """Test suite for Auchan wine scraper functionality"""
@@ -68,7 +98,7 @@ class TestAuchanScraper(TestScraperBase):
             ''')
         return '<div>' + ''.join(products_html) + '</div>'
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_product_extraction(self, mock_get):
         """Test complete product extraction process including pagination"""
         scraper = AuchanWineScraper(self.test_dir)
@@ -88,7 +118,7 @@ class TestAuchanScraper(TestScraperBase):
 
         def mock_response(*args, **kwargs):
             url = args[0]
-            response = MagicMock()
+            response = MagicMock(status_code=200, headers={})
             response.content = responses.get(url, '<div></div>')
             return response
 
@@ -102,16 +132,10 @@ class TestAuchanScraper(TestScraperBase):
         self.assertEqual(products[39]["name"], "Test Wine 39")
 
         # Verify correct API calls
-        mock_get.assert_any_call(
-            f"{scraper.base_url}?sz=24&start=0",
-            headers=scraper.headers
-        )
-        mock_get.assert_any_call(
-            f"{scraper.base_url}?sz=24&start=24",
-            headers=scraper.headers
-        )
-
-    @patch('requests.get')
+        mock_get.assert_any_call(f"{scraper.base_url}?sz=24&start=0", headers={}, timeout=scraper.timeout)
+        mock_get.assert_any_call(f"{scraper.base_url}?sz=24&start=24", headers={}, timeout=scraper.timeout)
+
+    @patch('requests.Session.get')
     def test_run_method(self, mock_get):
         """Test the complete run method and verify output files"""
         scraper = AuchanWineScraper(self.test_dir)
@@ -129,7 +153,7 @@ class TestAuchanScraper(TestScraperBase):
 
         def mock_response(*args, **kwargs):
             url = args[0]
-            response = MagicMock()
+            response = MagicMock(status_code=200, headers={})
             response.content = responses.get(url, '<div></div>')
             return response
 
@@ -137,9 +161,8 @@ class TestAuchanScraper(TestScraperBase):
         scraper.run(40)
 
         # Verify file creation and content
-        self.assertTrue(os.path.exists(scraper.data_file))
-        with open(scraper.data_file, 'r', encoding='utf-8') as f:
-            saved_data = json.load(f)
+        self.assertTrue(os.path.exists(scraper.storage.price_log.log_file))
+        saved_data = scraper._load_existing_data()
         self.assertEqual(len(saved_data), 40)
 
         # Test price history update
@@ -148,6 +171,11 @@ class TestAuchanScraper(TestScraperBase):
         
         scraper.run(40)
         
+        # The second run only logged the 24 changed prices and one observation of the other 16
+        with open(scraper.storage.price_log.log_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 40 + 24 + 1)
+
+        scraper.storage.price_log.compact()
         with open(scraper.data_file, 'r', encoding='utf-8') as f:
             updated_data = json.load(f)
         
@@ -157,13 +185,829 @@ class TestAuchanScraper(TestScraperBase):
         self.assertEqual(price_history[0]['price'], 9.99)
         self.assertEqual(price_history[1]['price'], 10.99)
 
+    @patch('requests.Session.get')
+    def test_run_metrics(self, mock_get):
+        """Test that a run times its phases, counts its requests and exports them next to the data file"""
+        scraper = AuchanWineScraper(self.test_dir)
+        responses = {
+            f"{scraper.base_url}?sz=24&start=0": self._create_page_html(24, 0),
+            f"{scraper.base_url}?sz=24&start=24": self._create_page_html(24, 24),
+        }
+        # Product 5 has no EAN on its page
+        for i in range(48):
+            if i != 5:
+                responses[f"https://www.auchan.pt/test-wine-{i}"] = f'<span class="product-ean">1234{i:04d}567890</span>'
+
+        def mock_response(*args, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            response.content = responses.get(args[0], '<div></div>')
+            return response
+
+        mock_get.side_effect = mock_response
+        summary = scraper.run(30)
+
+        counters = summary['metrics']['counters']
+        self.assertEqual(counters['requests'], 2 + 30)
+        self.assertEqual(counters['retries'], 0)
+        self.assertEqual(counters['ean_errors'], 1)
+        self.assertEqual(counters['products'], 30)
+        self.assertGreater(counters['body_bytes'], 0)
+        phases = summary['metrics']['phases']
+        self.assertEqual(phases['listing_fetch']['count'], 2)
+        self.assertEqual(phases['ean_resolution']['count'], 30)
+        self.assertEqual(phases['parse']['count'], 2 + 30)
+        self.assertGreaterEqual(phases['save']['count'], 1)
+
+        with open(scraper.metrics_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['counters'], counters)
+        with open(scraper.prometheus_file, 'r', encoding='utf-8') as f:
+            prometheus = f.read()
+        self.assertIn('wine_scraper_requests_total{retailer="Auchan"} 32\n', prometheus)
+        self.assertIn('wine_scraper_phase_seconds_count{retailer="Auchan",phase="ean_resolution"} 30\n', prometheus)
+        self.assertIn('le="+Inf"} 30\n', prometheus)
+
+    @patch('requests.Session.get')
+    def test_page_size_probe(self, mock_get):
+        """Test that the largest page the site serves is probed once and its grid fragments are used"""
+        scraper = AuchanWineScraper(self.test_dir)
+        scraper.preferred_size = 96
+        total = '<input name="auc-js-search-results-total" value="80">'
+        # The site caps pages at 40 products, and its fragments serve the same pages
+        responses = {
+            f"{scraper.base_url}?sz=96&start=0": self._create_page_html(40, 0) + total,
+            scraper.grid_url.format(start=0, size=40): self._create_page_html(40, 0) + total,
+            scraper.grid_url.format(start=40, size=40): self._create_page_html(40, 40) + total,
+        }
+        for i in range(80):
+            responses[f"https://www.auchan.pt/test-wine-{i}"] = f'<span class="product-ean">1234{i:04d}567890</span>'
+
+        def mock_response(*args, **kwargs):
+            return MagicMock(status_code=200, headers={}, content=responses.get(args[0], '<div></div>'))
+
+        mock_get.side_effect = mock_response
+        self.assertEqual(scraper.run(60)['products'], 60)
+        self.assertEqual((scraper.size, scraper.use_grid), (40, True))
+        listing_urls = [c.args[0] for c in mock_get.call_args_list if "start=" in c.args[0]]
+        self.assertEqual(listing_urls, [f"{scraper.base_url}?sz=96&start=0", scraper.grid_url.format(start=0, size=40),
+                                        scraper.grid_url.format(start=0, size=40),
+                                        scraper.grid_url.format(start=40, size=40)])
+
+        # The next run takes the probed size from its file
+        mock_get.reset_mock()
+        warm_scraper = AuchanWineScraper(self.test_dir, resume=False)
+        warm_scraper.preferred_size = 96
+        warm_scraper._resolve_page_size()
+        self.assertEqual((warm_scraper.size, warm_scraper.use_grid), (40, True))
+        mock_get.assert_not_called()
+
+        # A first page shorter than the probed size falls back to the default listing pages,
+        # also checked when the run has a limit
+        responses[scraper.grid_url.format(start=0, size=40)] = self._create_page_html(30, 0) + total
+        responses[f"{scraper.base_url}?sz=24&start=0"] = self._create_page_html(24, 0) + total
+        pages = list(warm_scraper._scrape_pages(10))
+        self.assertEqual([len(products) for _, products in pages], [10])
+        self.assertEqual((warm_scraper.size, warm_scraper.use_grid), (24, False))
+        self.assertFalse(os.path.exists(warm_scraper.page_size_file))
+
+        # A fragment of another category, or a site without fragments, leaves the listing pages
+        responses[scraper.grid_url.format(start=0, size=40)] = (
+            self._create_page_html(40, 0) + '<input name="auc-js-search-results-total" value="500">')
+        warm_scraper._resolve_page_size()
+        self.assertEqual((warm_scraper.size, warm_scraper.use_grid), (40, False))
+        os.remove(warm_scraper.page_size_file)
+        responses = {f"{scraper.base_url}?sz=96&start=0": self._create_page_html(30, 0) + total}
+        warm_scraper._resolve_page_size()
+        self.assertEqual((warm_scraper.size, warm_scraper.use_grid), (30, False))
+
+    @patch('requests.Session.get')
+    def test_stale_checkpoints_are_ignored(self, mock_get):
+        """Test that checkpoints of an old run, or of a catalogue that changed since, aren't resumed"""
+        scraper = AuchanWineScraper(self.test_dir, checkpoint_ttl=3600)
+        checkpoint = {'product_limit': -1, 'next_offset': 24, 'scraped': 24, 'started': time.time() - 60, 'total': 48}
+        scraper._save_checkpoint(checkpoint)
+        self.assertEqual(scraper._load_checkpoint(-1), checkpoint)
+        scraper._save_checkpoint(dict(checkpoint, started=time.time() - 7200))
+        self.assertEqual(scraper._load_checkpoint(-1)['next_offset'], 0)
+
+        # Products were removed since the checkpoint, so the run starts over from the first page
+        scraper._save_checkpoint(checkpoint)
+        responses = {
+            f"{scraper.base_url}?sz=24&start=0": (self._create_page_html(24, 0) +
+                                                   '<input name="auc-js-search-results-total" value="30">'),
+            f"{scraper.base_url}?sz=24&start=24": self._create_page_html(6, 24),
+        }
+
+        def mock_response(*args, **kwargs):
+            content = responses.get(args[0], f'<span class="product-ean">{args[0].rsplit("-", 1)[-1]}</span>')
+            return MagicMock(status_code=200, headers={}, content=content)
+
+        mock_get.side_effect = mock_response
+        summary = scraper.run(-1)
+        self.assertTrue(summary['success'])
+        self.assertEqual(summary['products'], 30)
+        self.assertEqual(len(scraper._load_existing_data()), 30)
+
+    @patch('requests.Session.get')
+    def test_resume_after_crash(self, mock_get):
+        """Test that pages are saved as they are scraped and an interrupted run resumes where it stopped"""
+        scraper = AuchanWineScraper(self.test_dir, max_retries=0)
+        responses = {
+            f"{scraper.base_url}?sz=24&start=0": self._create_page_html(24, 0),
+            f"{scraper.base_url}?sz=24&start=24": self._create_page_html(24, 24),
+        }
+        failing_url = f"{scraper.base_url}?sz=24&start=24"
+
+        def mock_response(*args, **kwargs):
+            if args[0] == failing_url:
+                raise requests.ConnectionError("connection reset")
+            response = MagicMock(status_code=200, headers={})
+            response.content = responses.get(args[0], f'<span class="product-ean">{args[0].rsplit("-", 1)[-1]}</span>')
+            return response
+
+        mock_get.side_effect = mock_response
+        summary = scraper.run(40)
+        self.assertFalse(summary['success'])
+        self.assertEqual(summary['products'], 24)
+        self.assertEqual(len(scraper._load_existing_data()), 24)
+        with open(scraper.checkpoint_file, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        self.assertEqual({k: checkpoint[k] for k in ('product_limit', 'next_offset', 'scraped')},
+                         {'product_limit': 40, 'next_offset': 24, 'scraped': 24})
+
+        failing_url = None
+        mock_get.reset_mock()
+        summary = scraper.run(40)
+        self.assertTrue(summary['success'])
+        self.assertEqual(summary['products'], 40)
+        self.assertNotIn(f"{scraper.base_url}?sz=24&start=0", [c.args[0] for c in mock_get.call_args_list])
+        self.assertEqual(len(scraper._load_existing_data()), 40)
+        self.assertFalse(os.path.exists(scraper.checkpoint_file))
+
+    @patch('requests.Session.get')
+    def test_concurrent_ean_resolution(self, mock_get):
+        """Test that product pages are fetched in parallel, bounded by max_workers, keeping tile order"""
+        scraper = AuchanWineScraper(self.test_dir)
+        listing_url = f"{scraper.base_url}?sz=24&start=0"
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, peak
+
+        def mock_response(*args, **kwargs):
+            url = args[0]
+            response = MagicMock(status_code=200, headers={})
+            if url == listing_url:
+                response.content = self._create_page_html(24, 0)
+                return response
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            response.content = f'<span class="product-ean">{url.rsplit("-", 1)[-1]}</span>'
+            return response
+
+        mock_get.side_effect = mock_response
+        products = scraper._get_product_data(0, 20)
+
+        self.assertEqual([p["ean"] for p in products], [str(i) for i in range(20)])
+        self.assertEqual(products[0]["url"], "https://www.auchan.pt/test-wine-0")
+        self.assertGreater(in_flight[1], 1)
+        self.assertLessEqual(in_flight[1], scraper.max_workers)
+
+    @patch('requests.Session.get')
+    def test_shared_session(self, mock_get):
+        """Test that all requests share one pooled session that run() closes"""
+        scraper = AuchanWineScraper(self.test_dir)
+        session = scraper._get_session()
+
+        self.assertIs(scraper._get_session(), session)
+        self.assertEqual(session.get_adapter(scraper.base_url)._pool_maxsize, scraper.max_workers + 1)
+        self.assertIn('gzip', session.headers['Accept-Encoding'])
+
+        mock_get.return_value = MagicMock(status_code=200, headers={}, content='<div></div>')
+        scraper.run(1)
+        self.assertIsNone(scraper.session)
+
+    @patch('requests.Session.get')
+    def test_warm_run_uses_ean_cache(self, mock_get):
+        """Test that a second run only fetches listing pages"""
+        scraper = AuchanWineScraper(self.test_dir)
+        listing_url = f"{scraper.base_url}?sz=24&start=0"
+
+        def mock_response(*args, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            if args[0] == listing_url:
+                response.content = self._create_page_html(24, 0)
+            else:
+                response.content = f'<span class="product-ean">{args[0].rsplit("-", 1)[-1]}</span>'
+            return response
+
+        mock_get.side_effect = mock_response
+        scraper.run(10)
+        self.assertEqual(mock_get.call_count, 11)
+
+        mock_get.reset_mock()
+        warm_scraper = AuchanWineScraper(self.test_dir)
+        products = warm_scraper._scrape_all_products(10)
+        mock_get.assert_called_once_with(listing_url, headers={}, timeout=warm_scraper.timeout)
+        self.assertEqual(products[9]["ean"], "9")
+        self.assertEqual((warm_scraper.ean_cache.hits, warm_scraper.ean_cache.misses), (10, 0))
+
+    @patch('requests.Session.get')
+    def test_incremental_run(self, mock_get):
+        """Test that only new products and changed prices have their product page fetched"""
+        listing_url = "https://www.auchan.pt/pt/bebidas-e-garrafeira/garrafeira/?sz=24&start=0"
+        responses = {listing_url: self._create_page_html(10, 0)}
+
+        def mock_response(*args, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            if args[0] in responses:
+                response.content = responses[args[0]]
+            else:
+                response.content = f'<span class="product-ean">{args[0].rsplit("-", 1)[-1]}</span>'
+            return response
+
+        mock_get.side_effect = mock_response
+        # SQLite looks up the batch's last prices a few keys per query
+        chunk_patch = patch('storage.SqliteStorage.LOOKUP_CHUNK', 4)
+        chunk_patch.start()
+        self.addCleanup(chunk_patch.stop)
+        for storage in ['json', 'sqlite']:
+            scraper = AuchanWineScraper(self.test_dir, storage=storage, incremental=True)
+            scraper.run(10)
+            os.remove(scraper.ean_cache.path)  # Count product page fetches without the EAN cache
+
+            # Products 0-4 unchanged, 5-9 at a new price, 10-11 new
+            responses[listing_url] = self._create_page_html(5, 0) + self._create_page_html(7, 5, price=10.99)
+            mock_get.reset_mock()
+            scraper = AuchanWineScraper(self.test_dir, storage=storage, incremental=True)
+            scraper.run(12)
+
+            product_pages = sorted(int(c.args[0].rsplit("-", 1)[-1]) for c in mock_get.call_args_list if c.args[0] != listing_url)
+            self.assertEqual(product_pages, list(range(5, 12)), storage)
+            data = scraper._load_existing_data()
+            self.assertEqual(len(data), 12)
+            self.assertEqual(len(data["0"]["price_history"]), 1)
+            self.assertIn("last_seen", data["0"])
+            self.assertEqual([p["price"] for p in data["5"]["price_history"]], [9.99, 10.99])
+            responses[listing_url] = self._create_page_html(10, 0)
+
+    @patch('requests.Session.get')
+    def test_fan_out_listing_pages(self, mock_get):
+        """Test that fan-out reuses page 0, fetches each page once and keeps offset order"""
+        scraper = AuchanWineScraper(self.test_dir, fan_out=True)
+        total = '<input name="auc-js-search-results-total" value="60">'
+        responses = {
+            f"{scraper.base_url}?sz=24&start=0": total + self._create_page_html(24, 0),
+            f"{scraper.base_url}?sz=24&start=24": self._create_page_html(24, 24),
+            f"{scraper.base_url}?sz=24&start=48": self._create_page_html(12, 48),
+        }
+
+        def mock_response(*args, **kwargs):
+            response = MagicMock(status_code=200, headers={})
+            if args[0] in responses:
+                response.content = responses[args[0]]
+            else:
+                response.content = f'<span class="product-ean">{args[0].rsplit("-", 1)[-1]}</span>'
+            return response
+
+        mock_get.side_effect = mock_response
+
+        products = scraper._scrape_all_products(30)
+        self.assertEqual([p["name"] for p in products], [f"Test Wine {i}" for i in range(30)])
+        listing_calls = [c.args[0] for c in mock_get.call_args_list if c.args[0] in responses]
+        self.assertEqual(sorted(listing_calls), sorted(list(responses)[:2]))
+
+        products = scraper._scrape_all_products()
+        self.assertEqual(len(products), 60)
+        self.assertEqual(products[-1]["ean"], "59")
+
+class TestEanCache(TestScraperBase):
+    """Test suite for the product URL -> EAN cache"""
+
+    def test_ttl_and_eviction(self):
+        """Test that entries expire after the TTL and the least recently used one is evicted"""
+        path = os.path.join(self.test_dir, "test_ean_cache.json")
+        cache = EanCache(path, ttl=60, max_entries=2)
+        cache.set("Auchan", "/a", "1")
+        cache.set("Auchan", "/b", "2")
+        self.assertEqual(cache.get("Auchan", "/a"), "1")
+        cache.set("Auchan", "/c", "3")  # Evicts /b, the least recently used
+
+        self.assertIsNone(cache.get("Auchan", "/b"))
+        self.assertIsNone(cache.get("Continente", "/a"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        cache.save()
+        with patch('time.time', return_value=time.time() + 61):
+            self.assertIsNone(EanCache(path, ttl=60).get("Auchan", "/c"))
+        self.assertEqual(EanCache(path, ttl=60).get("Auchan", "/c"), "3")
+
+class TestPriceEventLog(TestScraperBase):
+    """Test suite for the snapshot + append-only event log storage"""
+
+    def test_background_compaction(self):
+        """Test that a long log is folded into the snapshot and replaying it again changes nothing"""
+        scraper = AuchanWineScraper(self.test_dir, compact_every=3)
+        products = [dict(self._sample_product, ean=str(i)) for i in range(2)]
+        scraper._save_data(products)
+        self.assertFalse(os.path.exists(scraper.data_file))
+
+        scraper._save_data([dict(products[0], price=8.99, name="Renamed Wine")])
+        scraper.storage.price_log.wait()
+        with open(scraper.data_file, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        price_log = scraper.storage.price_log
+        self.assertFalse(os.path.exists(price_log.log_file) or os.path.exists(price_log.segment_file))
+        self.assertEqual([p['price'] for p in snapshot["0"]['price_history']], [9.99, 8.99])
+        self.assertEqual(snapshot["0"]['name'], "Renamed Wine")
+
+        # Replaying events already folded into the snapshot (crash before the segment was removed)
+        with open(price_log.segment_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'type': 'price', 'ean': '0', **snapshot["0"]['price_history'][-1]}) + '\n')
+        self.assertEqual(scraper._load_existing_data(), snapshot)
+
+        # Appends go on while the log moved aside is folded into the snapshot
+        folding, appended = threading.Event(), threading.Event()
+        read_snapshot = price_log._read_snapshot
+
+        def slow_read_snapshot():
+            folding.set()
+            appended.wait(5)
+            return read_snapshot()
+
+        with patch.object(price_log, '_read_snapshot', slow_read_snapshot):
+            compaction = threading.Thread(target=price_log.compact)
+            compaction.start()
+            folding.wait(5)
+            scraper.storage.save([dict(products[1], price=7.99), dict(products[1], price=6.99)],
+                                 timestamp="2099-01-01T00:00:00")
+            appended.set()
+            compaction.join()
+        # The product's second price in the same save replaces the first
+        self.assertEqual([p['price'] for p in scraper._load_existing_data()["1"]['price_history']], [9.99, 6.99])
+
+    def test_saves_keep_only_latest_prices(self):
+        """Test that loading keeps nothing, and saves only keep each product's latest price until released"""
+        storage = AuchanWineScraper(self.test_dir).storage
+        storage.save([self._sample_product], timestamp="2024-03-20T10:00:00")
+        storage.release()
+        data = storage.load()
+        self.assertIsNone(storage._latest)
+
+        storage.save([dict(self._sample_product, price=8.99), dict(self._sample_product, ean="999")],
+                     timestamp="2024-03-21T10:00:00")
+        self.assertEqual(storage._latest["1234567890123"][0], 8.99)
+        storage.save([dict(self._sample_product, price=8.99)], timestamp="2024-03-22T10:00:00")
+        with open(storage.price_log.log_file, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([event['type'] for event in events], ['new', 'price', 'new', 'seen'])
+        storage.release()
+        self.assertIsNone(storage._latest)
+        # The data loaded before the saves is the caller's own copy
+        self.assertEqual(len(data["1234567890123"]['price_history']), 1)
+        self.assertEqual(len(storage.load()["1234567890123"]['price_history']), 2)
+
+class TestPipeline(TestScraperBase):
+    """Test suite for the bounded pipeline stages"""
+
+    def test_backpressure_and_errors(self):
+        """Test that a stage stops producing when its queue is full and passes errors on"""
+        produced = []
+
+        def source():
+            for i in range(10):
+                produced.append(i)
+                yield i
+            raise ValueError("listing page failed")
+
+        stage = bounded_stage(source(), maxsize=2)
+        self.assertEqual(next(stage), 0)
+        time.sleep(0.2)
+        # One item handed over, two waiting in the queue and one blocked on put()
+        self.assertLessEqual(len(produced), 4)
+        with self.assertRaises(ValueError):
+            list(stage)
+        self.assertEqual(len(produced), 10)
+
+    @patch('requests.Session.get')
+    def test_first_page_written_before_the_crawl_ends(self, mock_get):
+        """Test that the first page is saved and checkpointed while later pages are still being scraped"""
+        scraper = AuchanWineScraper(self.test_dir, write_interval=60)
+        saved = []
+        scraper._save_data = lambda products: saved.append(len(products))
+
+        def pages(limit, offset, scraped):
+            yield 24, [self._sample_product] * 24
+            # The first page is written before the second one is scraped
+            deadline = time.monotonic() + 5
+            while not saved and time.monotonic() < deadline:
+                time.sleep(0.01)
+            yield 48, [self._sample_product] * 24
+            yield 72, [self._sample_product] * 24
+
+        with patch.object(scraper, '_scrape_pages', pages):
+            self.assertEqual(scraper._write_pages(72, 0, 0), 72)
+        # Later pages are grouped into one write every write_interval seconds, or at the end
+        self.assertEqual(saved, [24, 48])
+        self.assertEqual(scraper._load_checkpoint(72)['next_offset'], 72)
+
+    def test_failed_flush_keeps_the_scraping_error(self):
+        """Test that saving the pages left when scraping fails doesn't replace the scraping error"""
+        scraper = AuchanWineScraper(self.test_dir, write_interval=60)
+        saved = []
+
+        def save(products):
+            if saved:
+                raise OSError("disk full")
+            saved.append(len(products))
+
+        def pages(limit, offset, scraped):
+            yield 24, [self._sample_product] * 24
+            yield 48, [self._sample_product] * 24
+            raise requests.ConnectionError("connection reset")
+
+        scraper._save_data = save
+        with patch.object(scraper, '_scrape_pages', pages):
+            with self.assertRaises(requests.ConnectionError):
+                scraper._write_pages(72, 0, 0)
+        self.assertEqual(saved, [24])
+        self.assertEqual(scraper._load_checkpoint(72)['next_offset'], 24)
+
+    def test_compressed_snapshot(self):
+        """Test that a gzip snapshot is read back by every backend and converts to the indented format"""
+        scraper = AuchanWineScraper(self.test_dir, compact_every=1, json_format='gzip')
+        scraper._save_data([dict(self._sample_product, name="Vinho Verde Nº 1")])
+        scraper.storage.price_log.wait()
+        with open(scraper.data_file, 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+        expected = scraper._load_existing_data()
+        for backend in BACKENDS:
+            self.assertEqual(JsonCodec(backend).read_file(scraper.data_file), expected)
+
+        convert(scraper.data_file, 'pretty')
+        with open(scraper.data_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), expected)
+
+class TestSqliteStorage(TestScraperBase):
+    """Test suite for the SQLite storage backend"""
+
+    def test_history_and_comparison(self):
+        """Test that price changes are recorded and compared with indexed queries"""
+        continente = ContinenteWineScraper(self.test_dir, storage='sqlite')
+        auchan = AuchanWineScraper(self.test_dir, storage='sqlite')
+        continente._save_data([self._sample_product])
+        auchan._save_data([dict(self._sample_product, price=8.99), dict(self._sample_product, ean="999")])
+        continente.storage.save([dict(self._sample_product, price=10.99)], timestamp="2099-01-01T00:00:00")
+        continente._save_data([dict(self._sample_product, price=10.99, name="Renamed Wine")])
+
+        self.assertEqual(continente._load_existing_data()["1234567890123"]["name"], "Renamed Wine")
+        self.assertEqual(len(auchan._load_existing_data()), 2)
+
+        comparator = WinePriceComparator(continente, auchan)
+        self.assertIs(comparator.database, continente.storage)
+        results = comparator.compare_prices()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["cheapest_retailer"], "Auchan")
+        self.assertAlmostEqual(results[0]["price_differences"]["Continente"], 2.0)
+        self.assertEqual(results[0]["name"], "Renamed Wine")
+
+        history = comparator.get_price_history("1234567890123")
+        self.assertEqual([p["price"] for p in history["Continente"]], [9.99, 10.99])
+        self.assertEqual([p["price"] for p in history["Auchan"]], [8.99])
+
+        # Name matching needs the loaded table, so it isn't silently skipped
+        with self.assertRaises(ValueError):
+            WinePriceComparator(continente, auchan, matcher=ProductMatcher())
+
+class TestRetries(TestScraperBase):
+    """Test suite for request retries and per-host rate limiting"""
+
+    @patch('time.sleep')
+    @patch('requests.Session.get')
+    def test_retry_with_backoff(self, mock_get, mock_sleep):
+        """Test that throttled and timed out requests are retried, honouring Retry-After"""
+        scraper = AuchanWineScraper(self.test_dir, http_cache=False, max_retries=3)
+        mock_get.side_effect = [
+            MagicMock(status_code=429, headers={'Retry-After': '7'}),
+            requests.Timeout(),
+            MagicMock(status_code=200, headers={}, content='<span class="product-ean">123</span>')
+        ]
+
+        self.assertEqual(scraper._fetch_ean("https://www.auchan.pt/test-wine"), "123")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertGreaterEqual(mock_sleep.call_args_list[0].args[0], 7)
+        self.assertLessEqual(mock_sleep.call_args_list[1].args[0], scraper.retry_backoff * 2)
+
+        mock_get.side_effect = [MagicMock(status_code=503, headers={}, raise_for_status=MagicMock(side_effect=requests.HTTPError()))] * 4
+        # Once the retries run out the error propagates, instead of the product losing its EAN
+        with self.assertRaises(requests.HTTPError):
+            scraper._fetch_ean("https://www.auchan.pt/test-wine")
+        self.assertEqual(mock_get.call_count, 7)
+
+    @patch('time.sleep')
+    @patch('requests.Session.get')
+    def test_broken_response_releases_limiter(self, mock_get, mock_sleep):
+        """Test that any request error is retried and gives its rate limiter slot back"""
+        scraper = AuchanWineScraper(self.test_dir, http_cache=False, max_retries=3, max_workers=1)
+        scraper.requests_per_second = 10.0
+        host = 'chunked.auchan.test'
+        self.addCleanup(HostRateLimiter._limiters.pop, host, None)
+        mock_get.side_effect = [requests.exceptions.ChunkedEncodingError()] * 3 + [
+            MagicMock(status_code=200, headers={}, content='<span class="product-ean">123</span>')
+        ]
+
+        self.assertEqual(scraper._fetch_ean(f"https://{host}/test-wine"), "123")
+        self.assertEqual(mock_get.call_count, 4)
+        self.assertEqual(HostRateLimiter._limiters[host].in_flight, 0)
+
+        # Errors outside requests still give the slot back before they propagate
+        mock_get.side_effect = ValueError("broken adapter")
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                scraper._get_with_retries(f"https://{host}/test-wine")
+        self.assertEqual(HostRateLimiter._limiters[host].in_flight, 0)
+
+    def test_aimd_limiter(self):
+        """Test that the limiter halves on failure, grows back additively and caps requests in flight"""
+        limiter = HostRateLimiter(rate=10.0, max_rate=12.0, max_concurrency=4, rate_step=1.0)
+        limiter.acquire()
+        limiter.release(healthy=False)
+        self.assertEqual((limiter.rate, limiter.concurrency), (5.0, 2.0))
+
+        limiter.acquire()
+        limiter.release(healthy=True)
+        self.assertEqual(limiter.rate, 6.0)
+        self.assertEqual(limiter.concurrency, 2.5)
+
+        limiter.acquire()
+        limiter.acquire()
+        waiter = threading.Thread(target=limiter.acquire)
+        waiter.start()
+        waiter.join(0.3)
+        self.assertTrue(waiter.is_alive())  # Only 2 requests may be in flight
+        limiter.release(healthy=True)
+        waiter.join(1)
+        self.assertFalse(waiter.is_alive())
+
+class TestRunScrapers(TestScraperBase):
+    """Test suite for running every retailer at the same time"""
+
+    @patch('requests.Session.get')
+    def test_summaries(self, mock_get):
+        """Test that each scraper reports its own success or failure and product count"""
+        mock_get.return_value = MagicMock(status_code=200, headers={}, content='<div></div>')
+        scrapers = [ContinenteWineScraper(self.test_dir), AuchanWineScraper(self.test_dir)]
+
+        # No tile and no total count on the page: a limited run scrapes nothing, a full run fails
+        summaries = run_scrapers(scrapers, 5)
+        self.assertEqual([s['retailer'] for s in summaries], ["Continente", "Auchan"])
+        self.assertTrue(all(s['success'] and s['products'] == 0 for s in summaries))
+
+        summaries = run_scrapers(scrapers, -1)
+        self.assertFalse(any(s['success'] for s in summaries))
+        self.assertIsNotNone(summaries[0]['error'])
+
+    @patch('requests.Session.get')
+    def test_profiled_runs(self, mock_get):
+        """Test that profiling covers the scraper's worker threads and saves its statistics"""
+        scraper = AuchanWineScraper(self.test_dir)
+        responses = {f"{scraper.base_url}?sz=24&start=0": TestAuchanScraper._create_page_html(24)}
+        for i in range(24):
+            responses[f"https://www.auchan.pt/test-wine-{i}"] = f'<span class="product-ean">1234{i:04d}567890</span>'
+
+        def mock_response(*args, **kwargs):
+            return MagicMock(status_code=200, headers={}, content=responses.get(args[0], '<div></div>'))
+
+        mock_get.side_effect = mock_response
+        profile_dir = os.path.join(self.test_dir, "profiles")
+        summaries = run_scrapers([scraper], 10, Profiler(profile_dir, 'cprofile', top=5))
+        self.assertEqual(summaries[0]['products'], 10)
+        stats = pstats.Stats(glob.glob(os.path.join(profile_dir, "*_auchan.pstats"))[0])
+        # Product pages are fetched by the EAN worker threads
+        fetch_ean = [key for key in stats.stats if key[2] == '_fetch_ean']
+        self.assertEqual(stats.stats[fetch_ean[0]][1], 10)
+        with open(glob.glob(os.path.join(profile_dir, "*_auchan.collapsed"))[0], encoding='utf-8') as f:
+            self.assertTrue(any('_fetch_ean(auchan_scraper.py' in line for line in f))
+
+        sampled_dir = os.path.join(self.test_dir, "sampled")
+        run_scrapers([AuchanWineScraper(self.test_dir)], 10, Profiler(sampled_dir, 'sampling', interval=0.001))
+        self.assertEqual(glob.glob(os.path.join(sampled_dir, "*.pstats")), [])
+        with open(glob.glob(os.path.join(sampled_dir, "*_auchan.collapsed"))[0], encoding='utf-8') as f:
+            for line in f:
+                stack, samples = line.rsplit(' ', 1)
+                self.assertGreater(int(samples), 0)
+
+class TestScraperDaemon(TestScraperBase):
+    """Test suite for the resident scheduler"""
+
+    @patch('requests.Session.get')
+    def test_cycles_with_warm_state(self, mock_get):
+        """Test that each retailer runs repeatedly on the same session and the dated report follows its prices"""
+        continente = ContinenteWineScraper(self.test_dir)
+        auchan = AuchanWineScraper(self.test_dir)
+        tiles = ''.join(f"""
+            <div class="product-tile" data-product-tile-impression='{{"name": "Test Wine {i}", "brand": "Test Brand", "price": "8.99"}}'>
+                <div class="ct-pdp-link"><a href="https://www.continente.pt/test-wine-{i}"></a></div>
+                <p class="pwc-tile--quantity">garrafa 75cl</p>
+                <span class="ct-price-value">€11,99</span>
+            </div>""" for i in range(5))
+        responses = {continente._listing_url(0): tiles, auchan._listing_url(0): TestAuchanScraper._create_page_html(24)}
+        for i in range(24):
+            responses[f"https://www.continente.pt/test-wine-{i}"] = f'<a class="js-details-header" data-url="?ean=1234{i:04d}567890"></a>'
+            responses[f"https://www.auchan.pt/test-wine-{i}"] = f'<span class="product-ean">1234{i:04d}567890</span>'
+
+        def mock_response(*args, **kwargs):
+            return MagicMock(status_code=200, headers={}, content=responses.get(args[0], '<div></div>'))
+
+        mock_get.side_effect = mock_response
+        daemon = ScraperDaemon([continente, auchan], 5, self.test_dir, {"Continente": 0.05, "Auchan": 0.1}, jitter=0.5)
+        daemon.start()
+        deadline = time.monotonic() + 10
+        while min(daemon.cycles.values()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sessions = (continente.session, auchan.session)
+        daemon.stop()
+        daemon.join()
+
+        self.assertGreaterEqual(min(daemon.cycles.values()), 2)
+        # Sessions (and their pooled connections) and the latest stored prices outlive the cycles
+        self.assertTrue(all(sessions))
+        self.assertIsNotNone(continente.storage._latest)
+        self.assertEqual((continente.session, auchan.session), sessions)
+        report_file = os.path.join(self.test_dir, datetime.now().strftime("report_%Y-%m-%d.txt"))
+        with open(report_file, encoding='utf-8') as f:
+            report = f.read()
+        self.assertEqual(report.count("Cheapest at: Continente"), 5)
+
+    def test_failed_cycle_is_rescheduled(self):
+        """Test that a cycle raising an error doesn't end its retailer's schedule"""
+        scraper = MagicMock(retailer="Auchan")
+        runs = []
+
+        def run(product_limit, keep_alive):
+            runs.append(product_limit)
+            if len(runs) == 1:
+                raise requests.ConnectionError("site down")
+            return {'retailer': "Auchan", 'success': True, 'products': 1, 'error': None, 'duration': 0.0}
+
+        scraper.run.side_effect = run
+        daemon = ScraperDaemon([scraper], 5, self.test_dir, {"Auchan": 0.01}, jitter=0)
+        with patch.object(daemon, 'write_report'):
+            thread = threading.Thread(target=daemon._schedule, args=(scraper,))
+            thread.start()
+            deadline = time.monotonic() + 10
+            while daemon.cycles["Auchan"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            daemon.stop()
+            thread.join()
+        self.assertGreaterEqual(daemon.cycles["Auchan"], 2)
+
+    @patch('requests.Session.get')
+    def test_stop_keeps_checkpoint(self, mock_get):
+        """Test that a stopped run saves the page it scraped and is resumed from the next one"""
+        scraper = AuchanWineScraper(self.test_dir)
+        responses = {
+            f"{scraper.base_url}?sz=24&start=0": TestAuchanScraper._create_page_html(24, 0),
+            f"{scraper.base_url}?sz=24&start=24": TestAuchanScraper._create_page_html(24, 24),
+        }
+
+        def mock_response(*args, **kwargs):
+            return MagicMock(status_code=200, headers={}, content=responses.get(args[0], '<span class="product-ean">1</span>'))
+
+        mock_get.side_effect = mock_response
+        scraper.save_listeners.append(lambda products: scraper.stop())
+        summary = scraper.run(48)
+        self.assertFalse(summary['success'])
+        self.assertEqual(summary['products'], 24)
+        self.assertEqual(scraper._load_checkpoint(48)['next_offset'], 24)
+
+class TestDistributedCrawl(TestScraperBase):
+    """Test suite for crawling through the work queue"""
+
+    @patch('requests.Session.get')
+    def test_workers_and_idempotent_merge(self, mock_get):
+        """Test that workers share a crawl's tasks and the coordinator merges each product once"""
+        coordinator_scraper = AuchanWineScraper(self.test_dir)
+        responses = {
+            f"{coordinator_scraper.base_url}?sz=24&start=0": (TestAuchanScraper._create_page_html(24, 0) +
+                                                                 '<input name="auc-js-search-results-total" value="48">'),
+            f"{coordinator_scraper.base_url}?sz=24&start=24": TestAuchanScraper._create_page_html(24, 24),
+        }
+        for i in range(48):
+            responses[f"https://www.auchan.pt/test-wine-{i}"] = f'<span class="product-ean">1234{i:04d}567890</span>'
+
+        def mock_response(*args, **kwargs):
+            return MagicMock(status_code=200, headers={}, content=responses.get(args[0], '<div></div>'))
+
+        mock_get.side_effect = mock_response
+        queue_file = os.path.join(self.test_dir, "work_queue.sqlite")
+        workers = [CrawlWorker(WorkQueue(queue_file), [AuchanWineScraper(self.test_dir)], name=f"worker-{i}",
+                               batch_size=4, idle_timeout=0.5, poll_interval=0.01) for i in range(2)]
+        threads = [threading.Thread(target=worker.run) for worker in workers]
+        for thread in threads:
+            thread.start()
+        # Asking for more products than the catalogue has only queues its pages
+        counts = coordinate(WorkQueue(queue_file), [coordinator_scraper], 100, poll_interval=0.01)
+        for thread in threads:
+            thread.join()
+
+        # 2 listing pages and 48 product pages, shared by both workers
+        self.assertEqual(counts, {'done': 50})
+        self.assertEqual(sum(worker.completed for worker in workers), 50)
+        self.assertTrue(all(worker.completed for worker in workers))
+        data = coordinator_scraper._load_existing_data()
+        self.assertEqual(len(data), 48)
+        self.assertTrue(all(len(product['price_history']) == 1 for product in data.values()))
+
+    def test_workers_split_the_host_rate(self):
+        """Test that workers only split the request rate when given a host_rate budget"""
+        queue = WorkQueue(os.path.join(self.test_dir, "work_queue.sqlite"))
+        scraper = AuchanWineScraper(self.test_dir)
+        scraper.requests_per_second, scraper.max_requests_per_second = 10.0, 100.0
+        CrawlWorker(queue, [scraper], workers=4)
+        self.assertEqual((scraper.requests_per_second, scraper.max_requests_per_second), (10.0, 100.0))
+
+        CrawlWorker(queue, [scraper], host_rate=100.0, workers=4)
+        self.assertEqual((scraper.requests_per_second, scraper.max_requests_per_second), (10.0, 25.0))
+
+    @patch('requests.Session.get')
+    def test_failed_product_pages_are_retried(self, mock_get):
+        """Test that a product task whose page couldn't be fetched fails instead of losing its EAN"""
+        queue = WorkQueue(os.path.join(self.test_dir, "work_queue.sqlite"), max_attempts=2)
+        crawl = queue.open_crawl()
+        queue.add(crawl, "Auchan", 'product', [("a", {'url': "https://www.auchan.pt/a", 'item_id': "a", 'price': 1.0})])
+        scraper = AuchanWineScraper(self.test_dir, http_cache=False, max_retries=0)
+        mock_get.side_effect = requests.ConnectionError("site down")
+        worker = CrawlWorker(queue, [scraper], idle_timeout=0, poll_interval=0.01)
+
+        worker.run()
+        self.assertEqual(worker.completed, 0)
+        self.assertEqual(queue.counts(crawl), {'failed': 1})
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_expired_leases_are_retried(self):
+        """Test that tasks of a worker whose lease expired go to another worker, which keeps them"""
+        queue = WorkQueue(os.path.join(self.test_dir, "work_queue.sqlite"), max_attempts=2)
+        crawl = queue.open_crawl()
+        self.assertEqual(queue.add(crawl, "Auchan", 'product', [("a", {'url': "a"}), ("b", {'url': "b"})]), 2)
+        self.assertEqual(queue.add(crawl, "Auchan", 'product', [("a", {'url': "a"})]), 0)
+
+        self.assertEqual(len(queue.claim("hung", limit=10, lease=0)), 2)
+        retried = queue.claim("healthy", limit=10, lease=60)
+        self.assertEqual([task.attempts for task in retried], [2, 2])
+        self.assertEqual(queue.complete("hung", [(task.id, {'ean': "1"}) for task in retried]), 0)
+        self.assertEqual(queue.complete("healthy", [(retried[0].id, {'ean': "2"})]), 1)
+        queue.fail("healthy", retried[1], "timed out")
+        self.assertEqual(queue.counts(crawl), {'done': 1, 'failed': 1})
+        self.assertEqual(queue.unmerged_results(crawl, "Auchan"), [(retried[0].id, {'ean': "2"})])
+
+class TestHttpCache(TestScraperBase):
+    """Test suite for the on-disk conditional HTTP cache"""
+
+    @patch('requests.Session.get')
+    def test_not_modified_served_from_disk(self, mock_get):
+        """Test that validators are sent and a 304 is answered with the cached body"""
+        scraper = AuchanWineScraper(self.test_dir)
+        url = "https://www.auchan.pt/test-wine-0"
+        mock_get.return_value = MagicMock(status_code=200, headers={'ETag': '"v1"'}, content=b'<p>cached</p>')
+        scraper._fetch(url)
+        scraper.http_cache.save()
+
+        mock_get.return_value = MagicMock(status_code=304, headers={}, content=b'')
+        response = AuchanWineScraper(self.test_dir)._fetch(url)
+
+        mock_get.assert_called_with(url, headers={'If-None-Match': '"v1"'}, timeout=scraper.timeout)
+        self.assertEqual(response.content, b'<p>cached</p>')
+
+    def test_lru_eviction(self):
+        """Test that the least recently used bodies are evicted past the size cap"""
+        cache = HttpCache(os.path.join(self.test_dir, "http_cache"), max_bytes=10)
+        response = MagicMock(headers={'Last-Modified': 'Wed, 20 Mar 2024 10:00:00 GMT'}, content=b'12345')
+        cache.store("/a", response)
+        cache.store("/b", response)
+        cache.load("/a")
+        cache.store("/c", response)
+
+        self.assertIsNone(cache.load("/b"))
+        self.assertEqual(cache.load("/a").content, b'12345')
+        self.assertEqual(cache.validators("/c"), {'If-Modified-Since': 'Wed, 20 Mar 2024 10:00:00 GMT'})
+
+        # Bodies stored after the index was last saved (a crashed run) are removed when the index is loaded
+        cache.save()
+        cache.store("/d", response)
+        reloaded = HttpCache(cache.folder, max_bytes=10)
+        self.assertEqual(reloaded.validators("/d"), {})
+        self.assertFalse(os.path.exists(cache._body_path("/d")))
+        self.assertTrue(os.path.exists(cache._body_path("/a")))
+
 class TestContinenteScraper(TestScraperBase):
     """Test suite for Continente wine scraper functionality"""
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_product_extraction(self, mock_get):
         """Test basic product extraction and parsing"""
-        mock_response = MagicMock()
+        mock_response = MagicMock(status_code=200, headers={})
         mock_response.content = '''
             <div class="product-tile" data-product-tile-impression='{"name": "Test Wine", "brand": "Test Brand", "price": "9.99"}'>
                 <div class="ct-pdp-link"><a href="https://www.continente.pt/test-wine"></a></div>
@@ -172,7 +1016,7 @@ class TestContinenteScraper(TestScraperBase):
             </div>
         '''
         
-        ean_response = MagicMock()
+        ean_response = MagicMock(status_code=200, headers={})
         ean_response.content = '''
             <a class="js-details-header" data-url="?ean=1234567890123"></a>
         '''
@@ -186,10 +1030,19 @@ class TestContinenteScraper(TestScraperBase):
         self.assertEqual(products[0]["ean"], "1234567890123")
         self.assertAlmostEqual(products[0]["price_per_litre"], 13.32, places=2)
 
-    @patch('requests.get')
+        # A product page without an EAN keeps the product, stored under a key of its own for the matcher
+        mock_get.side_effect = [mock_response, MagicMock(status_code=200, headers={}, content='<div></div>')]
+        scraper = ContinenteWineScraper(self.test_dir, http_cache=False)
+        products = scraper._get_product_data(product_offset=0, product_limit=1)
+        self.assertEqual(len(products), 1)
+        self.assertIsNone(products[0]["ean"])
+        scraper._save_data(products)
+        self.assertIn("~Continente:https://www.continente.pt/test-wine", scraper._load_existing_data())
+
+    @patch('requests.Session.get')
     def test_fallback_parsing(self, mock_get):
         """Test HTML parsing fallback when JSON data is invalid"""
-        mock_response = MagicMock()
+        mock_response = MagicMock(status_code=200, headers={})
         mock_response.content = '''
             <div class="product-tile" data-product-tile-impression='{name: '>
                 <h2 class="pwc-tile--description">Test Wine Fallback</h2>
@@ -201,7 +1054,7 @@ class TestContinenteScraper(TestScraperBase):
             </div>
         '''
         
-        ean_response = MagicMock()
+        ean_response = MagicMock(status_code=200, headers={})
         ean_response.content = '''
             <a class="js-details-header" data-url="?ean=1234567890123"></a>
         '''
@@ -213,6 +1066,32 @@ class TestContinenteScraper(TestScraperBase):
         self.assertEqual(products[0]["name"], "Test Wine Fallback")
         self.assertEqual(products[0]["brand"], "Test Brand Fallback")
 
+    @patch('requests.Session.get')
+    def test_restricted_parsing_backends(self, mock_get):
+        """Test that both parser backends keep multi-class tiles and drop the rest of the page"""
+        page = '''
+            <nav><a href="/menu">Menu</a></nav>
+            <div class="product-tile pwc-tile--grid" data-product-tile-impression='{"name": "Test Wine", "brand": "Test Brand", "price": "9.99"}'>
+                <div class="ct-pdp-link"><a href="https://www.continente.pt/test-wine"></a></div>
+                <p class="pwc-tile--quantity">garrafa 75cl</p>
+                <span class="ct-price-value">€13,32</span>
+            </div>
+            <div class="col-12 grid-footer" data-total-count="1"></div>
+        '''
+        ean_page = '<a href="/menu">Menu</a><a class="pwc-tab js-details-header" data-url="?ean=1234567890123"></a>'
+
+        for parser in ['html.parser', DEFAULT_PARSER]:
+            mock_get.side_effect = [
+                MagicMock(status_code=200, headers={}, content=page),
+                MagicMock(status_code=200, headers={}, content=ean_page)
+            ]
+            scraper = ContinenteWineScraper(self.test_dir, parser=parser, http_cache=False)
+            self.assertEqual(scraper._get_total_products(), 1)
+            self.assertIsNone(scraper._first_page.find('nav'))
+
+            products = scraper._get_product_data(0)
+            self.assertEqual(products[0]["ean"], "1234567890123", parser)
+
 class TestPriceComparator(TestScraperBase):
     """Test suite for wine price comparison functionality"""
 
@@ -279,5 +1158,174 @@ class TestPriceComparator(TestScraperBase):
         self.assertEqual(history["Continente"][-1]["price"], 10.99)
         self.assertEqual(history["Auchan"][-1]["price"], 9.99)
 
+    def test_compact_table(self):
+        """Test that the compact table gives back the stored histories and indexes shared products only"""
+        continente_data = copy.deepcopy(self._sample_data)
+        continente_data["1234567890123"]["price_history"].append({
+            "price": 10.49,
+            "price_per_litre": None,
+            "timestamp": "2024-03-21T10:00:00.123456"
+        })
+        continente_data["999"] = copy.deepcopy(self._sample_data["1234567890123"])
+        auchan_data = copy.deepcopy(self._sample_data)
+        
+        with open(os.path.join(self.test_dir, "continente_wine_data.json"), "w") as f:
+            json.dump(continente_data, f)
+        with open(os.path.join(self.test_dir, "auchan_wine_data.json"), "w") as f:
+            json.dump(auchan_data, f)
+
+        comparator = WinePriceComparator(ContinenteWineScraper(self.test_dir), AuchanWineScraper(self.test_dir))
+        self.assertEqual(comparator.get_price_history("1234567890123")["Continente"],
+                         continente_data["1234567890123"]["price_history"])
+        self.assertEqual([ean for ean, _ in comparator.table.shared_products()], ["1234567890123"])
+        results = comparator.compare_prices()
+        self.assertEqual(len(results), 1)
+        self.assertIsNone(results[0]["price_per_litre"]["Continente"])
+        self.assertAlmostEqual(results[0]["price_differences"]["Continente"], 0.5)
+        # Strings shared by both retailers are stored once
+        names = [comparator.table.record(*row).name for row in comparator.table.index["1234567890123"]]
+        self.assertIs(names[0], names[1])
+
+    @unittest.skipUnless(np, "NumPy is not installed")
+    def test_vectorized_comparison(self):
+        """Test that the NumPy comparison returns the same results as the pure-Python one"""
+        product = self._sample_data["1234567890123"]
+        def priced(price, price_per_litre):
+            return dict(product, price_history=[dict(product["price_history"][0], price=price, price_per_litre=price_per_litre)])
+        comparator = WinePriceComparator.from_data({
+            "Continente": {"1": priced(9.99, 13.32), "2": priced(5.0, None), "3": priced(7.0, 9.33)},
+            "Auchan": {"1": priced(8.99, 11.99), "2": priced(5.0, 6.67)},
+            "Pingo Doce": {"1": priced(9.49, None), "3": priced(6.5, 8.67), "4": priced(3.0, 4.0)}
+        })
+        results = comparator.compare_prices(vectorized=True)
+        self.assertEqual(results, comparator.compare_prices(vectorized=False))
+        self.assertEqual([r["ean"] for r in results], ["1", "2", "3"])
+        # Ties go to the first retailer, and missing prices per litre stay None
+        self.assertEqual(results[1]["cheapest_retailer"], "Continente")
+        self.assertIsNone(results[1]["price_per_litre"]["Continente"])
+        self.assertEqual(set(results[2]["prices"]), {"Continente", "Pingo Doce"})
+
+    def test_time_range_queries(self):
+        """Test range slicing, statistics, downsampling and rolling windows over the price history"""
+        product = copy.deepcopy(self._sample_data["1234567890123"])
+        product["price_history"] = [
+            {"price": price, "price_per_litre": None, "timestamp": timestamp}
+            for price, timestamp in [(10.0, "2024-03-01T10:00:00"), (8.0, "2024-03-05T09:00:00"),
+                                     (9.0, "2024-03-05T18:00:00"), (12.0, "2024-03-20T10:00:00")]
+        ]
+        comparator = WinePriceComparator.from_data({"Continente": {"1": product}, "Auchan": {}})
+
+        history = comparator.get_price_history("1", "2024-03-05", "2024-03-20")["Continente"]
+        self.assertEqual([p["price"] for p in history], [8.0, 9.0])
+        # The price in effect when the range starts counts towards its statistics
+        stats = comparator.get_price_stats("1", "2024-03-10", "2024-03-31")["Continente"]
+        self.assertEqual((stats["min"], stats["max"], stats["points"]), (9.0, 12.0, 2))
+
+        weeks = comparator.downsample_prices("1", "week")["Continente"]
+        self.assertEqual([w["timestamp"] for w in weeks],
+                         ["2024-02-26T00:00:00", "2024-03-04T00:00:00", "2024-03-11T00:00:00", "2024-03-18T00:00:00"])
+        self.assertEqual([(w["min"], w["max"], w["close"]) for w in weeks],
+                         [(10.0, 10.0, 10.0), (8.0, 10.0, 9.0), (9.0, 9.0, 9.0), (9.0, 12.0, 12.0)])
+        self.assertEqual(len(comparator.downsample_prices("1", "day", "2024-03-01", "2024-03-08")["Continente"]), 7)
+
+        rolling = comparator.get_rolling_stats("1", days=7, now="2024-03-20T10:00:00")["Continente"]
+        self.assertEqual((rolling["min"], rolling["max"]), (9.0, 12.0))
+        # New prices update the window incrementally, and moving it forward drops older points
+        comparator.add_prices("Continente", [dict(product, ean="1", price=7.5)], "2024-03-22T10:00:00")
+        self.assertEqual(comparator.get_rolling_stats("1", days=7, now="2024-03-22T10:00:00")["Continente"]["min"], 7.5)
+        rolling = comparator.get_rolling_stats("1", days=7, now="2024-04-30T00:00:00")["Continente"]
+        self.assertEqual((rolling["min"], rolling["max"], rolling["points"]), (7.5, 7.5, 1))
+        # Without now the window ends at the current time, long past these prices but for the last one
+        self.assertEqual(comparator.get_rolling_stats("1", days=14)["Continente"]["points"], 1)
+        self.assertEqual(len(comparator.get_price_history("1")["Continente"]), 5)
+
+    def test_reports_and_top_savings(self):
+        """Test the streamed report formats and that top-N keeps the biggest price differences"""
+        product = self._sample_data["1234567890123"]
+        def priced(price):
+            return dict(product, price_history=[dict(product["price_history"][0], price=price)])
+        comparator = WinePriceComparator.from_data({
+            "Continente": {"1": priced(10.0), "2": priced(5.0), "3": priced(7.0)},
+            "Auchan": {"1": priced(9.0), "2": priced(8.0), "3": priced(7.0)}
+        })
+        for vectorized in (False, True) if np else (False,):
+            top = comparator.top_savings(2, vectorized=vectorized)
+            self.assertEqual([r["ean"] for r in top], ["2", "1"])
+
+        if np is not None:
+            # Savings tied at the cut are kept in the same order by the heap and the partition
+            tied = WinePriceComparator.from_data({
+                "Continente": {str(i): priced(10.0) for i in range(20)},
+                "Auchan": {str(i): priced(10.0 + i % 4) for i in range(20)}
+            })
+            for n in (0, 1, 3, 7, 20, 25):
+                self.assertEqual(tied.top_savings(n, vectorized=True), tied.top_savings(n, vectorized=False))
+
+        report = io.StringIO()
+        self.assertEqual(comparator.write_report(report, 'csv', top=1), 1)
+        rows = list(csv.DictReader(io.StringIO(report.getvalue())))
+        self.assertEqual((rows[0]["ean"], rows[0]["max_saving"], rows[0]["Auchan_difference"]), ("2", "3.0", "3.0"))
+
+        report = io.StringIO()
+        self.assertEqual(comparator.write_report(report, 'jsonl'), 3)
+        self.assertEqual([json.loads(line) for line in report.getvalue().splitlines()], comparator.compare_prices())
+
+        report = io.StringIO()
+        comparator.write_report(report, 'text', top=1)
+        self.assertIn("Auchan is €3.00 more expensive than the cheapest option", report.getvalue())
+        self.assertNotIn("EAN: 1\n", report.getvalue())
+
+    def test_match_products_without_ean(self):
+        """Test that products stored without an EAN are matched by name, brand and quantity"""
+        scraper = AuchanWineScraper(self.test_dir)
+        scraper._save_data([
+            dict(self._sample_product, ean=None, name="VINHO TINTO Quinta da Pêra Reserva 0,75 L",
+                 brand="Quinta da Pera", quantity="0,75 L", item_id="111", price=8.49),
+            dict(self._sample_product, ean=None, name="Vinho Tinto Quinta da Pêra Reserva",
+                 brand="Quinta da Pera", quantity="1,5 L", item_id="222", price=15.99)
+        ])
+        auchan_data = scraper._load_existing_data()
+        self.assertEqual(sorted(auchan_data), ["~Auchan:111", "~Auchan:222"])
+        self.assertEqual(normalise_quantity("emb. 6 x 75 cl"), "6x750ml")
+
+        continente_data = copy.deepcopy(self._sample_data)
+        continente_data["1234567890123"].update(name="Vinho Tinto Quinta da Pêra Reserva", brand="QUINTA DA PERA")
+        comparator = WinePriceComparator.from_data({"Continente": continente_data, "Auchan": auchan_data},
+                                                   matcher=ProductMatcher())
+        results = comparator.compare_prices(vectorized=False)
+        # Only the bottle of the same volume joins the Continente product
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["ean"], "1234567890123")
+        self.assertEqual(results[0]["cheapest_retailer"], "Auchan")
+        self.assertGreater(results[0]["match_confidence"], 0.75)
+
+        # A product without an EAN joining a later retailer's group ties like any other, on both paths
+        continente_data = {"~Continente:333": dict(auchan_data["~Auchan:111"], name="Vinho Tinto Quinta da Pêra Reserva")}
+        auchan_data = {"1234567890123": copy.deepcopy(continente_data["~Continente:333"])}
+        comparator = WinePriceComparator.from_data({"Continente": continente_data, "Auchan": auchan_data},
+                                                   matcher=ProductMatcher())
+        self.assertEqual(comparator.table.index["1234567890123"], [(0, 0), (1, 0)])
+        results = comparator.compare_prices(vectorized=False)
+        self.assertEqual(results[0]["cheapest_retailer"], "Continente")
+        if np is not None:
+            self.assertEqual(comparator.compare_prices(vectorized=True), results)
+
+class TestReplayBenchmark(TestScraperBase):
+    """Test cases for the offline benchmark replaying recorded pages"""
+
+    def test_replay_with_injected_errors(self):
+        """Test scraping synthetic fixtures from the replay server through injected 503s"""
+        fixtures = os.path.join(self.test_dir, "fixtures")
+        synthesize(fixtures, pages=2)
+        with ReplayServer(FixtureStore(os.path.join(fixtures, "continente")), error_rate=0.2, seed=1) as server:
+            result = run_scraper(instrumented(ContinenteWineScraper, rewrite=server.rewrite), -1,
+                                 max_retries=10, retry_backoff=0.001)
+            self.assertGreater(server.errors, 0)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['products'], 72)
+        self.assertGreater(result['tiles_per_s'], 0)
+        self.assertLessEqual(result['ean_ms_p50'], result['ean_ms_p99'])
+        self.assertGreater(result['save_ms_per_batch'], 0)
+
 if __name__ == '__main__':
     unittest.main()
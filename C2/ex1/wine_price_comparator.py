@@ -3,103 +3,264 @@
 # - Dict: For annotating dictionaries (e.g., Dict[str, int] is a dict with string keys and integer values)
 # - Union: For types that could be one of several types (e.g., Union[str, int] means str or int)
 # - Any: Used when a value could be of any type
-from typing import List, Dict, Union, Any
+# - Optional: Used for values that could be None
+from typing import List, Dict, Union, Any, Optional, Iterable, Iterator, TextIO
 from base_scraper import BaseWineScraper  # Custom module containing the base class for wine scrapers
-import json  # Built-in module for JSON data encoding and decoding
+from storage import SqliteStorage  # Custom module with the SQLite storage backend, queried directly when shared
+from price_table import PriceTable, TimeBound, np  # Custom module with the compact, EAN-indexed copy of the wine data, and NumPy if installed
+from datetime import datetime  # For timestamping new prices and time range bounds
+from product_matcher import ProductMatcher  # Custom module matching products without an EAN by name
+from report_writers import write_report, max_saving  # Custom module streaming results to text, CSV and JSONL reports
+import heapq  # Built-in module for heaps, to keep the biggest savings
+import sys  # For writing the report to standard output
+
+def _iso(bound: TimeBound) -> Optional[str]:
+    return bound.isoformat() if isinstance(bound, datetime) else bound
 
 class WinePriceComparator:
-    def __init__(self, *scrapers: BaseWineScraper) -> None:
-        """Initialize comparator with any number of scrapers"""
+    def __init__(self, *scrapers: BaseWineScraper, matcher: Optional[ProductMatcher] = None) -> None:
+        """Initialize comparator with any number of scrapers
+
+        With a matcher, products stored without an EAN are matched to other retailers' products
+        by name, brand and quantity, and compared like products sharing an EAN.
+        """
         if len(scrapers) < 2:
             raise ValueError("At least two scrapers are required for comparison")
             
-        self.retailer_data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.retailers: List[str] = [scraper.retailer for scraper in scrapers]
+
+        # When every retailer lives in the same SQLite database, comparisons become indexed
+        # queries and nothing needs to be loaded up front
+        self.database: Optional[SqliteStorage] = None
+        self.table: PriceTable = PriceTable()
+        databases = {getattr(scraper.storage, 'database_file', None) for scraper in scrapers}
+        if len(databases) == 1 and None not in databases:
+            # Name matches are only applied to the loaded table, which the shared database goes without
+            if matcher is not None:
+                raise ValueError("Products can't be matched by name when comparing through a shared SQLite database")
+            self.database = scrapers[0].storage
+            return
         
+        # Each retailer's nested JSON is converted to the compact table as soon as it is loaded
         for scraper in scrapers:
-            retailer_name = scraper.__class__.__name__.replace('WineScraper', '')
-            try:
-                with open(scraper.data_file, 'r', encoding='utf-8') as f:
-                    self.retailer_data[retailer_name] = json.load(f)
-            except FileNotFoundError:
-                print(f"Warning: No data file found for {retailer_name}")
-                self.retailer_data[retailer_name] = {}
-
-    def compare_prices(self) -> List[Dict[str, Union[str, float]]]:
-        """Compare prices for products across all retailers"""
-        results = []
-        all_eans = set()
-        
-        for retailer_products in self.retailer_data.values():
-            all_eans.update(retailer_products.keys())
-            
-        for ean in all_eans:
-            retailers_with_product = {
-                retailer: data[ean]
-                for retailer, data in self.retailer_data.items()
-                if ean in data
-            }
-            
-            if len(retailers_with_product) < 2:
-                continue
-                
-            current_prices = {
-                retailer: data['price_history'][-1]['price']
-                for retailer, data in retailers_with_product.items()
-            }
-            
-            price_per_litre = {
-                retailer: data['price_history'][-1].get('price_per_litre')
-                for retailer, data in retailers_with_product.items()
-            }
+            retailer_name = scraper.retailer
+            # Snapshot plus the events logged since the last compaction
+            data = scraper._load_existing_data()
+            if not data:
+                print(f"Warning: No data found for {retailer_name}")
+            self.table.add_retailer(retailer_name, data)
+        self._match_products(matcher)
+
+    def _match_products(self, matcher: Optional[ProductMatcher]) -> None:
+        if matcher is None:
+            return
+        matches = matcher.apply(self.table)
+        if matches:
+            print(f"Matched {len(matches)} products without an EAN by name")
+
+    @classmethod
+    def from_data(cls, retailer_data: Dict[str, Dict[str, Dict[str, Any]]],
+                  matcher: Optional[ProductMatcher] = None) -> 'WinePriceComparator':
+        """Create a comparator from wine data already loaded, keyed by retailer"""
+        comparator = cls.__new__(cls)
+        comparator.retailers = list(retailer_data)
+        comparator.database = None
+        comparator.table = PriceTable()
+        for retailer, data in retailer_data.items():
+            comparator.table.add_retailer(retailer, data)
+        comparator._match_products(matcher)
+        return comparator
+
+    def compare_prices(self, vectorized: bool = False) -> List[Dict[str, Union[str, float]]]:
+        """Compare prices for products across all retailers
+
+        vectorized selects the NumPy implementation, which needs NumPy installed. Both
+        implementations return the same results.
+        """
+        return list(self.iter_comparisons(vectorized))
+
+    def iter_comparisons(self, vectorized: bool = False) -> Iterator[Dict[str, Union[str, float]]]:
+        """Compare prices like compare_prices, producing the results one at a time where possible"""
+        if self.database:
+            return iter(self._compare_prices_database())
+        if vectorized:
+            return iter(self._compare_prices_vectorized())
+        return self._iter_comparisons_table()
+
+    def top_savings(self, n: int, vectorized: bool = False) -> List[Dict[str, Union[str, float]]]:
+        """The n comparisons with the biggest price differences, biggest first
+
+        A heap of n results is kept while comparing, instead of sorting every result. The NumPy
+        implementation partitions the matrix around the n-th biggest saving, sorts those n and
+        only builds their results.
+        """
+        if vectorized and not self.database:
+            return self._compare_prices_vectorized(top=n)
+        return heapq.nlargest(n, self.iter_comparisons(vectorized), key=max_saving)
+
+    def _iter_comparisons_table(self) -> Iterator[Dict[str, Union[str, float]]]:
+        table = self.table
+        for ean, rows in table.shared_products():
+            current_prices = {}
+            price_per_litre = {}
+            for retailer_id, row in rows:
+                retailer = table.retailers[retailer_id]
+                current_prices[retailer], price_per_litre[retailer] = table.columns[retailer_id].latest(row)
             
             cheapest_retailer = min(current_prices.items(), key=lambda x: x[1])[0]
+            cheapest_price = current_prices[cheapest_retailer]
             
             comparison = {
                 "ean": ean,
-                "name": next(iter(retailers_with_product.values()))['name'],
-                "retailers": len(retailers_with_product),
+                "name": table.record(*rows[0]).name,
+                "retailers": len(rows),
                 "prices": current_prices,
                 "price_per_litre": price_per_litre,
                 "cheapest_retailer": cheapest_retailer,
                 "price_differences": {
-                    retailer: price - min(current_prices.values())
+                    retailer: price - cheapest_price
                     for retailer, price in current_prices.items()
                 }
             }
+            if ean in table.match_confidence:
+                comparison["match_confidence"] = table.match_confidence[ean]
             
-            results.append(comparison)
-            
+            yield comparison
+
+    def _compare_prices_vectorized(self, top: Optional[int] = None) -> List[Dict[str, Union[str, float]]]:
+        """Compare prices on an EAN x retailer matrix of latest prices, with NaN for missing ones,
+        optionally only building the results of the top biggest savings"""
+        if np is None:
+            raise RuntimeError("NumPy is required for vectorized price comparisons")
+        eans, names, sellers, prices, prices_per_litre = self.table.latest_matrix()
+        if not eans:
+            return []
+
+        # nanargmin picks the first cheapest retailer in retailer order, like min() over the dicts
+        cheapest = np.nanargmin(prices, axis=1)
+        differences = prices - prices[np.arange(len(eans)), cheapest][:, None]
+        if top is not None:
+            savings = np.nanmax(differences, axis=1)
+            candidates = np.arange(len(eans))
+            if top <= 0:
+                candidates = candidates[:0]
+            elif top < len(eans):
+                # argpartition finds the top-th biggest saving in linear time; ties with it are
+                # taken in EAN order, like heapq.nlargest
+                kth = savings[np.argpartition(-savings, top - 1)[top - 1]]
+                above = np.flatnonzero(savings > kth)
+                candidates = np.sort(np.concatenate([above, np.flatnonzero(savings == kth)[:top - len(above)]]))
+            # Only the top entries are sorted, stably so ties stay in EAN order
+            order = candidates[np.argsort(-savings[candidates], kind='stable')]
+            eans, names, sellers = [eans[i] for i in order], [names[i] for i in order], [sellers[i] for i in order]
+            prices, prices_per_litre = prices[order], prices_per_litre[order]
+            differences, cheapest = differences[order], cheapest[order]
+        per_litre = prices_per_litre.astype(object)
+        per_litre[np.isnan(prices_per_litre)] = None
+
+        # Only building the result records is left to Python, from plain lists
+        retailers = self.table.retailers
+        results = [
+            {
+                "ean": ean,
+                "name": name,
+                "retailers": len(ids),
+                "prices": {retailers[r]: price_row[r] for r in ids},
+                "price_per_litre": {retailers[r]: per_litre_row[r] for r in ids},
+                "cheapest_retailer": retailers[cheapest_id],
+                "price_differences": {retailers[r]: difference_row[r] for r in ids}
+            }
+            for ean, name, ids, price_row, per_litre_row, difference_row, cheapest_id in zip(
+                eans, names, sellers, prices.tolist(), per_litre.tolist(), differences.tolist(), cheapest.tolist())
+        ]
+        # Groups joined by the product matcher carry the confidence of the match
+        if self.table.match_confidence:
+            for result in results:
+                if result["ean"] in self.table.match_confidence:
+                    result["match_confidence"] = self.table.match_confidence[result["ean"]]
         return results
 
-    def get_price_history(self, ean: str) -> Dict[str, List[Dict[str, Union[float, str]]]]:
-        """Get price history for a product across all retailers"""
-        history = {}
-        
-        for retailer, data in self.retailer_data.items():
-            if ean in data:
-                history[retailer] = data[ean]['price_history']
-                
-        return history
+    def _compare_prices_database(self) -> List[Dict[str, Union[str, float]]]:
+        """Compare prices with a join on the EAN index of the shared SQLite database"""
+        results = []
+        for ean, rows in self.database.get_latest_prices(self.retailers).items():
+            current_prices = {retailer: row['price'] for retailer, row in rows.items()}
+            cheapest_price = min(current_prices.values())
+            results.append({
+                "ean": ean,
+                "name": next(iter(rows.values()))['name'],
+                "retailers": len(rows),
+                "prices": current_prices,
+                "price_per_litre": {retailer: row['price_per_litre'] for retailer, row in rows.items()},
+                "cheapest_retailer": min(current_prices.items(), key=lambda x: x[1])[0],
+                "price_differences": {
+                    retailer: price - cheapest_price
+                    for retailer, price in current_prices.items()
+                }
+            })
+        return results
+
+    def get_price_history(self, ean: str, start: TimeBound = None,
+                          end: TimeBound = None) -> Dict[str, List[Dict[str, Union[float, str]]]]:
+        """Get price history for a product across all retailers, optionally only with start <= timestamp < end"""
+        if self.database:
+            return self.database.get_price_histories(ean, self.retailers, _iso(start), _iso(end))
+
+        return self.table.get_price_history(ean, start, end)
+
+    def _table_for(self, ean: str) -> PriceTable:
+        """Table holding the product's history at each retailer, loaded from the shared database if needed"""
+        if not self.database:
+            return self.table
+        table = PriceTable()
+        for retailer, history in self.database.get_price_histories(ean, self.retailers).items():
+            table.add_retailer(retailer, {ean: {'price_history': history}})
+        return table
+
+    def get_price_stats(self, ean: str, start: TimeBound = None,
+                        end: TimeBound = None) -> Dict[str, Dict[str, float]]:
+        """Get the lowest, highest and mean price of a product at each retailer between start and end"""
+        return self._table_for(ean).price_stats(ean, start, end)
 
-    def print_comparison(self, results: List[Dict[str, Any]]) -> None:
+    def downsample_prices(self, ean: str, period: str = 'day', start: TimeBound = None,
+                          end: TimeBound = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Get daily or weekly lowest, highest, mean and closing prices of a product at each retailer"""
+        return self._table_for(ean).downsample(ean, period, start, end)
+
+    def get_rolling_stats(self, ean: str, days: float = 30, now: TimeBound = None) -> Dict[str, Dict[str, float]]:
+        """Get the lowest, highest and mean price of a product at each retailer over the days up to now
+
+        now defaults to the current time, so prices that have gone out of the window are left out
+        even when no newer price was recorded. Rolling windows are kept up to date as add_prices()
+        records new prices. With a shared database they are computed from the stored history on each call.
+        """
+        return self._table_for(ean).rolling_stats(ean, days, datetime.now() if now is None else now)
+
+    def add_prices(self, retailer: str, products: List[Dict[str, Any]], timestamp: Optional[str] = None) -> None:
+        """Record newly scraped prices, skipping products whose price didn't change
+
+        Nothing to do when comparing through the shared database, which the scrapers update directly.
+        """
+        if self.database:
+            return
+        timestamp = timestamp or datetime.now().isoformat()
+        if retailer not in self.table.retailers:
+            self.table.add_retailer(retailer, {})
+        retailer_id = self.table.retailers.index(retailer)
+        for product in products:
+            row = self.table.find_row(retailer_id, product['ean'])
+            if row is not None and self.table.columns[retailer_id].latest(row)[0] == product['price']:
+                continue
+            point = {'price': product['price'], 'price_per_litre': product.get('price_per_litre'), 'timestamp': timestamp}
+            self.table.add_point(retailer, product['ean'], point, product)
+
+    def print_comparison(self, results: Iterable[Dict[str, Any]]) -> None:
         """Print formatted comparison results"""
-        print("\nWine Price Comparison Results:")
-        print("-" * 80)
-        
-        for result in results:
-            print(f"\nProduct: {result['name']}")
-            print(f"EAN: {result['ean']}")
-            print(f"Available in {result['retailers']} retailers")
-            
-            for retailer, price in result['prices'].items():
-                print(f"{retailer} Price: €{price:.2f}")
-                if result['price_per_litre'][retailer]:
-                    print(f"{retailer} Price per Litre: €{result['price_per_litre'][retailer]:.2f}")
-            
-            
-            for retailer, diff in result['price_differences'].items():
-                if diff > 0:
-                    print(f"\nCheapest at: {result['cheapest_retailer']}")
-                    print(f"{retailer} is €{diff:.2f} more expensive than the cheapest option")
-            
-            print("-" * 80)
\ No newline at end of file
+        write_report(results, sys.stdout, self.retailers, 'text')
+
+    def write_report(self, stream: TextIO, report_format: str = 'text', top: Optional[int] = None,
+                     vectorized: bool = False) -> int:
+        """Compare prices and stream the results to a text, CSV or JSONL report, optionally only the
+        top biggest savings; returns how many results were written"""
+        results = self.top_savings(top, vectorized) if top else self.iter_comparisons(vectorized)
+        return write_report(results, stream, self.retailers, report_format)
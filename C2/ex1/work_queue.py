@@ -0,0 +1,185 @@
+# This line imports types from the typing module for type hinting
+from typing import List, Dict, Any, Iterator, Optional, Tuple, NamedTuple
+from contextlib import contextmanager  # Decorator for writing with-statement context managers
+from datetime import datetime  # For the start and end times of each crawl
+from json_codec import codec  # Custom module encoding JSON with the fastest backend installed
+import os  # Provides functions for interacting with the operating system (file paths, etc.)
+import socket  # For naming workers after their host
+import sqlite3  # Built-in module for SQLite databases
+import time  # Built-in module for time-related functions
+
+class Task(NamedTuple):
+    """A unit of work claimed from the queue"""
+    id: int
+    crawl: int
+    retailer: str
+    kind: str  # 'listing' (a listing page to split into product tasks) or 'product' (a product page)
+    payload: Dict[str, Any]
+    attempts: int
+
+def worker_name() -> str:
+    """Name identifying this process in the leases it holds"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Durable queue of crawl tasks in a SQLite database, claimed by workers under time-limited leases
+
+    A claimed task is leased to its worker until lease_expires. Tasks whose lease expired (their
+    worker died or hung) are claimed again by another worker, up to max_attempts times in all.
+    Results stay in the queue until the coordinator has merged them into the retailer's store.
+
+    Every transaction is short and claims take a batch of tasks at once, so many workers can
+    share the database. SQLite needs the file on a local disk: workers on other machines
+    need it shared through something that keeps SQLite's locking, not a plain network share.
+    """
+
+    SCHEMA: str = '''
+        CREATE TABLE IF NOT EXISTS crawls (
+            id INTEGER PRIMARY KEY,
+            started TEXT NOT NULL,
+            finished TEXT
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            crawl INTEGER NOT NULL,
+            retailer TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result TEXT,
+            error TEXT,
+            merged INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (crawl, retailer, kind, key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (status, lease_expires);
+        CREATE INDEX IF NOT EXISTS idx_tasks_merge ON tasks (crawl, retailer, merged, status);
+    '''
+
+    def __init__(self, database_file: str, max_attempts: int = 5) -> None:
+        self.database_file: str = database_file
+        self.max_attempts: int = max_attempts
+        os.makedirs(os.path.dirname(database_file) or '.', exist_ok=True)
+        conn = sqlite3.connect(database_file, timeout=60)
+        try:
+            # WAL lets workers claim tasks while the coordinator reads results
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one transaction, taking the write lock up front if immediate"""
+        conn = sqlite3.connect(self.database_file, timeout=60, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def open_crawl(self) -> int:
+        """Get the latest unfinished crawl, so an interrupted one carries on, or start a new one"""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute('SELECT id FROM crawls WHERE finished IS NULL ORDER BY id DESC LIMIT 1').fetchone()
+            if row:
+                return row[0]
+            return conn.execute('INSERT INTO crawls (started) VALUES (?)', (datetime.now().isoformat(),)).lastrowid
+
+    def finish_crawl(self, crawl: int) -> None:
+        with self._connect(immediate=True) as conn:
+            conn.execute('UPDATE crawls SET finished = ? WHERE id = ?', (datetime.now().isoformat(), crawl))
+
+    def add(self, crawl: int, retailer: str, kind: str, tasks: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Queue (key, payload) tasks, skipping keys already queued in the crawl; returns how many were new"""
+        with self._connect(immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO tasks (crawl, retailer, kind, key, payload) VALUES (?, ?, ?, ?, ?)',
+                [(crawl, retailer, kind, key, codec.dumps(payload).decode('utf-8')) for key, payload in tasks])
+            return conn.total_changes - before
+
+    def has_tasks(self, crawl: int, retailer: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM tasks WHERE crawl = ? AND retailer = ? LIMIT 1',
+                                (crawl, retailer)).fetchone() is not None
+
+    def claim(self, worker: str, limit: int = 16, lease: float = 300.0) -> List[Task]:
+        """Lease up to limit pending or expired tasks of unfinished crawls to a worker, oldest first"""
+        now: float = time.time()
+        with self._connect(immediate=True) as conn:
+            # Expired leases that used up their attempts won't be retried
+            conn.execute('''
+                UPDATE tasks SET status = 'failed', error = COALESCE(error, 'lease expired')
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            ''', (now, self.max_attempts))
+            rows = conn.execute('''
+                SELECT id, crawl, retailer, kind, payload, attempts FROM tasks
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                  AND crawl IN (SELECT id FROM crawls WHERE finished IS NULL)
+                ORDER BY id LIMIT ?
+            ''', (now, limit)).fetchall()
+            conn.executemany('''
+                UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?
+            ''', [(worker, now + lease, row[0]) for row in rows])
+        return [Task(task_id, crawl, retailer, kind, codec.loads(payload), attempts + 1)
+                for task_id, crawl, retailer, kind, payload, attempts in rows]
+
+    def complete(self, worker: str, results: List[Tuple[int, Optional[Dict[str, Any]]]]) -> int:
+        """Record the results of tasks the worker still holds the lease of; returns how many were recorded
+
+        A task whose lease expired and was claimed by another worker keeps that worker's result.
+        """
+        with self._connect(immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany('''
+                UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_expires = NULL
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            ''', [(None if result is None else codec.dumps(result).decode('utf-8'), task_id, worker)
+                  for task_id, result in results])
+            return conn.total_changes - before
+
+    def fail(self, worker: str, task: Task, error: str) -> None:
+        """Give a task back for another attempt, or fail it once it used up its attempts"""
+        status: str = 'failed' if task.attempts >= self.max_attempts else 'pending'
+        with self._connect(immediate=True) as conn:
+            conn.execute('''
+                UPDATE tasks SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            ''', (status, error, task.id, worker))
+
+    def unmerged_results(self, crawl: int, retailer: str, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+        """Results of finished product tasks that aren't in the retailer's store yet"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT id, result FROM tasks
+                WHERE crawl = ? AND retailer = ? AND merged = 0 AND status = 'done' AND result IS NOT NULL
+                ORDER BY id LIMIT ?
+            ''', (crawl, retailer, limit)).fetchall()
+        return [(task_id, codec.loads(result)) for task_id, result in rows]
+
+    def mark_merged(self, task_ids: List[int]) -> None:
+        with self._connect(immediate=True) as conn:
+            conn.executemany('UPDATE tasks SET merged = 1 WHERE id = ?', [(task_id,) for task_id in task_ids])
+
+    def counts(self, crawl: int) -> Dict[str, int]:
+        """Number of tasks of a crawl by status"""
+        with self._connect() as conn:
+            return dict(conn.execute('SELECT status, COUNT(*) FROM tasks WHERE crawl = ? GROUP BY status', (crawl,)))
+
+    def has_open_work(self) -> bool:
+        """Whether any unfinished crawl still has tasks that aren't done or failed"""
+        with self._connect() as conn:
+            return conn.execute('''
+                SELECT 1 FROM tasks WHERE status IN ('pending', 'leased')
+                  AND crawl IN (SELECT id FROM crawls WHERE finished IS NULL) LIMIT 1
+            ''').fetchone() is not None